@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Benchmarks for the speed scale extension.
+
+Runs ScaleGen.effect() against synthetic documents across the edges of the
+parameter ranges in render_speed_scale.inx (speed 30-200, max-length
+20-500, every scale, with and without useref over large selections) and
+records wall time, peak memory, element count and output size for each
+case. Start up is tracked too: the time a fresh interpreter takes to
+import the extension, and the streaming writer that works without inkex.
+Results are compared with a stored baseline so that regressions show up
+as numbers:
+
+    python bench/bench_speed_scale.py                   # run and compare
+    python bench/bench_speed_scale.py --save-baseline   # record a new baseline
+    python bench/bench_speed_scale.py --quick -k useref # a subset
+    python bench/bench_speed_scale.py -k import --import-budget 300
+
+inkex must be importable. The baseline is machine specific; record it on
+the machine you compare on.
+'''
+
+import argparse, json, os, subprocess, sys, time, tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', 'src')
+sys.path.insert(0, SRC)
+
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+SPEEDS = (30, 200)
+MAX_LENGTHS = (20, 500)
+SCALES = (200000, 250000, 500000)
+SELECTION_SIZES = (1000, 10000)
+
+# start up cases: (name, module a fresh interpreter imports)
+IMPORTS = (
+    ('import_extension', 'render_speed_scale'),
+    ('import_stream_writer', 'speed_scale_svg'),
+)
+
+def synthetic_document(selected=0):
+    """An A3 mm document with a layer of `selected` small paths, standing in
+    for a chart layer. Returns (svg bytes, ids of the paths).
+    """
+    ids = ['chart{}'.format(n) for n in range(selected)]
+    paths = ''.join(
+        '<path id="{}" d="M {},{} l 3,1 l -1,2 z" transform="translate(1,1)"/>'.format(
+            pid, (n * 7) % 400, (n * 13) % 280)
+        for n, pid in enumerate(ids))
+    svg = ('<svg xmlns="http://www.w3.org/2000/svg" '
+        'xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" '
+        'xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd" '
+        'width="420mm" height="297mm" viewBox="0 0 420 297">'
+        '<sodipodi:namedview id="namedview1"/>'
+        '<g inkscape:groupmode="layer" inkscape:label="Chart" id="layer1">{}</g>'
+        '</svg>').format(paths)
+    return svg.encode(), ids
+
+def cases(quick=False):
+    """Yield (name, effect arguments, selection size) for every case."""
+    scales = SCALES[1:2] if quick else SCALES
+    for speed in SPEEDS:
+        for max_length in MAX_LENGTHS:
+            for scale in scales:
+                name = 'speed{}_len{}_1-{}K'.format(speed, max_length, scale // 1000)
+                args = ['--speed={}'.format(speed), '--max-length={}'.format(max_length),
+                    '--scale={}'.format(scale)]
+                yield name, args, 0
+    for size in SELECTION_SIZES[:1] if quick else SELECTION_SIZES:
+        yield 'useref_{}'.format(size), ['--useref=true'], size
+
+def measure(name, args, selected, repeat):
+    """Run one case and return its measurements."""
+    from lxml import etree
+    import render_speed_scale
+
+    document, ids = synthetic_document(selected)
+    # time building the ruler, not reading it back from the disk cache
+    args = args + ['--cache=false'] + ['--id={}'.format(pid) for pid in ids]
+
+    def run():
+        # every repeat starts cold, as the first run in a fresh process
+        render_speed_scale.PREVIEW_CACHE.clear()
+        render_speed_scale.BBOX_CACHE.clear()
+        effect = render_speed_scale.run_effect(args, document)
+        group = effect.svg.get_current_layer()[-1]
+        return effect, group, etree.tostring(group)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        effect, group, output = run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'seconds': min(times),
+        'peak_bytes': peak,
+        'elements': sum(1 for _ in group.iter()),
+        'output_bytes': len(output),
+    }
+
+def measure_import(module, repeat):
+    """Start a fresh interpreter that imports module and return the import
+    time it reports (python -X importtime), the whole process' wall time and
+    the number of modules loaded. The fastest of repeat runs is kept.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+            cwd=SRC, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        wall = time.perf_counter() - start
+        lines = [line for line in proc.stderr.splitlines() if line.startswith('import time:')]
+        cumulative = [int(line.split('|')[1]) for line in lines
+            if line.split('|')[2].strip() == module]
+        runs.append((cumulative[-1] / 1e6, wall, len(lines) - 1))
+    seconds, wall, modules = min(runs)
+    return {'seconds': seconds, 'process_seconds': wall, 'modules': modules}
+
+def compare_imports(results, baseline, tolerance, budget=None):
+    """Print the start up cases against the baseline and the extension's
+    budget (seconds); return the regressed cases.
+    """
+    regressions = []
+    row = '{:<28} {:>10} {:>8} {:>12} {:>8}'
+    print(row.format('start up', 'import ms', 'vs base', 'process ms', 'modules'))
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = ''
+        if base and base.get('seconds'):
+            change = result['seconds'] / base['seconds'] - 1
+            if change > tolerance:
+                regressions.append((name, 'seconds', change))
+            change = '{:+.0%}'.format(change)
+        if budget and name == IMPORTS[0][0] and result['seconds'] > budget:
+            regressions.append((name, 'budget', result['seconds'] / budget - 1))
+        print(row.format(name, '{:.1f}'.format(result['seconds'] * 1000), change,
+            '{:.1f}'.format(result['process_seconds'] * 1000), result['modules']))
+    return regressions
+
+def compare(results, baseline, tolerance):
+    """Print each case against the baseline; return the regressed cases."""
+    regressions = []
+    row = '{:<28} {:>10} {:>8} {:>12} {:>8} {:>9} {:>11}'
+    print(row.format('case', 'ms', 'vs base', 'peak KiB', 'vs base', 'elements', 'bytes'))
+    for name, result in results.items():
+        base = baseline.get(name)
+        def ratio(key):
+            if not base or not base.get(key):
+                return ''
+            change = result[key] / base[key] - 1
+            if change > tolerance and key in ('seconds', 'peak_bytes'):
+                regressions.append((name, key, change))
+            return '{:+.0%}'.format(change)
+        print(row.format(name, '{:.2f}'.format(result['seconds'] * 1000), ratio('seconds'),
+            result['peak_bytes'] // 1024, ratio('peak_bytes'),
+            result['elements'], result['output_bytes']))
+        if base and (base['elements'], base['output_bytes']) != (result['elements'], result['output_bytes']):
+            print('    output changed: {} elements, {} bytes in baseline'.format(
+                base['elements'], base['output_bytes']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baseline', default=BASELINE,
+        help='Baseline file (default: bench/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+        help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+        help='Allowed slowdown or memory growth before failing (default 0.2)')
+    parser.add_argument('--repeat', type=int, default=5,
+        help='Runs per case; the fastest is kept')
+    parser.add_argument('--quick', action='store_true',
+        help='One scale and the smaller selection only')
+    parser.add_argument('-k', dest='match', default='',
+        help='Only run cases whose name contains this')
+    parser.add_argument('--import-budget', type=float, default=None,
+        help='Fail if importing the extension takes longer than this (ms)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    opts = parser.parse_args(argv)
+
+    results = {}
+    for name, args, selected in cases(opts.quick):
+        if opts.match in name:
+            results[name] = measure(name, args, selected, opts.repeat)
+    imports = {}
+    for name, module in IMPORTS:
+        if opts.match in name:
+            imports[name] = measure_import(module, opts.repeat)
+
+    baseline = {}
+    if os.path.exists(opts.baseline):
+        with open(opts.baseline) as stream:
+            baseline = json.load(stream)
+    regressions = []
+    if results:
+        regressions += compare(results, baseline, opts.tolerance)
+    if imports:
+        budget = opts.import_budget / 1000 if opts.import_budget else None
+        regressions += compare_imports(imports, baseline, opts.tolerance, budget)
+    results.update(imports)
+
+    if opts.json:
+        with open(opts.json, 'w') as stream:
+            json.dump(results, stream, indent=1, sort_keys=True)
+    if opts.save_baseline:
+        baseline.update(results)
+        with open(opts.baseline, 'w') as stream:
+            json.dump(baseline, stream, indent=1, sort_keys=True)
+        return 0
+    for name, key, change in regressions:
+        print('REGRESSION {} {}: {:+.0%}'.format(name, key, change))
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
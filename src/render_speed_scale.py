@@ -57,38 +57,157 @@ message = "Debug: " + str(i) + "\n"
 inkex.debug(message)
 '''
 
+import sys
+
+# Command line tools that do not need inkex, run as
+# 'render_speed_scale.py <command> ...'. They are dispatched before inkex
+# is imported, as importing it dominates the start up time of every run.
+COMMANDS = {
+    'batch': ('speed_scale_batch', 'batch_main'),
+    'serve': ('speed_scale_worker', 'serve_main'),
+    'plan': ('speed_scale_plan', 'plan_main'),
+    'splice': ('speed_scale_splice', 'splice_main'),
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        module, function = COMMANDS[sys.argv[1]]
+        sys.exit(getattr(__import__(module), function)(sys.argv[2:]))
+    # hand the run to a warm worker if one is serving, else run it here
+    import speed_scale_worker
+    status = speed_scale_worker.forward(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
 import inkex
-from inkex import Style, Line, PathElement, DirectedLineSegment, Vector2d, units
+from inkex import Style, PathElement, DirectedLineSegment, Vector2d, units
 from inkex.paths import Path, Move, Line
-from simplestyle import *
 from lxml import etree
 
-import sys, math
-
-# a dictionary of unit to user unit conversion factors
-CONVERSIONS = {
-    'kts': 1.852,
-    'mph': 1.609,
-    'kph': 1.0,
-}
-
-def convert_speed_to_kph(value, from_unit):
-    """Returns kph value for speed passed."""
-    return value * CONVERSIONS[from_unit]
-
-def max_decimal_digits(value, digits=2):
-	"""Return a (specified) maximum number of decimal digits, ignoring any
-	trailing zero or decimal point.
-	"""
-	return ('{:0.{}f}'.format(value, digits)).rstrip('0').rstrip('.')
+import os, math, time, copy, collections, contextlib, json, argparse
+
+from speed_scale_layout import (TICK_SHORT, TICK_HALF_MINUTE, TICK_LABEL,
+    RULER_DEFAULTS, OPTION_CHOICES, RulerLayout, RouteIndex, RouteLayout, resolve_params,
+    layout_arrowheads, parse_speeds, parse_tick_levels)
+from speed_scale_glyphs import STROKE_WIDTH, drawable, glyph_path, layout_text
+from speed_scale_bbox import selection_centre
+from speed_scale_cache import default_cache, fragment_key
+from speed_scale_svg import CoordinateFormat
+
+def speed_list(text):
+    """Parse --speed, see parse_speeds()."""
+    try:
+        return parse_speeds(text)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+def tick_levels(text):
+    """Parse --tick-levels, see parse_tick_levels()."""
+    try:
+        return parse_tick_levels(text)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+
+class LRUCache():
+    """A dict-like cache holding at most maxsize entries, evicting the
+    least recently used.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            self.entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+# Ruler parts and resolved options from earlier runs in this process, so
+# long-lived processes (batch workers, repeated previews) only rebuild what
+# a parameter change affects.
+PREVIEW_CACHE = LRUCache(64)
+
+# Bounding boxes of selected elements, keyed by their geometry, so that
+# re-running a preview over a large selection only measures what changed.
+BBOX_CACHE = LRUCache(100000)
+
+# options that do not affect the generated ruler
+NON_RULER_OPTIONS = {'input_file', 'output', 'ids', 'selected_nodes', 'tab', 'cache',
+    'regenerate'}
+
+# attributes of the Speed_scale group recording how it was made: the ruler
+# options as given on the command line, and the disk cache key of the
+# ruler they made, which changes with the document scale and the code
+OPTIONS_ATTRIB = 'data-speed-scale-options'
+KEY_ATTRIB = 'data-speed-scale-key'
+
+# set to '-' (stderr) or a file name to time each phase of a run
+PROFILE_ENV = 'SPEED_SCALE_PROFILE'
+
+class Profile():
+    """Opt-in timing of the phases of a run, plus counters of what was
+    created. Nested phases are named 'outer.inner' and are not added to the
+    total. When enabled, emit() writes one JSON object to stderr or appends
+    it as a line to a file.
+    """
+    def __init__(self, target=None):
+        self.target = target
+        self.enabled = bool(target)
+        self.phases = collections.OrderedDict()
+        self.counters = collections.Counter()
+
+    def add(self, name, seconds):
+        if self.enabled:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def emit(self, **extra):
+        if not self.enabled:
+            return
+        report = dict(extra, phases=self.phases, counters=self.counters,
+            total=sum(seconds for name, seconds in self.phases.items() if '.' not in name))
+        text = json.dumps(report)
+        if self.target in ('-', '1', 'stderr'):
+            sys.stderr.write(text + '\n')
+        else:
+            with open(self.target, 'a') as stream:
+                stream.write(text + '\n')
+        self.phases.clear()
+        self.counters.clear()
 
 class Arrow():
-    def __init__(self, L, A, start_type, style_ratio, sty):
+    def __init__(self, L, A, start_type, style_ratio, sty, coords=None):
         self.L = L
         self.A = A
         self.start_type = start_type
         self.style_ratio = style_ratio
         self.sty = sty
+        self.coords = coords or CoordinateFormat()
         self.new_sty = Style({'stroke': 'none', 'stroke-width':'0', 
             'fill': sty['stroke']})
 
@@ -118,11 +237,8 @@ class Arrow():
         elem.update(**{
             'style': self.new_sty,
             'inkscape:label': name,
-            'd': 'M ' + str(point1.x) + ',' + str(point1.y) +
-                ' L ' + str(point2.x) + ',' + str(point2.y) +
-                ' L ' + str(point3.x) + ',' + str(point3.y) + 
-                ' L ' + str(point4.x) + ',' + str(point4.y) + 
-                ' z'})
+            'd': self.coords.path([[(point.x, point.y) for point in
+                (point1, point2, point3, point4)]], closed=True)})
         return elem
 
 class NewPath():
@@ -141,10 +257,8 @@ class NewPath():
         return line_wid
 
     def start_end(self):
-        path = self.path
-        start, end = path[0].args, path[1].args
-        if len(end) == 1: # handle H and V
-            end = path[1].to_line(path[0]).args
+        # end_points also resolves H and V, as written with --precision
+        start, end = list(self.path.end_points)[:2]
         return (Vector2d(start), Vector2d(end))
 
     def multi_segments(self):
@@ -218,39 +332,72 @@ class ScaleGen(inkex.Effect):
 
 		# Page 1 (Shape)
 		self.arg_parser.add_argument('--speed',
-			type = int, dest = 'speed', default = '60',
-			help = 'Speed:')
+			type = speed_list, dest = 'speed', default = '60',
+			help = 'Speed, or a list of speeds to stack (e.g. 80,90,100 or 80:110:10):')
 		self.arg_parser.add_argument('--speed-unit',
-			type = str, dest = 'speed_unit', default = 'kts',
+			type = str, dest = 'speed_unit', default = 'kts', choices = OPTION_CHOICES['speed_unit'],
 			help = 'Unit:')
 		self.arg_parser.add_argument('--scale',
-			type = int, dest = 'scale', default = '250000',
+			type = int, dest = 'scale', default = '200000',
 			help = 'Scale:')
 		self.arg_parser.add_argument('--max-length',
 			type = int, dest = 'max_length', default = '280',
 			help = 'Max length:')
+		self.arg_parser.add_argument('--stack-gap',
+			type = float, dest = 'stack_gap', default = '5.0',
+			help = 'Gap between stacked rulers:')
 		self.arg_parser.add_argument('-u', '--unit',
 			type = str, dest = 'unit', default = 'mm',
 			help = 'Unit:')
 		self.arg_parser.add_argument('--useref',
 			type = inkex.Boolean, dest = 'useref', default = 'False',
 			help = 'Reference is bounding box center')
+		self.arg_parser.add_argument('--route',
+			type = inkex.Boolean, dest = 'route', default = 'False',
+			help = 'Place the ticks along the selected route path')
+		self.arg_parser.add_argument('--route-tick-length',
+			type = float, dest = 'route_tick_length', default = '4.0',
+			help = 'Length of minute ticks either side of the route')
+		self.arg_parser.add_argument('--compound',
+			type = inkex.Boolean, dest = 'compound', default = 'False',
+			help = 'One path per tick style instead of one per tick')
+		self.arg_parser.add_argument('--instancing',
+			type = str, dest = 'instancing', default = 'none', choices = OPTION_CHOICES['instancing'],
+			help = 'Define repeated geometry once and place it with <use>')
+		self.arg_parser.add_argument('--css-classes',
+			type = inkex.Boolean, dest = 'css_classes', default = 'False',
+			help = 'Style elements with a shared stylesheet instead of inline styles')
+		self.arg_parser.add_argument('--label-mode',
+			type = str, dest = 'label_mode', default = 'text', choices = OPTION_CHOICES['label_mode'],
+			help = 'Draw labels as text, or as strokes from a built-in single-stroke font')
+		self.arg_parser.add_argument('--precision',
+			type = int, dest = 'precision', default = '-1',
+			help = 'Decimals to round coordinates to, with relative path commands; -1 for full precision')
+		self.arg_parser.add_argument('--cache',
+			type = inkex.Boolean, dest = 'cache', default = 'False',
+			help = 'Reuse rulers stored on disk by earlier runs, see speed_scale_cache')
+		self.arg_parser.add_argument('--regenerate',
+			type = inkex.Boolean, dest = 'regenerate', default = 'False',
+			help = 'Rebuild the out of date rulers in the document from their recorded options')
 		self.arg_parser.add_argument('--insidetf',
 			type = inkex.Boolean, dest = 'insidetf', default = 'False',
 			help = 'Draw lines above or below line')
 		#
 		self.arg_parser.add_argument('-s', '--fontsize',
-			type = float, dest = 'fontsize', default = '3',
+			type = float, dest = 'fontsize', default = '5.0',
 			help = 'Font Height')
 		self.arg_parser.add_argument('-i', '--suffix',
-			type = str, dest = 'suffix', default = ' ',
+			type = str, dest = 'suffix', default = '',
 			help = 'Appended to label')
+		self.arg_parser.add_argument('--caption',
+			type = str, dest = 'caption', default = '',
+			help = 'Title above the ruler')
 		# label offset
 		self.arg_parser.add_argument('-x', '--labeloffseth',
 			type = float, dest = 'labeloffseth', default = '0.0',
 			help = 'Label offset in X')
 		self.arg_parser.add_argument('-y', '--labeloffsetv',
-			type = float, dest = 'labeloffsetv', default = '7.0',
+			type = float, dest = 'labeloffsetv', default = '0.0',
 			help = 'Label offset in Y')
 			
 		## Page 3 (Lines)
@@ -269,25 +416,31 @@ class ScaleGen(inkex.Effect):
 			help = 'Offset')
 		#
 		self.arg_parser.add_argument('-g', '--labellinelength',
-			type = float, dest = 'labellinelength', default = '100',
+			type = float, dest = 'labellinelength', default = '5.0',
 			help = 'Length of main Label line')
 		self.arg_parser.add_argument('--labellinestrokewidth',
 			type = float, dest = 'labellinestrokewidth', default = '0.4',
 			help = 'Stroke width of main Label line')
 		#
 		self.arg_parser.add_argument('-v', '--mark2wid',
-			type = int, dest = 'mark2wid', default = '70',
+			type = int, dest = 'mark2wid', default = '60',
 			help = 'Short line: - Length (units): (\%):')
 		self.arg_parser.add_argument('--shortlinestrokewidth',
 			type = float, dest = 'shortlinestrokewidth', default = '0.2',
 			help = 'Short line - Stroke width')
+		self.arg_parser.add_argument('--tick-levels',
+			type = tick_levels, dest = 'tick_levels', default = '60,30,10',
+			help = 'Up to three tick intervals in seconds: labelled, red and short (e.g. 600,60,10)')
+		self.arg_parser.add_argument('--min-tick-spacing',
+			type = float, dest = 'min_tick_spacing', default = '2.0',
+			help = 'Leave out tick levels closer than this many stroke widths')
         #
 		self.arg_parser.add_argument('--dimensionoffset',
             type = int, dest = 'dimensionoffset', default='10',
             help = 'Dimension offset')
 		#
 		self.arg_parser.add_argument('--arrow-style',
-			type = str, dest = 'arrow_style', default = 'sharp',
+			type = str, dest = 'arrow_style', default = 'normal', choices = OPTION_CHOICES['arrow_style'],
 			help = 'Arrow style')
 		self.arg_parser.add_argument('--arrow-len',
 			type = int, dest = 'arrow_len', default = '10',
@@ -301,225 +454,408 @@ class ScaleGen(inkex.Effect):
 			dest = "tab", default="use",
 			help = "The selected UI-tab when OK was pressed")
 
-	def speed_max_digits(self, unit_to, digits=2):
-		"""Return the speed converted to the specified units with a (specified)
-		maximum number of decimal digits, ignoring any trailing zero or decimal
-		point.
+		# not in the .inx: time each phase, see PROFILE_ENV
+		self.arg_parser.add_argument('--profile',
+			type = str, dest = 'profile', default = None,
+			help = "Write phase timings as JSON to '-' (stderr) or a file")
+		self.profile = Profile()
+
+	def run(self, args=None, output=inkex.Effect.output_unspecified):
+		try:
+			inkex.Effect.run(self, args, output)
+		finally:
+			self.profile.emit(command='effect')
+
+	def parse_arguments(self, args):
+		start = time.perf_counter()
+		# argparse takes quadratic time over thousands of --id options (a
+		# large selection), so those are collected here
+		ids = [arg[len('--id='):] for arg in args if arg.startswith('--id=')]
+		inkex.Effect.parse_arguments(self, [arg for arg in args if not arg.startswith('--id=')])
+		self.options.ids += ids
+		self.profile = Profile(self.options.profile or os.environ.get(PROFILE_ENV))
+		self.profile.add('parse_arguments', time.perf_counter() - start)
+
+	def load_raw(self):
+		with self.profile.phase('load'):
+			inkex.Effect.load_raw(self)
+
+	def save_raw(self, ret):
+		with self.profile.phase('save'):
+			inkex.Effect.save_raw(self, ret)
+
+	def style_attribs(self, role, style):
+		""" Return the attributes that style an element in the given role.
+			Normally this is an inline style. With --css-classes the style is
+			serialised once per role into the ruler's stylesheet and the
+			element just gets a class.
 		"""
-		return max_decimal_digits(self.speed * CONVERSIONS[self.speed_unit] / CONVERSIONS[unit_to], digits)
-        
-	def add_box(self, x, y, w):
-		"""Add a box background behind text to make it clearer. Unfortunately
-        inkex doesn't know how wide will be once rendered, so we have to guess.
-        
-        """
-		name = 'background_box'
-		strokewidth = self.textlinestrokewidth
-		y2 = y1 = y + strokewidth/2
-		line_style = {
-			'stroke': 'white',
-			'stroke-width': strokewidth,
-		}
-
-		x1 = x-w/2
-		x2 = x+w/2
-		
-		x1 = str(x1)
-		y1 = str(y1)
-		x2 = str(x2)
-		y2 = str(y2)
-
-		line_attribs = {
-			'style' : str(inkex.Style(line_style)),
-			inkex.addNS('label','inkscape') : name,
-			'd' : 'M '+x1+','+y1+' L '+x2+','+y2
-		}
-		line = etree.SubElement(self.blank_out_text, inkex.addNS('path','svg'), line_attribs )
-
-	def add_label(self, value, x, y, group, colour):
-		"""Add arbitrary text"""
-		font_height_offset = self.svg.unittouu(str(self.fontsize)+"mm")
-		x = float(x)
-		y = float(y) + font_height_offset
+		if not self.css_classes:
+			return {'style': str(inkex.Style(style))}
+		if role not in self.stylesheet:
+			self.stylesheet[role] = str(inkex.Style(style))
+		return {'class': role}
+
+	def add_stylesheet(self, group):
+		""" Write the rules collected by style_attribs() as a single <style>
+			in <defs>, scoped to this ruler's top level group.
+		"""
+		import hashlib
+		rules = ''.join('{{scope}} .{} {{{{{}}}}}\n'.format(role, style)
+			for role, style in sorted(self.stylesheet.items()))
+		scope = 'speed-scale-' + hashlib.sha1(rules.encode()).hexdigest()[:8]
+		group.set('class', scope)
+		style_id = scope + '-style'
+		self.used_defs.append(style_id)
+		if self.svg.defs.find('*[@id="{}"]'.format(style_id)) is None:
+			style = etree.SubElement(self.svg.defs, inkex.addNS('style','svg'),
+				{'id': style_id, 'type': 'text/css'})
+			style.text = rules.format(scope='.' + scope)
+
+	def add_segment(self, segment, group):
+		""" Add a straight line laid out as a Segment. """
+		line_attribs = dict(self.style_attribs(segment.role, segment.style), **{
+			inkex.addNS('label','inkscape') : segment.name,
+			'd' : self.coords.lines([(segment.x1, segment.y1, segment.x2, segment.y2)])
+		})
+		line = etree.SubElement(group, inkex.addNS('path','svg'), line_attribs )
 
+	def add_label(self, label, group):
+		"""Add arbitrary text laid out as a Label"""
+		if self.label_mode == 'strokes' and drawable(label.text):
+			return self.add_glyph_label(label, group)
 		text = etree.SubElement(group, inkex.addNS('text','svg'))
-		text.text = value
-		style = {
-            'text-align' : 'center',
-        	'text-anchor': 'middle', 'font-size': str(self.fontsize),
-			'fill': colour
-        }
-		text.set('style', str(inkex.Style(style)))
-		text.set('x', str(float(x)))
-		text.set('y', str(float(y)))
+		text.text = label.text
+		for key, value in self.style_attribs(label.role, label.style).items():
+			text.set(key, value)
+		text.set('x', self.coords.number(label.x))
+		text.set('y', self.coords.number(label.y))
 		group.append(text)
 
-	def add_numeric_label(self, n, x, y, group, fontsize):
-		""" draw text at x,y location
+	def add_glyph_label(self, label, group):
+		""" Draw a Label with the single-stroke font: a group holding one
+			<use> per character, each glyph defined once per font size.
 		"""
-		number = int(n/6)
-		self.add_label(str(number), x, y, group,
-			'red' if number%2==0 else 'black')
-
-
-	def add_straight_line(self, i, groups):
-		""" Used for straight line graphs.
-			add_numeric_label() is called from inside
+		size = float(label.style['font-size'])
+		colour = label.style['fill']
+		style = {
+			'fill': 'none', 'stroke': colour, 'stroke-width': size * STROKE_WIDTH,
+			'stroke-linecap': 'round', 'stroke-linejoin': 'round',
+		}
+		glyphs = etree.SubElement(group, inkex.addNS('g','svg'), dict(
+			self.style_attribs('label-glyphs-' + colour, style),
+			**{inkex.addNS('label','inkscape'): label.text}))
+		use_tag = inkex.addNS('use','svg')
+		href = inkex.addNS('href','xlink')
+		for char, x in layout_text(label.text, size, label.x, label.style['text-anchor']):
+			def_id = self.add_def('glyph', 'path', {'d': glyph_path(char, size)})
+			etree.SubElement(glyphs, use_tag, {href: '#' + def_id,
+				'x': self.coords.number(round(x, 4)), 'y': self.coords.number(label.y)})
+
+	def add_ticks(self, ticks, groups):
+		""" Emit the tick lines laid out by layout_ticks() for straight line
+			graphs. Label lines get an arrowhead.
 		"""
-
-		label = False
-		arrow = False
-		x = i*self.res
-
-		if i % 6 == 0:
-			name = 'label_line_{}'.format(i)
-			line_style = {
-				'stroke': 'red' if i%12==0 else 'black',
-		 		'stroke-width': self.labellinestrokewidth,
+		# one style per tick class and colour, serialised once
+		styles = {}
+		for kind, strokewidth in ((TICK_LABEL, self.labellinestrokewidth),
+				(TICK_SHORT, self.shortlinestrokewidth), (TICK_HALF_MINUTE, self.shortlinestrokewidth)):
+			for red in (True, False):
+				styles[kind, red] = str(inkex.Style({
+					'stroke': 'red' if red else 'black',
+					'stroke-width': strokewidth,
+				}))
+
+		path_tag = inkex.addNS('path','svg')
+		label_tag = inkex.addNS('label','inkscape')
+		L = self.arrow_L
+		A = self.arrow_angle
+		start_type = 'end'
+		style_ratio = 0.0 if self.arrow_style == 'normal' else .25
+		coords = self.coords
+
+		for i, x, kind, red, y1, y2 in zip(*(ticks[k].tolist() for k in
+				('index', 'x', 'kind', 'red', 'y1', 'y2'))):
+			if kind == TICK_LABEL:
+				name = 'label_line_{}'.format(i)
+				group = groups[0]
+			else:
+				name = 'short_line_{}'.format(i)
+				group = groups[1]
+
+			line_attribs = {
+				'style' : styles[kind, red],
+				label_tag : name,
+				'd' : coords.lines([(x, y1, x, y2)])
 			}
-			y1 = -self.labellinelength
-			y2 = self.labellinelength * self.mark2wid
-			group = groups[0]
-			label = True
-			arrow = True
-		else:
-			name = 'short_line_{}'.format(i)
-			line_style = {
-				'stroke': 'red' if i%6==3 else 'black',
-				'stroke-width': self.shortlinestrokewidth
-			}
-			y1 = 0
-			y2 = self.labellinelength * self.mark2wid
-			group = groups[1]
-
-		x1 = str(x)
-		y1 = str(y1)
-		x2 = str(x)
-		y2 = str(y2)
-
-		line_attribs = {
-			'style' : str(inkex.Style(line_style)),
-			inkex.addNS('label','inkscape') : name,
-			'd' : 'M '+x1+','+y1+' L '+x2+','+y2
-		}
-
-		line = etree.SubElement(group, inkex.addNS('path','svg'), line_attribs )
-
-		if arrow:
-			L = self.svg.unittouu(str(self.arrow_len) + 'px')
-			A = self.arrow_angle
-			start_type = 'end'
-			style_type = self.options.arrow_style
-			style_ratio = 0.0 if style_type == 'normal' else .25
-
-			arrow = Arrow(L, A, start_type, style_ratio, line.style)
-			newpath = NewPath(line, arrow)
-			newpath.new_arrow(group)
-			newpath.new_pathelem()
-
-		if label:
-			self.add_numeric_label(i, x2, -self.labeloffsetv, groups[4], self.fontsize)
-
-
-	def add_perpendicular_line(self, type, group):
-		""" Add a horizontal line
+			line = etree.SubElement(group, path_tag, line_attribs )
+
+			if kind == TICK_LABEL:
+				start = time.perf_counter()
+				arrow = Arrow(L, A, start_type, style_ratio, line.style, coords)
+				newpath = NewPath(line, arrow)
+				newpath.new_arrow(group)
+				shortened = newpath.new_pathelem()
+				if coords.compact:
+					# inkex writes the shortened line with its own formatting
+					x1, y1, x2, y2 = shortened.path[0].args + shortened.path[1].args
+					shortened.attrib['d'] = coords.lines([(x1, y1, x2, y2)])
+				self.profile.add('effect.ticks.arrows', time.perf_counter() - start)
+
+	def add_def(self, prefix, tag, attribs):
+		""" Add a shared definition to the document <defs> and return its id.
+			The id is derived from the attributes, so identical definitions
+			(e.g. from several rulers in one document) are only added once.
 		"""
-
-		name = 'perpendicular_line'
-		strokewidth = self.perplinestrokewidth
-		line_style = {
-			'stroke': 'black',
-			'stroke-width': strokewidth,
-		}
-
-		if type == 0: # basic line 
-			y2 = y1 = self.perplineoffset
-		elif type == 1: # basic line - top 
-			y2 = y1 = self.perplineoffset - self.labellinelength
-		else: # white background behind text
-			strokewidth = self.textlinestrokewidth
-			y2 = y1 = -self.labeloffsetv + strokewidth/2
-			line_style = {
-				'stroke': 'white',
-				'stroke-width': strokewidth
-			}			
-
-		strokeoffset = (strokewidth / 2)
-		x2 = ((self.scaleto-1)*self.res) + strokeoffset*2 # RHS of horiz line
-		x1 = ((self.scalefrom)*self.res) - strokeoffset   # LHS of horiz line
-
-		x1 = str(x1)
-		y1 = str(y1)
-		x2 = str(x2)
-		y2 = str(y2)
-
-		line_attribs = {
-			'style' : str(inkex.Style(line_style)),
-			inkex.addNS('label','inkscape') : name,
-			'd' : 'M '+x1+','+y1+' L '+x2+','+y2
-		}
-		line = etree.SubElement(group, inkex.addNS('path','svg'), line_attribs )
-
-	def add_dimensions(self, group):
-		""" Add text specifying dimensions to ruler.
+		import hashlib
+		key = hashlib.sha1(repr(sorted(attribs.items())).encode()).hexdigest()[:8]
+		def_id = '{}-{}'.format(prefix, key)
+		self.used_defs.append(def_id)
+		if self.svg.defs.find('*[@id="{}"]'.format(def_id)) is None:
+			attribs = dict(attribs, id=def_id)
+			etree.SubElement(self.svg.defs, inkex.addNS(tag,'svg'), attribs)
+		return def_id
+
+	def group_nsmap(self):
+		""" Namespaces for a top level Speed_scale group: xlink, unless the
+			document root declares it already, so that each <use> inside
+			does not declare it again.
 		"""
-		kph = self.speed_max_digits('kph')
-		mph = self.speed_max_digits('mph')
-		kts = self.speed_max_digits('kts')
-
-		one_km_mm = 1 / self.scale * 1000 * 1000
-		# TODO: use a better conversion function
-		one_mi_mm = max_decimal_digits(one_km_mm / CONVERSIONS['kph'] * CONVERSIONS['mph'])
-		one_kt_mm = max_decimal_digits(one_km_mm / CONVERSIONS['kph'] * CONVERSIONS['kts'])
-
-		x = (self.scaleto-self.scalefrom)/2*self.res
-		xa = self.scalefrom * self.res + 50
-		xb = self.scaleto * self.res - 70
-
-		y = self.labeloffsetv - self.dimensionoffset
-
-		text = '{}kph   {}mph   {}kts   1:{}K'.format(kph, mph, kts, int(self.scale/1000))
-		self.add_label(text, xa, y, group, 'black')
-		self.add_box(xa,y,40)
+		xlink = inkex.NSS['xlink']
+		return None if xlink in self.svg.nsmap.values() else {'xlink': xlink}
+
+	def add_uses(self, group, def_id, xs):
+		""" Place a <use> of def_id at each x offset. """
+		use_tag = inkex.addNS('use','svg')
+		href = inkex.addNS('href','xlink')
+		for x in xs:
+			etree.SubElement(group, use_tag, {href: '#' + def_id, 'x': self.coords.number(x)})
+
+	def add_bulk_ticks(self, layout, groups):
+		""" Emit the ticks and arrowheads of a RulerLayout in bulk, for the
+			compound and instanced modes.
+
+			--compound merges the lines sharing a tick style and colour into
+			one path, and the arrowheads into one filled path per colour.
+			--instancing=arrows defines each arrowhead once in <defs> and
+			places it with <use>; --instancing=all does the same for the tick
+			lines. This is also used for --css-classes, as Arrow and NewPath
+			need inline styles.
+		"""
+		ticks = layout.ticks
+		label = ticks['kind'] == TICK_LABEL
+		y2 = ticks['y2'].copy()
+		y2[label], arrows = layout.arrowheads()
+		arrow_red = ticks['red'][label]
+
+		path_tag = inkex.addNS('path','svg')
+		label_tag = inkex.addNS('label','inkscape')
+		coords = self.coords
+		for colour, red in (('red', True), ('black', False)):
+			for name, group, mask, strokewidth in (
+					('label_line', groups[0], label, self.labellinestrokewidth),
+					('short_line', groups[1], ~label, self.shortlinestrokewidth)):
+				mask = mask & (ticks['red'] == red)
+				if not mask.any():
+					continue
+				style = {'stroke': colour, 'stroke-width': strokewidth}
+				role = '{}-{}'.format(name.replace('_', '-'), colour)
+				xs, y1s, y2s = (ticks['x'][mask].tolist(), ticks['y1'][mask].tolist(),
+					y2[mask].tolist())
+				if self.instancing == 'all':
+					def_id = self.add_def(name, 'path', {
+						'style': str(inkex.Style(style)),
+						'd': coords.lines([(0, y1s[0], 0, y2s[0])]),
+					})
+					self.add_uses(group, def_id, xs)
+				elif self.compound:
+					etree.SubElement(group, path_tag, dict(self.style_attribs(role, style), **{
+						label_tag: '{}s_{}'.format(name, colour),
+						'd': coords.lines((x, a, x, b) for x, a, b in zip(xs, y1s, y2s)),
+					}))
+				else:
+					for i, x, a, b in zip(ticks['index'][mask].tolist(), xs, y1s, y2s):
+						etree.SubElement(group, path_tag, dict(self.style_attribs(role, style), **{
+							label_tag: '{}_{}'.format(name, i),
+							'd': coords.lines([(x, a, x, b)]),
+						}))
+
+			points = arrows[arrow_red == red]
+			if not len(points):
+				continue
+			style = {'stroke': 'none', 'stroke-width': '0', 'fill': colour}
+			if self.instancing != 'none':
+				# the arrowheads only differ by their x offset
+				first = label.nonzero()[0][0]
+				_, tip = layout_arrowheads([0.0], ticks['y1'][first:first+1],
+					ticks['y2'][first:first+1], *layout.arrow_shape())
+				def_id = self.add_def('arrowhead', 'path', {
+					'style': str(inkex.Style(style)),
+					'd': coords.path(tip.tolist(), closed=True),
+				})
+				self.add_uses(groups[0], def_id, points[:, 0, 0].tolist())
+			else:
+				etree.SubElement(groups[0], path_tag, dict(self.style_attribs('arrowhead-' + colour, style), **{
+					label_tag: 'arrowheads_{}'.format(colour),
+					'd': coords.path(points.tolist(), closed=True),
+				}))
+
+	def add_group(self, parent, name):
+		""" Add an empty group labelled name. """
+		grp_attribs = {inkex.addNS('label','inkscape'):name}
+		return etree.SubElement(parent, 'g', grp_attribs)
+
+	def add_part(self, parent, name, key, build):
+		""" Build one part of the ruler under parent by calling build(parent),
+			or reuse it from PREVIEW_CACHE when nothing that part depends on
+			(key) has changed since it was last built in this process.
+		"""
+		key = (name,) + key
+		cached = PREVIEW_CACHE.get(key)
+		self.profile.count('cache_misses' if cached is None else 'cache_hits')
+		if cached is None:
+			first = len(parent)
+			used_defs = len(self.used_defs)
+			roles = set(self.stylesheet)
+			with self.profile.phase('effect.' + name):
+				build(parent)
+			# each stylesheet role belongs to a single part
+			cached = (
+				[copy.deepcopy(elem) for elem in parent[first:]],
+				[copy.deepcopy(self.svg.defs.find('*[@id="{}"]'.format(def_id)))
+					for def_id in dict.fromkeys(self.used_defs[used_defs:])],
+				{role: self.stylesheet[role] for role in set(self.stylesheet) - roles},
+			)
+			PREVIEW_CACHE.put(key, cached)
+			return
+		elems, defs, styles = cached
+		for elem in elems:
+			parent.append(copy.deepcopy(elem))
+		for elem in defs:
+			self.used_defs.append(elem.get('id'))
+			if self.svg.defs.find('*[@id="{}"]'.format(elem.get('id'))) is None:
+				self.svg.defs.append(copy.deepcopy(elem))
+		self.stylesheet.update(styles)
+
+	def build_ticks(self, parent):
+		label_line = self.add_group(parent, 'Label_line')
+		short_line = self.add_group(parent, 'Short line')
+		groups = [label_line, short_line]
+		self.profile.count('ticks', len(self.layout.ticks['index']))
+		self.profile.count('tick_levels', len(self.layout.levels))
+		self.profile.count('arrows', self.layout.numeric_label_count())
+		if self.compound or self.instancing != 'none' or self.css_classes:
+			self.add_bulk_ticks(self.layout, groups)
+		else:
+			self.add_ticks(self.layout.ticks, groups)
+
+	def build_perpendicular_lines(self, parent):
+		perpendicular_line = self.add_group(parent, 'Perpendicular line')
+		for segment in self.layout.perpendicular_lines():
+			self.add_segment(segment, perpendicular_line)
+
+	def build_labels(self, parent):
+		blank_out_text = self.add_group(parent, 'Blank behind labels')
+		labels = self.add_group(parent, 'Labels')
+		numeric = self.layout.numeric_labels()
+		self.profile.count('labels', len(numeric) + 2 + len(self.layout.captions()))
+		for label in numeric:
+			self.add_label(label, labels)
+		for label, box in self.layout.dimensions():
+			self.add_label(label, labels)
+			self.add_segment(box, blank_out_text)
+		for label in self.layout.captions():
+			self.add_label(label, labels)
 
-		text = '1 min={}mm   1km={}mm  1mi={}mm  1nm={}mm'.format(max_decimal_digits(self.mm_per_min), one_km_mm, one_mi_mm, one_kt_mm)
-		self.add_label(text, xb, y, group, 'black')
-		self.add_box(xb,y,65)
-                
 ### Main function
 	def effect(self):
-		# Values from UI corrected for units etc.
-		self.speed     = self.options.speed
-		self.speed_unit= self.options.speed_unit
-		self.scale     = self.options.scale
-		self.max_length= self.options.max_length
-		#
-		self.unit      = self.options.unit
-		self.useref    = self.options.useref	# bool
-		self.insidetf  = self.options.insidetf	# bool
-		#
-		self.fontsize     = self.svg.unittouu(str(self.options.fontsize)+"pt")	# all font calcs in pts
-		self.suffix       = self.options.suffix
-		self.labeloffseth = self.svg.unittouu(str(self.options.labeloffseth)+self.unit)
-		self.labeloffsetv = self.svg.unittouu(str(self.options.labeloffsetv)+self.unit)
-		#
-		self.perplinestrokewidth = self.svg.unittouu(str(self.options.perplinestrokewidth)+self.unit)
-		self.perplineoffset      = self.svg.unittouu(str(self.options.perplineoffset)+self.unit)
-		#
-		self.textlinestrokewidth = self.svg.unittouu(str(self.options.textlinestrokewidth)+self.unit)
-		self.textlineoffset      = self.svg.unittouu(str(self.options.textlineoffset)+self.unit)
-		#
-		self.labellinelength      = self.svg.unittouu(str(self.options.labellinelength)+self.unit)
-		self.labellinestrokewidth = self.svg.unittouu(str(self.options.labellinestrokewidth)+self.unit)
-		#
-		self.mark2wid             = self.options.mark2wid / 100
-		self.shortlinestrokewidth = self.svg.unittouu(str(self.options.shortlinestrokewidth)+self.unit)
-        #
-		self.dimensionoffset     = self.svg.unittouu(str(self.options.dimensionoffset)+self.unit)
-        #
-		self.arrow_style = self.options.arrow_style
-		self.arrow_len   = self.options.arrow_len
-		self.arrow_angle = self.options.arrow_angle
+		with self.profile.phase('effect'):
+			if self.options.regenerate:
+				self.regenerate_rulers()
+			else:
+				self.build_ruler()
+
+	def options_record(self, options):
+		""" The ruler options as JSON text, each as the text it would be
+			given as on the command line.
+		"""
+		record = {}
+		for name in RULER_DEFAULTS:
+			value = getattr(options, name)
+			if isinstance(value, (tuple, list)):
+				value = ','.join(str(v) for v in value)
+			record[name] = str(value)
+		return json.dumps(record, sort_keys=True, separators=(',', ':'))
+
+	def recorded_options(self, text):
+		""" Parse an options_record() back into options, or None if it
+			cannot be read. Options added since it was made take their
+			defaults.
+		"""
+		try:
+			record = json.loads(text)
+			args = ['--{}={}'.format(name.replace('_', '-'), value)
+				for name, value in record.items() if name in RULER_DEFAULTS]
+			with contextlib.redirect_stderr(None):
+				options = self.arg_parser.parse_args(args)
+		except (ValueError, AttributeError, SystemExit):
+			return None
+		options.cache = self.options.cache
+		return options
+
+	def regenerate_rulers(self):
+		""" Rebuild in place every ruler whose recorded key no longer
+			matches its recorded options, the document scale and the code,
+			keeping its id and transform. Rulers sharing options are built
+			once. Route ticks, and rulers made before options were recorded,
+			are left as they are.
+		"""
+		unit_scale = self.svg.unittouu('1in')
+		stale = collections.OrderedDict()
+		groups = self.svg.xpath('//svg:g[@{}]'.format(OPTIONS_ATTRIB))
+		for group in groups:
+			options = self.recorded_options(group.attrib[OPTIONS_ATTRIB])
+			if options is None or options.route:
+				continue
+			key = fragment_key('inkex', vars(options), unit_scale)
+			if group.attrib.get(KEY_ATTRIB) != key:
+				stale.setdefault(key, (options, []))[1].append(group)
+		self.profile.count('rulers_recorded', len(groups))
+		self.profile.count('rulers_rebuilt', sum(len(stale_groups) for options, stale_groups in stale.values()))
+		for options, stale_groups in stale.values():
+			rebuilt = self.build_ruler(options, stale_groups[0].getparent(), (0, 0))
+			rebuilt.getparent().remove(rebuilt)
+			for group in stale_groups:
+				replacement = copy.deepcopy(rebuilt)
+				for name in ('id', 'transform'):
+					if name in group.attrib:
+						replacement.attrib[name] = group.attrib[name]
+					else:
+						replacement.attrib.pop(name, None)
+				group.getparent().replace(group, replacement)
+
+	def build_ruler(self, options=None, parent=None, centre=None):
+		""" Add a Speed_scale group for options (by default the options
+			of this run) to parent (by default the current layer), centred
+			on centre (by default the view or the selection). Returns the
+			group.
+		"""
+		options = self.options if options is None else options
+		parent = self.svg.get_current_layer() if parent is None else parent
+		# The resolved values only depend on the options and the document scale
+		options_key = ('options', self.svg.unittouu('1in')) + tuple(sorted(
+			(k, v) for k, v in vars(options).items() if k not in NON_RULER_OPTIONS))
+		resolved = PREVIEW_CACHE.get(options_key)
+		if resolved is None:
+			with self.profile.phase('effect.resolve_units'):
+				resolved = resolve_params(vars(options), self.svg.unittouu)
+			PREVIEW_CACHE.put(options_key, resolved)
+		vars(self).update(resolved)
+		self.coords = CoordinateFormat(self.precision)
+		self.stylesheet = {}
+		self.used_defs  = []
+		if self.route:
+			return self.build_route(resolved, self.options_record(options))
 
 		# Get access to main SVG document element and get its dimensions.
 		doc = self.document.getroot()
@@ -531,75 +867,221 @@ class ScaleGen(inkex.Effect):
 		#inkex.debug(self.labellinelength)
 		#inkex.debug(self.perplineoffset)
 
-		# Put it in the centre of the current view
-		centre = self.svg.namedview.center
-		cx, cy = centre[0], centre[1]
-		# OR use the selected elements to define the center
-		if self.useref: # use center of selected element instead of doc.
-			# get the bbox centers for each selected node
-			bboxes = [node.bounding_box().center for node in self.svg.selected.values()]
-			centers = [ (c.x,c.y) for c in bboxes] # turn vectors into lists
-			# find average of all centers.
-			if len(centers) > 0:
-				cx = sum([c[0] for c in centers]) / len(centers)
-				cy = sum([c[1] for c in centers]) / len(centers)
-
-		# calc external length from scale
-		# mm / min = (km / min)          * ( mm / km )
-		#          =                     * ( scale / km / m )
-		#          = (speed in kmh / 60) * ( scale * 1000 * 1000 )
-
-		self.mm_per_min = ( convert_speed_to_kph(self.speed, self.speed_unit) / 60 ) * ( 1 / ( self.scale / 1000 / 1000 ))
-		self.res = self.mm_per_min / 6
-
-		# Work out how many ticks will fit in the width available
-		# Note: could alternatively use paeg width with:
-		#       width = self.svg.unittouu(doc.get('width'))
-		self.scalefrom = 0
-		self.scaleto = int(self.max_length / self.res)
-		self.scaleto = self.scaleto - (self.scaleto % 6) + 1
-		self.external_length = self.res * (self.scaleto - self.scalefrom)
-
-		# adjust centre for external length
-		cx -= self.external_length/2
-
-		centre = (cx,cy)
-		grp_transform = 'translate' + str( centre )
+		if centre is not None:
+			cx, cy = centre
+		else:
+			# Put it in the centre of the current view
+			centre = self.svg.namedview.center
+			cx, cy = centre[0], centre[1]
+			# OR use the selected elements to define the center
+			if self.useref: # use center of selected element instead of doc.
+				with self.profile.phase('effect.useref_bounding_boxes'):
+					# average of the bbox centers of the selected nodes, in the
+					# coordinates of the layer the ruler goes in
+					centre = selection_centre(self.svg.selected.values(),
+						self.svg.get_current_layer(), BBOX_CACHE)
+					if centre is not None:
+						cx, cy = centre
+				self.profile.count('selected', len(self.svg.selected))
+
+		# a ruler made before, by this or any other run, is inserted as stored
+		cache_key = fragment_key('inkex', vars(options), self.svg.unittouu('1in'))
+		disk_cache = default_cache() if options.cache else None
+		if disk_cache is not None:
+			stored = disk_cache.get(cache_key)
+			self.profile.count('disk_cache_misses' if stored is None else 'disk_cache_hits')
+			if stored is not None:
+				with self.profile.phase('effect.disk_cache'):
+					group = self.insert_fragment(*stored, cx, cy, parent)
+				# the key leaves out placement options such as useref, so
+				# record this run's options rather than the stored run's
+				group.attrib[OPTIONS_ATTRIB] = self.options_record(options)
+				return group
+
+		# one layout per speed, sharing the resolved values
+		layouts = [RulerLayout(dict(resolved, speed=speed)) for speed in resolved['speed']]
+
+		# adjust centre for external length; stacked rulers share their
+		# zero, so centre the longest
+		widest = max(layouts, key=lambda layout: layout.external_length)
+		centre = widest.origin(cx, cy)
+		grp_transform = self.coords.translate(*centre)
 		
 		# top level group
 		grp_name = 'Speed_scale'
-		grp_attribs = {inkex.addNS('label','inkscape'):grp_name, 'transform':grp_transform }
-		toplevel_group = etree.SubElement(self.svg.get_current_layer(), 'g', grp_attribs)
-
-		# other line, label groups
-		grp_name = 'Label_line'
-		grp_attribs = {inkex.addNS('label','inkscape'):grp_name}
-		label_line = etree.SubElement(toplevel_group, 'g', grp_attribs)
-
-		grp_name = 'Short line'
-		grp_attribs = {inkex.addNS('label','inkscape'):grp_name}
-		short_line = etree.SubElement(toplevel_group, 'g', grp_attribs)
-
-		grp_name = 'Perpendicular line'
-		grp_attribs = {inkex.addNS('label','inkscape'):grp_name}
-		perpendicular_line = etree.SubElement(toplevel_group, 'g', grp_attribs)
-
-		grp_name = 'Blank behind labels'
-		grp_attribs = {inkex.addNS('label','inkscape'):grp_name}
-		self.blank_out_text = etree.SubElement(toplevel_group, 'g', grp_attribs)
-
-		grp_name = 'Labels'
-		grp_attribs = {inkex.addNS('label','inkscape'):grp_name}
-		labels = etree.SubElement(toplevel_group, 'g', grp_attribs)
-
-		groups = [label_line, short_line, perpendicular_line, self.blank_out_text, labels]	# holds the svg groups for organising the tick marks, labels and perp line
-
-		for i in range(self.scalefrom, self.scaleto):
-			self.add_straight_line(i, groups)
-		self.add_perpendicular_line(0, perpendicular_line)
-		self.add_perpendicular_line(1, perpendicular_line)
-		self.add_perpendicular_line(2, perpendicular_line)
-		self.add_dimensions(labels)
+		grp_attribs = {inkex.addNS('label','inkscape'):grp_name, 'transform':grp_transform,
+			OPTIONS_ATTRIB: self.options_record(options), KEY_ATTRIB: cache_key}
+		toplevel_group = etree.SubElement(parent, 'g', grp_attribs, nsmap=self.group_nsmap())
+
+		if len(layouts) == 1:
+			self.add_ruler(toplevel_group, layouts[0])
+		else:
+			# each further ruler goes below the one before
+			y = 0
+			for n, layout in enumerate(layouts):
+				top, bottom = layout.extent()
+				if n:
+					y -= top
+				ruler_group = etree.SubElement(toplevel_group, 'g', {
+					inkex.addNS('label','inkscape'): '{}_{}{}'.format(grp_name, layout.speed, self.speed_unit),
+					'transform': self.coords.translate(0, y)})
+				self.add_ruler(ruler_group, layout)
+				y += bottom + self.stack_gap
+			self.profile.count('rulers', len(layouts))
+		if self.css_classes:
+			with self.profile.phase('effect.stylesheet'):
+				self.add_stylesheet(toplevel_group)
+		if disk_cache is not None:
+			with self.profile.phase('effect.disk_cache'):
+				disk_cache.put(cache_key, {'origin': widest.origin(0, 0)},
+					self.stored_fragment(toplevel_group))
+		return toplevel_group
+
+	def stored_fragment(self, group):
+		""" The ruler's group as SVG text for the disk cache: a copy that
+			carries the definitions it uses in its own <defs>.
+		"""
+		group = copy.deepcopy(group)
+		defs = etree.SubElement(group, inkex.addNS('defs','svg'))
+		for def_id in dict.fromkeys(self.used_defs):
+			defs.append(copy.deepcopy(self.svg.defs.find('*[@id="{}"]'.format(def_id))))
+		return etree.tostring(group)
+
+	def insert_fragment(self, meta, fragment, cx, cy, parent):
+		""" Add a ruler group from the disk cache to parent, centred on
+			(cx, cy), moving the definitions it carries to the document
+			<defs> unless they are there already. Returns the group.
+		"""
+		import io
+		group = inkex.load_svg(io.BytesIO(fragment)).getroot()
+		defs = group.find(inkex.addNS('defs','svg'))
+		group.remove(defs)
+		for elem in list(defs):
+			if self.svg.defs.find('*[@id="{}"]'.format(elem.get('id'))) is None:
+				self.svg.defs.append(elem)
+		ox, oy = meta['origin']
+		# as the attribute text, like the group made by build_ruler()
+		group.attrib['transform'] = self.coords.translate(cx + ox, cy + oy)
+		parent.append(group)
+		return group
+
+	def add_ruler(self, group, layout):
+		""" Add the line and label groups of one ruler to group, each reused
+			from the preview cache when the values it depends on have not
+			changed.
+		"""
+		self.layout = layout
+		self.speed  = layout.speed
+		extent = (layout.res, layout.steps, layout.scalefrom, layout.scaleto, self.css_classes,
+			self.precision)
+		self.add_part(group, 'ticks', extent + (
+			self.labellinelength, self.mark2wid, self.labellinestrokewidth,
+			self.shortlinestrokewidth, self.arrow_L, self.arrow_angle,
+			self.arrow_style, self.compound, self.instancing), self.build_ticks)
+		self.add_part(group, 'perpendicular', extent + (
+			self.perplinestrokewidth, self.perplineoffset, self.labellinelength,
+			self.textlinestrokewidth, self.labeloffsetv), self.build_perpendicular_lines)
+		self.add_part(group, 'labels', extent + (
+			self.speed, self.speed_unit, self.scale, self.fontsize,
+			self.font_height_offset, self.labeloffsetv, self.textlinestrokewidth, self.dimensionoffset,
+			self.label_mode, self.caption),
+			self.build_labels)
+
+	def route_legs(self):
+		""" The selected paths as cubic chains in the current layer's
+			coordinates, one per subpath, in selection order.
+		"""
+		to_layer = -self.svg.get_current_layer().composed_transform()
+		legs = []
+		for node in self.svg.selected.values():
+			if not isinstance(node, (inkex.PathElement, inkex.Polyline, inkex.Polygon, inkex.Line)):
+				continue
+			path = node.path.to_absolute().transform(to_layer @ node.composed_transform())
+			for subpath in path.to_superpath():
+				legs.append([a[1] + a[2] + b[0] + b[1] for a, b in zip(subpath, subpath[1:])])
+		return legs
+
+	def build_route(self, resolved, record):
+		""" Place the time ticks and minute labels along the selected
+			paths, taken as the legs of one route. record is the
+			options_record() kept on the group; a route is not
+			regenerated, as the route itself is not recorded.
+		"""
+		if len(resolved['speed']) > 1:
+			raise inkex.AbortExtension('Ticks along a route take a single speed')
+		with self.profile.phase('effect.route'):
+			try:
+				index = RouteIndex(self.route_legs())
+			except ValueError:
+				raise inkex.AbortExtension('Select the route path to place the ticks along')
+			self.layout = layout = RouteLayout(dict(resolved, speed=resolved['speed'][0]), index)
+			self.speed = layout.speed
+
+			grp_attribs = {inkex.addNS('label','inkscape'): 'Speed_scale', OPTIONS_ATTRIB: record}
+			toplevel_group = etree.SubElement(self.svg.get_current_layer(), 'g', grp_attribs,
+				nsmap=self.group_nsmap())
+			ticks = self.add_group(toplevel_group, 'Route ticks')
+			segments = layout.tick_segments()
+			if self.compound:
+				# one path per tick style and colour
+				by_role = collections.OrderedDict()
+				for segment in segments:
+					by_role.setdefault(segment.role, []).append(segment)
+				for role, group in by_role.items():
+					name, colour = role.rsplit('-', 1)
+					etree.SubElement(ticks, inkex.addNS('path','svg'), dict(
+						self.style_attribs(role, group[0].style), **{
+						inkex.addNS('label','inkscape'): '{}s_{}'.format(name.replace('-', '_'), colour),
+						'd': self.coords.lines((s.x1, s.y1, s.x2, s.y2) for s in group),
+					}))
+			else:
+				for segment in segments:
+					self.add_segment(segment, ticks)
+			labels = self.add_group(toplevel_group, 'Labels')
+			numeric = layout.numeric_labels()
+			for label in numeric:
+				self.add_label(label, labels)
+		self.profile.count('ticks', len(segments))
+		self.profile.count('labels', len(numeric))
+		if self.css_classes:
+			with self.profile.phase('effect.stylesheet'):
+				self.add_stylesheet(toplevel_group)
+		return toplevel_group
+
+### Batch generation
+# A blank A3 landscape document (user units are mm) used when rulers are
+# generated outside Inkscape. The view is centred on the page (cx and cy
+# are in px, chosen to convert to exactly 210 and 148.5 mm) and the layer
+# is current, so the ruler goes in the layer in the middle of the page.
+BLANK_DOCUMENT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+    xmlns:xlink="http://www.w3.org/1999/xlink"
+    xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+    xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"
+    width="420mm" height="297mm" viewBox="0 0 420 297">
+  <sodipodi:namedview id="namedview1" inkscape:cx="793.7007874015748"
+    inkscape:cy="561.259842519685" inkscape:current-layer="layer1"/>
+  <g inkscape:groupmode="layer" inkscape:label="Layer 1" id="layer1"/>
+</svg>
+"""
+
+def run_effect(args, document=BLANK_DOCUMENT, output=None, command='run_effect'):
+    """Run ScaleGen over an in-memory document without going through
+    Inkscape and return the effect, so the caller can pick up
+    effect.document or the generated group. If output is given the
+    modified document is also saved to it, as Inkscape would receive it.
+    """
+    import io
+    effect = ScaleGen()
+    effect.parse_arguments(list(args))
+    effect.options.input_file = io.BytesIO(document)
+    effect.load_raw()
+    ret = effect.effect()
+    if output is not None:
+        effect.options.output = output
+        effect.save_raw(ret)
+    effect.profile.emit(command=command)
+    return effect
 
 ###
 if __name__ == '__main__':
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+Batch generation of speed scale rulers, run as
+
+    python render_speed_scale.py batch [options]
+
+Only the streaming path (--stream, and any --format other than svg)
+avoids importing inkex; otherwise each ruler is built by ScaleGen on a
+blank document.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import sys
+
+from speed_scale_layout import parse_range
+
+def batch_jobs(speeds, speed_units, scales, spec=None):
+    """Expand the parameter matrix into a list of option dicts.
+
+    spec is the parsed JSON spec file. It is either a list of option dicts
+    (used as-is) or a dict of option name to list of values (expanded as a
+    matrix, overriding the ranges given on the command line).
+    """
+    import itertools
+    if isinstance(spec, list):
+        return [dict(job) for job in spec]
+    matrix = {
+        'speed': speeds,
+        'speed-unit': speed_units,
+        'scale': scales,
+    }
+    if spec:
+        matrix.update({k: v if isinstance(v, list) else [v] for k, v in spec.items()})
+    names = list(matrix)
+    return [dict(zip(names, values)) for values in itertools.product(*matrix.values())]
+
+def job_args(job, extra):
+    """Turn an option dict into extension command line arguments."""
+    return ['--{}={}'.format(name, value) for name, value in job.items()] + list(extra)
+
+def job_filename(job, fmt='svg', keys=()):
+    """The file for job: its speed, speed unit and scale, and the values of
+    any further option names in keys, e.g. the ones that vary between jobs.
+    """
+    import re
+    from speed_scale_layout import RULER_DEFAULTS
+    speed = job.get('speed', ','.join(str(v) for v in RULER_DEFAULTS['speed']))
+    name = 'speed_scale_{}{}_1-{}K'.format(speed,
+        job.get('speed-unit', RULER_DEFAULTS['speed_unit']),
+        int(int(job.get('scale', RULER_DEFAULTS['scale'])) / 1000))
+    for key in keys:
+        if key in job:
+            name += re.sub(r'[^\w.,+-]', '_', '_{}{}'.format(key, job[key]))
+    return '{}.{}'.format(name, fmt)
+
+def varied_keys(jobs):
+    """Option names other than speed, speed unit and scale whose value is not
+    the same in every job, in the order they first appear.
+    """
+    keys = []
+    for job in jobs:
+        for key in job:
+            if key not in ('speed', 'speed-unit', 'scale') and key not in keys and any(
+                    other.get(key) != job[key] for other in jobs):
+                keys.append(key)
+    return keys
+
+def check_job(job, extra, parser=None):
+    """Raise ValueError if a worker would fail to parse the arguments for
+    job: with parser (ScaleGen's) for the inkex paths, else as the
+    streaming writers do, where every name must be a ruler option.
+    """
+    import contextlib, io
+    from speed_scale_layout import options_from_args, ruler_speed
+    args = job_args(job, extra)
+    if parser is None:
+        ruler_speed(options_from_args(args, strict=True))
+        return
+    messages = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(messages):
+            parser.parse_args(args)
+    except SystemExit:
+        raise ValueError(messages.getvalue().strip().splitlines()[-1].split('error: ', 1)[-1])
+
+def _run_job(task):
+    """Worker: run worker(args) and return (name, None, result), or
+    (name, error message, None) if it fails. Nothing is raised, as an
+    exception or SystemExit in a pool process would leave the pool
+    waiting for a result forever.
+    """
+    worker, args, name = task
+    try:
+        return name, None, worker(args)
+    except (Exception, SystemExit) as err:
+        return name, '{}: {}'.format(type(err).__name__, err), None
+
+def sheet_rows(jobs, extra, margin, pitch):
+    """Stack the rulers for jobs under each other, each row as tall as its
+    ruler plus pitch. Returns the sheet width and height and the origin of
+    each ruler.
+    """
+    from speed_scale_layout import RulerLayout, options_from_args, resolve_params, unittouu_for
+    unittouu = unittouu_for('mm')
+    origins = []
+    width, y = 0.0, margin
+    for job in jobs:
+        layout = RulerLayout(resolve_params(options_from_args(job_args(job, extra)), unittouu))
+        left, top, right, bottom = layout.bounds()
+        origins.append((margin - left, y - top))
+        width = max(width, right - left)
+        y += bottom - top + pitch
+    return width + 2 * margin, y - pitch + margin if jobs else 2 * margin, origins
+
+def _batch_file(task):
+    """Worker: render one ruler to its own SVG file."""
+    from render_speed_scale import run_effect
+    job, extra, path, fmt = task
+    effect = run_effect(job_args(job, extra))
+    effect.document.write(path)
+    return path
+
+def _batch_fragment(task):
+    """Worker: render one ruler and return its Speed_scale group, moved to
+    its row on the shared sheet, and the <defs> it refers to.
+    """
+    from lxml import etree
+    from render_speed_scale import run_effect
+    job, extra, x, y = task
+    effect = run_effect(job_args(job, extra))
+    group = effect.svg.get_current_layer()[-1]
+    group.set('transform', 'translate({},{})'.format(x, y))
+    return etree.tostring(group), [etree.tostring(elem) for elem in effect.svg.defs]
+
+def _stream_file(task):
+    """Worker: write one ruler to its own file with the streaming writer
+    for its format.
+    """
+    from speed_scale_layout import options_from_args
+    from speed_scale_export import write_ruler_document
+    job, extra, path, fmt = task
+    with open(path, 'wb') as stream:
+        write_ruler_document(stream, options_from_args(job_args(job, extra)), fmt)
+    return path
+
+def _stream_fragment(task):
+    """Worker: lay out one ruler at its row on the shared sheet and return it
+    as text in the sheet's format, with the definitions it uses.
+    """
+    from speed_scale_layout import RulerLayout, options_from_args, resolve_params, unittouu_for
+    from speed_scale_export import exporter_for
+    job, extra, x, y, fmt, height = task
+    options = options_from_args(job_args(job, extra))
+    writer = exporter_for(None, options, fmt, height)
+    layout = RulerLayout(resolve_params(options, unittouu_for('mm')))
+    return writer.ruler_text(layout, (x, y)), writer.defs
+
+def batch_main(argv=None):
+    """Generate every ruler in a speed x speed unit x scale matrix.
+
+    Rulers are built in a pool of long-lived worker processes, so Python
+    and inkex start up once per worker rather than once per ruler. Any
+    unrecognised arguments are passed through to every ruler, e.g.
+    --max-length=200.
+    """
+    import argparse, json, os
+    from multiprocessing import Pool
+    from speed_scale_export import FORMATS
+    from speed_scale_layout import options_from_args, ruler_speed
+
+    parser = argparse.ArgumentParser(prog='render_speed_scale.py batch',
+        description=batch_main.__doc__.splitlines()[0])
+    parser.add_argument('--speeds', default='60',
+        help='Speeds, e.g. 30:200:10 or 80,90,100')
+    parser.add_argument('--speed-units', default='kts',
+        help='Comma separated speed units (kts, mph, kph)')
+    parser.add_argument('--scales', default='200000',
+        help='Comma separated chart scales, e.g. 200000,250000,500000')
+    parser.add_argument('--spec',
+        help='JSON spec file: a list of option dicts or a dict of option lists')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+        help='Worker processes (default: one per CPU)')
+    parser.add_argument('-o', '--output-dir', default='.',
+        help='Directory for one SVG per ruler')
+    parser.add_argument('--sheet',
+        help='Write every ruler onto this single SVG instead')
+    parser.add_argument('--pitch', type=float, default=5,
+        help='Extra vertical space between rulers on a sheet (mm)')
+    parser.add_argument('--margin', type=float, default=10,
+        help='Sheet margin (mm)')
+    parser.add_argument('--stream', action='store_true',
+        help='Write SVG text directly instead of running the effect on a DOM')
+    parser.add_argument('--format', choices=FORMATS, default='svg',
+        help='Output format; pdf and dxf are always streamed')
+    opts, extra = parser.parse_known_args(argv)
+    stream = opts.stream or opts.format != 'svg'
+    try:
+        options = options_from_args(extra)
+    except ValueError as err:
+        parser.error(str(err))
+
+    spec = None
+    if opts.spec:
+        with open(opts.spec) as spec_file:
+            spec = json.load(spec_file)
+    jobs = batch_jobs(parse_range(opts.speeds),
+        [u.strip() for u in opts.speed_units.split(',') if u.strip()],
+        parse_range(opts.scales), spec)
+    keys = varied_keys(jobs)
+    names = [job_filename(job, opts.format, keys) for job in jobs]
+    # fail here rather than in a worker, before anything is written
+    arg_parser = None
+    if not stream:
+        from render_speed_scale import ScaleGen
+        arg_parser = ScaleGen().arg_parser
+    for job, name in zip(jobs, names):
+        try:
+            check_job(job, extra, arg_parser)
+            if opts.sheet:
+                # a sheet row holds one ruler
+                ruler_speed(options_from_args(job_args(job, extra)))
+        except ValueError as err:
+            parser.error('{}: {}'.format(name, err))
+    if not opts.sheet:
+        seen = set()
+        for name in names:
+            if name in seen:
+                parser.error('more than one job would be written to {}'.format(name))
+            seen.add(name)
+
+    errors = []
+    def run(worker, tasks, ordered=True):
+        """Run worker over tasks in the pool, yielding each result and
+        reporting each failure.
+        """
+        tasks = [(worker, task, name) for task, name in zip(tasks, names)]
+        for name, error, result in (pool.imap if ordered else pool.imap_unordered)(_run_job, tasks):
+            if error is None:
+                yield result
+            else:
+                errors.append(name)
+                sys.stderr.write('{}: {}\n'.format(name, error))
+
+    with Pool(opts.jobs) as pool:
+        if opts.sheet and stream:
+            from speed_scale_export import exporter_for
+            width, height, origins = sheet_rows(jobs, extra, opts.margin, opts.pitch)
+            tasks = [(job, extra, x, y, opts.format, height)
+                for job, (x, y) in zip(jobs, origins)]
+            fragments = list(run(_stream_fragment, tasks))
+            if errors:
+                return 1
+            with open(opts.sheet, 'wb') as output:
+                writer = exporter_for(output, options, opts.format)
+                writer.start_document(width, height)
+                for text, defs in fragments:
+                    writer.write(text)
+                    writer.defs.update(defs)
+                writer.end_document()
+        elif opts.sheet:
+            import inkex
+            from lxml import etree
+            from render_speed_scale import BLANK_DOCUMENT
+            width, height, origins = sheet_rows(jobs, extra, opts.margin, opts.pitch)
+            tasks = [(job, extra, x, y) for job, (x, y) in zip(jobs, origins)]
+            fragments = list(run(_batch_fragment, tasks))
+            if errors:
+                return 1
+            sheet = inkex.load_svg(BLANK_DOCUMENT).getroot()
+            sheet.set('width', '{}mm'.format(width))
+            sheet.set('height', '{}mm'.format(height))
+            sheet.set('viewBox', '0 0 {} {}'.format(width, height))
+            layer = sheet.getElementById('layer1')
+            for fragment, defs in fragments:
+                layer.append(etree.fromstring(fragment))
+                for elem in defs:
+                    elem = etree.fromstring(elem)
+                    if sheet.defs.find('*[@id="{}"]'.format(elem.get('id'))) is None:
+                        sheet.defs.append(elem)
+            sheet.getroottree().write(opts.sheet)
+        else:
+            os.makedirs(opts.output_dir, exist_ok=True)
+            tasks = [(job, extra, os.path.join(opts.output_dir, name), opts.format)
+                for job, name in zip(jobs, names)]
+            worker = _stream_file if stream else _batch_file
+            for path in run(worker, tasks, ordered=False):
+                print(path)
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(batch_main(sys.argv[1:]))
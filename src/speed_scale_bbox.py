@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+Bounding boxes of large selections, for centring a ruler on them.
+
+inkex works out a bounding box one element at a time, building a Path
+object per segment, which is slow when the selection is a whole chart
+layer. Here the coordinates of every selected path, rectangle, line,
+polyline, circle and ellipse are collected into flat lists in one pass,
+then transformed, given their curve extrema and reduced to boxes with
+NumPy. The results match BoundingBox from inkex, except that circles and
+ellipses are exact where inkex measures a Bezier approximation. Anything
+else (text, clones, arcs, clipped selections) falls back to inkex.
+
+Boxes are in the coordinates of the layer the ruler is added to, with
+every transform between the element and that layer composed. They are
+cached per element, keyed by its geometry, so previews re-run in one
+process only compute boxes for what changed.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import functools, re
+
+import numpy as np
+import inkex
+
+SVG = '{http://www.w3.org/2000/svg}'
+GROUP_TAGS = (SVG + 'g', SVG + 'a')
+GEOMETRY = ('d', 'x', 'y', 'width', 'height', 'x1', 'y1', 'x2', 'y2', 'points',
+    'cx', 'cy', 'r', 'rx', 'ry')
+
+PATH_TOKEN = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# Attributes are read through elem.attrib rather than elem.get(): inkex
+# elements answer get('d') or get('transform') by building a Path or
+# Transform object first, which costs more than the whole box.
+
+@functools.lru_cache(maxsize=4096)
+def parse_transform(text):
+    """The transform attribute text as (a, b, c, d, e, f)."""
+    if not text:
+        return IDENTITY
+    (a, c, e), (b, d, f) = inkex.Transform(text).matrix
+    return (a, b, c, d, e, f)
+
+def compose(outer, inner):
+    """outer @ inner for (a, b, c, d, e, f) matrices."""
+    a1, b1, c1, d1, e1, f1 = outer
+    a2, b2, c2, d2, e2, f2 = inner
+    return (a1*a2 + c1*b2, b1*a2 + d1*b2, a1*c2 + c1*d2, b1*c2 + d1*d2,
+        a1*e2 + c1*f2 + e1, b1*e2 + d1*f2 + f1)
+
+def invert(m):
+    a, b, c, d, e, f = m
+    det = a*d - b*c
+    return (d/det, -b/det, -c/det, a/det, (c*f - d*e)/det, (b*e - a*f)/det)
+
+def path_geometry(d):
+    """Split path data into the points a bounding box needs: the end
+    points of every segment, and the control polygons of the curves
+    (quadratics raised to cubics), all absolute. Returns (points, cubics)
+    as lists of x, y pairs and of 8-tuples, or None if the path has arcs.
+    """
+    tokens = PATH_TOKEN.findall(d)
+    points, cubics = [], []
+    x = y = sx = sy = 0.0
+    cx = cy = None      # last cubic control point, for S
+    qx = qy = None      # last quadratic control point, for T
+    command = None
+    i, n = 0, len(tokens)
+    while i < n:
+        token = tokens[i]
+        if token.isalpha():
+            command = token
+            i += 1
+            if command in 'Zz':
+                x, y = sx, sy
+                cx = qx = None
+                continue
+        elif command is None:
+            return None
+        upper = command.upper()
+        rel = command != upper
+        ox, oy = (x, y) if rel else (0.0, 0.0)
+        try:
+            if upper == 'M' or upper == 'L' or upper == 'T':
+                nx, ny = float(tokens[i]) + ox, float(tokens[i+1]) + oy
+                i += 2
+                if upper == 'T':
+                    if qx is None:
+                        qx, qy = x, y
+                    else:
+                        qx, qy = 2*x - qx, 2*y - qy
+                    cubics.append((x, y, x + 2/3*(qx - x), y + 2/3*(qy - y),
+                        nx + 2/3*(qx - nx), ny + 2/3*(qy - ny), nx, ny))
+                else:
+                    qx = None
+                if upper == 'M':
+                    sx, sy = nx, ny
+                    # further pairs are line segments
+                    command = 'l' if rel else 'L'
+                x, y = nx, ny
+                cx = None
+            elif upper == 'H':
+                x = float(tokens[i]) + (x if rel else 0.0)
+                i += 1
+                cx = qx = None
+            elif upper == 'V':
+                y = float(tokens[i]) + (y if rel else 0.0)
+                i += 1
+                cx = qx = None
+            elif upper == 'C' or upper == 'S':
+                if upper == 'C':
+                    x1, y1 = float(tokens[i]) + ox, float(tokens[i+1]) + oy
+                    i += 2
+                elif cx is None:
+                    x1, y1 = x, y
+                else:
+                    x1, y1 = 2*x - cx, 2*y - cy
+                x2, y2 = float(tokens[i]) + ox, float(tokens[i+1]) + oy
+                nx, ny = float(tokens[i+2]) + ox, float(tokens[i+3]) + oy
+                i += 4
+                cubics.append((x, y, x1, y1, x2, y2, nx, ny))
+                x, y, cx, cy, qx = nx, ny, x2, y2, None
+            elif upper == 'Q':
+                qx, qy = float(tokens[i]) + ox, float(tokens[i+1]) + oy
+                nx, ny = float(tokens[i+2]) + ox, float(tokens[i+3]) + oy
+                i += 4
+                cubics.append((x, y, x + 2/3*(qx - x), y + 2/3*(qy - y),
+                    nx + 2/3*(qx - nx), ny + 2/3*(qy - ny), nx, ny))
+                x, y, cx = nx, ny, None
+            else:
+                return None
+        except (IndexError, ValueError):
+            # truncated data: the rest of the path is not drawn
+            break
+        points.append((x, y))
+    return points, cubics
+
+def shape_geometry(elem):
+    """Like path_geometry() for the simple shapes; circles and ellipses
+    are returned as ('ellipse', cx, cy, rx, ry). None if elem needs inkex.
+    """
+    tag = elem.tag
+    get = elem.attrib.get
+    try:
+        if tag == SVG + 'path':
+            return path_geometry(get('d') or '')
+        if tag == SVG + 'rect':
+            x, y = float(get('x', 0)), float(get('y', 0))
+            w, h = float(get('width', 0)), float(get('height', 0))
+            return [(x, y), (x + w, y), (x, y + h), (x + w, y + h)], []
+        if tag == SVG + 'line':
+            return [(float(get('x1', 0)), float(get('y1', 0))),
+                (float(get('x2', 0)), float(get('y2', 0)))], []
+        if tag in (SVG + 'polyline', SVG + 'polygon'):
+            values = [float(v) for v in NUMBER.findall(get('points') or '')]
+            return list(zip(values[0::2], values[1::2])), []
+        if tag == SVG + 'circle':
+            r = float(get('r', 0))
+            return ('ellipse', float(get('cx', 0)), float(get('cy', 0)), r, r)
+        if tag == SVG + 'ellipse':
+            return ('ellipse', float(get('cx', 0)), float(get('cy', 0)),
+                float(get('rx', 0)), float(get('ry', 0)))
+    except ValueError:
+        # lengths with units
+        return None
+    return None
+
+def cubic_extrema(cubics):
+    """The points where (n, 8) transformed cubics reach their extremes in
+    x or y, inside the segments.
+    """
+    p0, p1, p2, p3 = cubics[:, 0:2], cubics[:, 2:4], cubics[:, 4:6], cubics[:, 6:8]
+    # B'(t)/3 = a t^2 + b t + c, per axis
+    a = -p0 + 3*p1 - 3*p2 + p3
+    b = 2*(p0 - 2*p1 + p2)
+    c = p1 - p0
+    roots = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        disc = np.sqrt(b*b - 4*a*c)
+        quadratic = np.abs(a) > 1e-12
+        linear_root = np.where(np.abs(b) > 1e-12, -c / b, np.nan)
+        roots.append(np.where(quadratic, (-b + disc) / (2*a), linear_root))
+        roots.append(np.where(quadratic, (-b - disc) / (2*a), np.nan))
+    ts = np.concatenate(roots, axis=1)            # (n, 4): both roots for x and y
+    owner = np.repeat(np.arange(len(cubics)), 4)
+    t = ts.ravel()
+    keep = (t > 0) & (t < 1)
+    t, owner = t[keep][:, None], owner[keep]
+    mt = 1 - t
+    points = (mt**3 * p0[owner] + 3*mt*mt*t * p1[owner] + 3*mt*t*t * p2[owner]
+        + t**3 * p3[owner])
+    return points, owner
+
+class BoundingBoxes():
+    """Work out boxes for many elements at once.
+
+    add() queues an element under a matrix composed up to its parent;
+    boxes() then returns (x1, y1, x2, y2), or None, for each queued element.
+    cache is a dict-like (get/put) object keeping leaf boxes between runs.
+    """
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.leaves = []        # (owner, box or None) for leaves known already
+        self.points, self.point_owner = [], []
+        self.cubics, self.cubic_owner = [], []
+        self.ellipses, self.ellipse_owner = [], []
+        self.pending = []       # (leaf index, cache key) computed in bulk
+        self.count = 0
+
+    def add(self, elem, parent_matrix, clip=True):
+        owner = self.count
+        self.count += 1
+        if clip and elem.attrib.get('clip-path'):
+            # clipped boxes are left to inkex
+            self.leaves.append((owner, self.inkex_box(elem, parent_matrix, clip=True)))
+            return owner
+        self.add_leaves(elem, owner, parent_matrix)
+        return owner
+
+    def add_leaves(self, elem, owner, parent_matrix):
+        matrix = compose(parent_matrix, parse_transform(elem.attrib.get('transform')))
+        if elem.tag in GROUP_TAGS:
+            for child in elem:
+                if isinstance(child, inkex.ShapeElement):
+                    self.add_leaves(child, owner, matrix)
+            return
+        key = None
+        if self.cache is not None:
+            key = (elem.tag, matrix) + tuple(elem.attrib.get(name) for name in GEOMETRY)
+            box = self.cache.get(key)
+            if box is not None:
+                self.leaves.append((owner, box))
+                return
+        geometry = shape_geometry(elem)
+        if geometry is None:
+            box = self.inkex_box(elem, parent_matrix)
+            self.leaves.append((owner, box))
+            if key is not None and box is not None:
+                self.cache.put(key, box)
+            return
+        leaf = len(self.pending)
+        self.pending.append((owner, key))
+        if geometry[0] == 'ellipse':
+            self.ellipses.append(geometry[1:] + matrix)
+            self.ellipse_owner.append(leaf)
+            return
+        points, cubics = geometry
+        self.points.extend(point + matrix for point in points)
+        self.point_owner.extend([leaf] * len(points))
+        self.cubics.extend(cubic + matrix for cubic in cubics)
+        self.cubic_owner.extend([leaf] * len(cubics))
+
+    def inkex_box(self, elem, parent_matrix, clip=False):
+        a, b, c, d, e, f = parent_matrix
+        transform = inkex.Transform(((a, c, e), (b, d, f)))
+        box = elem.bounding_box(transform) if clip else elem.shape_box(transform)
+        if box is None:
+            return None
+        return (box.left, box.top, box.right, box.bottom)
+
+    def leaf_boxes(self):
+        """Boxes for the leaves queued for bulk computation."""
+        count = len(self.pending)
+        lo = np.full((count, 2), np.inf)
+        hi = np.full((count, 2), -np.inf)
+
+        def include(points, owner):
+            if len(points):
+                np.minimum.at(lo, owner, points)
+                np.maximum.at(hi, owner, points)
+
+        def transform(xy, m):
+            # m columns: a, b, c, d, e, f
+            return np.stack([m[:, 0]*xy[:, 0] + m[:, 2]*xy[:, 1] + m[:, 4],
+                m[:, 1]*xy[:, 0] + m[:, 3]*xy[:, 1] + m[:, 5]], axis=1)
+
+        if self.points:
+            rows = np.array(self.points)
+            include(transform(rows[:, :2], rows[:, 2:]), np.array(self.point_owner))
+        if self.cubics:
+            rows = np.array(self.cubics)
+            m = rows[:, 8:]
+            cubics = np.concatenate([transform(rows[:, k:k+2], m) for k in (0, 2, 4, 6)], axis=1)
+            points, owner = cubic_extrema(cubics)
+            include(points, np.array(self.cubic_owner)[owner])
+        if self.ellipses:
+            rows = np.array(self.ellipses)
+            cx, cy, rx, ry = rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3]
+            m = rows[:, 4:]
+            centre = transform(np.stack([cx, cy], axis=1), m)
+            half = np.stack([np.hypot(m[:, 0]*rx, m[:, 2]*ry), np.hypot(m[:, 1]*rx, m[:, 3]*ry)], axis=1)
+            include(np.concatenate([centre - half, centre + half]),
+                np.tile(np.array(self.ellipse_owner), 2))
+        boxes = []
+        for (x1, y1), (x2, y2) in zip(lo.tolist(), hi.tolist()):
+            boxes.append((x1, y1, x2, y2) if x1 <= x2 else None)
+        return boxes
+
+    def boxes(self):
+        """(x1, y1, x2, y2) or None for every element added, in order."""
+        result = [None] * self.count
+        def union(owner, box):
+            if box is None:
+                return
+            old = result[owner]
+            result[owner] = box if old is None else (min(old[0], box[0]), min(old[1], box[1]),
+                max(old[2], box[2]), max(old[3], box[3]))
+        for owner, box in self.leaves:
+            union(owner, box)
+        for (owner, key), box in zip(self.pending, self.leaf_boxes()):
+            union(owner, box)
+            if key is not None and box is not None:
+                self.cache.put(key, box)
+        return result
+
+def layer_matrix(layer):
+    """The matrix from document coordinates into layer's coordinates."""
+    matrix = IDENTITY
+    for elem in reversed([layer] + list(layer.iterancestors())):
+        matrix = compose(matrix, parse_transform(elem.attrib.get('transform')))
+    return invert(matrix)
+
+def selection_centre(nodes, layer, cache=None):
+    """The average of the bounding box centres of nodes, in layer's
+    coordinates, or None if none of them has a box.
+    """
+    to_layer = layer_matrix(layer)
+    parents = {}
+    boxes = BoundingBoxes(cache)
+    for node in nodes:
+        parent = node.getparent()
+        if parent not in parents:
+            matrix = IDENTITY
+            for elem in reversed([parent] + list(parent.iterancestors())):
+                matrix = compose(matrix, parse_transform(elem.attrib.get('transform')))
+            parents[parent] = compose(to_layer, matrix)
+        boxes.add(node, parents[parent])
+    found = [box for box in boxes.boxes() if box is not None]
+    if not found:
+        return None
+    found = np.array(found)
+    return (float(((found[:, 0] + found[:, 2]) / 2).mean()),
+        float(((found[:, 1] + found[:, 3]) / 2).mean()))
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+A cache of generated Speed_scale groups on disk, shared by every run (and
+every user of a shared directory), so a ruler that has been made before
+is inserted as stored rather than laid out and emitted again.
+
+Entries are addressed by a hash of the normalised ruler options, the
+document's unit scale and the extension's code, so a change to any of
+them is simply a miss. Each entry is written to a temporary file and
+renamed into place, so concurrent runs only ever see whole entries. The
+directory is kept under a size cap by removing the least recently used
+entries; a hit marks its entry as used.
+
+The cache lives in $SPEED_SCALE_CACHE, else $XDG_CACHE_HOME/speed-scale
+or ~/.cache/speed-scale. Setting SPEED_SCALE_CACHE to an empty string
+turns it off. SPEED_SCALE_CACHE_SIZE sets the cap in MB.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import functools, hashlib, json, os, time
+
+CACHE_ENV = 'SPEED_SCALE_CACHE'
+CACHE_SIZE_ENV = 'SPEED_SCALE_CACHE_SIZE'
+DEFAULT_SIZE_MB = 32
+SUFFIX = '.svgf'
+TEMP_PREFIX = '.tmp-'
+TEMP_MAX_AGE = 3600     # seconds before a left over temporary file is removed
+
+# modules whose code decides what a ruler looks like
+MODULES = ('render_speed_scale.py', 'speed_scale_layout.py', 'speed_scale_svg.py',
+    'speed_scale_glyphs.py', 'speed_scale_metrics.py', 'speed_scale_splice.py')
+
+# ruler options that only decide where the ruler goes
+PLACEMENT_OPTIONS = {'useref', 'route'}
+
+def cache_dir():
+    """The cache directory, or None if the cache is turned off."""
+    if CACHE_ENV in os.environ:
+        return os.environ[CACHE_ENV] or None
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'speed-scale')
+
+def current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """A hash of the extension's code."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for name in MODULES:
+        with open(os.path.join(here, name), 'rb') as stream:
+            digest.update(stream.read())
+    return digest.hexdigest()
+
+def normalise_options(options):
+    """The ruler options in options (a dict) that decide the ruler's
+    content, with numbers as floats and sequences as lists, so equal
+    rulers give equal keys however their options were given.
+    """
+    from speed_scale_layout import RULER_DEFAULTS
+    normalised = {}
+    for name, default in RULER_DEFAULTS.items():
+        if name in PLACEMENT_OPTIONS:
+            continue
+        value = options.get(name, default)
+        if isinstance(value, (tuple, list)):
+            value = [float(v) for v in value]
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        normalised[name] = value
+    return normalised
+
+def fragment_key(kind, options, unit_scale):
+    """The cache key for a ruler: kind names the code that emits it,
+    unit_scale is the size of an inch in the document's user units.
+    """
+    text = json.dumps({
+        'kind': kind,
+        'options': normalise_options(options),
+        'unit_scale': repr(float(unit_scale)),
+        'version': code_version(),
+    }, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class FragmentCache():
+    """Stored fragments (SVG text) with a little metadata, in directory,
+    holding at most max_bytes.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_SIZE_MB << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """Return (meta, fragment) stored for key, or None."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as stream:
+                meta = json.loads(stream.readline().decode())
+                fragment = stream.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            # missing, removed while being read, or unreadable
+            return None
+        if meta.get('key') != key:
+            return None
+        return meta, fragment
+
+    def put(self, key, meta, fragment):
+        """Store fragment (bytes) and meta (a JSON-able dict) for key."""
+        import tempfile
+        meta = dict(meta, key=key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=self.directory, prefix=TEMP_PREFIX)
+            try:
+                # readable by whoever may share the directory, as for any new file
+                os.chmod(temp, 0o666 & ~current_umask())
+                with os.fdopen(fd, 'wb') as stream:
+                    stream.write(json.dumps(meta).encode() + b'\n')
+                    stream.write(fragment)
+                os.replace(temp, self.path(key))
+            except BaseException:
+                os.unlink(temp)
+                raise
+        except OSError:
+            # a cache that cannot be written is only a slower run
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits."""
+        entries, total, now = [], 0, time.time()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if name.startswith(TEMP_PREFIX):
+                    if now - stat.st_mtime > TEMP_MAX_AGE:
+                        os.unlink(path)
+                    continue
+            except OSError:
+                continue
+            if name.endswith(SUFFIX):
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, path = entries.pop(0)
+            try:
+                os.unlink(path)
+            except OSError:
+                # already removed by another process
+                pass
+            total -= size
+
+def default_cache():
+    """The shared FragmentCache, or None if it is turned off."""
+    directory = cache_dir()
+    if not directory:
+        return None
+    try:
+        size = float(os.environ.get(CACHE_SIZE_ENV, DEFAULT_SIZE_MB))
+    except ValueError:
+        size = DEFAULT_SIZE_MB
+    return FragmentCache(directory, int(size * (1 << 20)))
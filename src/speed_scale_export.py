@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+PDF and DXF writers for speed scale rulers, for print and plotter
+pipelines that would otherwise export every ruler through Inkscape.
+
+Like the SVG writer in speed_scale_svg, they write rulers laid out by
+speed_scale_layout.RulerLayout straight to a stream, one ruler at a time,
+with neither inkex nor lxml. Both draw the same geometry as ScaleGen: the
+tick lines and arrowheads, the perpendicular lines and label backgrounds,
+and the labels, as text or (with --label-mode=strokes) as the
+single-stroke font.
+
+PDF text is set in DejaVu Sans, the font the label metrics are taken
+from, with its widths given but the font not embedded. DXF is written as
+AutoCAD R12 with y up. It has the lines, arrowheads (SOLID) and labels on
+layers named after their part, in red or black. Stroke widths and the
+white label backgrounds are left out of the DXF, as a plotter or laser
+has no use for them.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import zlib
+
+from speed_scale_layout import TICK_LABEL, LENGTH_UNITS
+from speed_scale_glyphs import STROKE_WIDTH, drawable, glyph_lines, layout_text
+from speed_scale_metrics import ADVANCE_WIDTHS, UNITS_PER_EM, text_extent
+from speed_scale_svg import CoordinateFormat, writer_for
+
+FORMATS = ('svg', 'pdf', 'dxf')
+
+# decimals written when --precision does not set them; a micron in mm
+DEFAULT_PRECISION = 3
+
+RGB = {'black': (0, 0, 0), 'red': (1, 0, 0), 'white': (1, 1, 1)}
+ACI = {'black': 7, 'red': 1}    # AutoCAD colour index; 7 is black on paper
+
+def ruler_drawing(layout):
+    """The parts of a ruler, in the order ScaleGen draws them, as tuples:
+
+        ('lines', layer, colour, width, [(x1, y1, x2, y2), ...])
+        ('polygons', layer, colour, [[(x, y), ...], ...])
+        ('label', layer, label)
+    """
+    p = layout.params
+    ticks = layout.ticks
+    label = ticks['kind'] == TICK_LABEL
+    y2 = ticks['y2'].copy()
+    y2[label], arrows = layout.arrowheads()
+    arrow_red = ticks['red'][label]
+    parts = []
+    for layer, mask, width in (('label_line', label, p['labellinestrokewidth']),
+            ('short_line', ~label, p['shortlinestrokewidth'])):
+        for colour, red in (('red', True), ('black', False)):
+            selected = mask & (ticks['red'] == red)
+            if selected.any():
+                parts.append(('lines', layer, colour, width, list(zip(ticks['x'][selected].tolist(),
+                    ticks['y1'][selected].tolist(), ticks['x'][selected].tolist(),
+                    y2[selected].tolist()))))
+            if layer == 'label_line' and (arrow_red == red).any():
+                parts.append(('polygons', 'arrowhead', colour, arrows[arrow_red == red].tolist()))
+    for segment in layout.perpendicular_lines():
+        parts.append(('lines', segment.name, segment.style['stroke'], segment.style['stroke-width'],
+            [(segment.x1, segment.y1, segment.x2, segment.y2)]))
+    dimensions = layout.dimensions()
+    for label, box in dimensions:
+        parts.append(('lines', box.name, box.style['stroke'], box.style['stroke-width'],
+            [(box.x1, box.y1, box.x2, box.y2)]))
+    labels = layout.numeric_labels() + [label for label, box in dimensions] + layout.captions()
+    parts.extend(('label', 'labels', label) for label in labels)
+    return parts
+
+def label_text(label):
+    """The label's text as SVG lays it out, with runs of white space as one."""
+    return ' '.join(label.text.split())
+
+def label_glyphs(label):
+    """The polylines drawing a label in the single-stroke font."""
+    size = float(label.style['font-size'])
+    lines = []
+    for char, x in layout_text(label.text, size, label.x, label.style['text-anchor']):
+        lines.extend([(x + gx, label.y + gy) for gx, gy in line]
+            for line in glyph_lines(char, size) or [])
+    return lines
+
+class PdfRulerWriter():
+    """Write rulers to a binary stream as a one page PDF document.
+
+    The page content is compressed and written as each ruler is, so
+    memory use does not grow with the number of rulers. Coordinates are
+    written in the document's user units with precision decimals.
+    """
+    CATALOG, PAGES, PAGE, CONTENT, LENGTH, FONT, FONT_DESCRIPTOR = range(1, 8)
+
+    def __init__(self, stream, label_mode='text', precision=-1):
+        self.stream = stream
+        self.label_mode = label_mode
+        self.coords = CoordinateFormat(precision if precision >= 0 else DEFAULT_PRECISION)
+        self.defs = {}          # nothing is shared between rulers
+        self.offsets = {}
+        self.position = 0
+
+    def out(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+
+    def write_object(self, number, text):
+        self.offsets[number] = self.position
+        self.out('{} 0 obj\n{}\nendobj\n'.format(number, text).encode('latin-1'))
+
+    def write(self, text):
+        """Add page content."""
+        data = self.compressor.compress(text.encode('cp1252', 'replace'))
+        self.length += len(data)
+        self.out(data)
+
+    def start_document(self, width, height, unit='mm'):
+        n = self.coords.number
+        scale = LENGTH_UNITS[unit] / LENGTH_UNITS['pt']
+        self.out(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        widths = ' '.join(str(round(ADVANCE_WIDTHS.get(chr(code), 0) * 1000 / UNITS_PER_EM))
+            for code in range(32, 127))
+        self.write_object(self.FONT, '<< /Type /Font /Subtype /TrueType /BaseFont /DejaVuSans '
+            '/FirstChar 32 /LastChar 126 /Widths [{}] /Encoding /WinAnsiEncoding '
+            '/FontDescriptor {} 0 R >>'.format(widths, self.FONT_DESCRIPTOR))
+        self.write_object(self.FONT_DESCRIPTOR, '<< /Type /FontDescriptor /FontName /DejaVuSans '
+            '/Flags 32 /FontBBox [-1021 -463 1793 1232] /ItalicAngle 0 /Ascent 928 '
+            '/Descent -236 /CapHeight 729 /StemV 80 >>')
+        self.write_object(self.PAGE, '<< /Type /Page /Parent {} 0 R /MediaBox [0 0 {} {}] '
+            '/Resources << /Font << /F1 {} 0 R >> >> /Contents {} 0 R >>'.format(
+            self.PAGES, n(width * scale), n(height * scale), self.FONT, self.CONTENT))
+        self.offsets[self.CONTENT] = self.position
+        self.out('{} 0 obj\n<< /Length {} 0 R /Filter /FlateDecode >>\nstream\n'.format(
+            self.CONTENT, self.LENGTH).encode('latin-1'))
+        self.compressor = zlib.compressobj()
+        self.length = 0
+        # draw in user units with y down, as in SVG; the scale is written
+        # in full, as rounding it would scale the whole ruler
+        self.write('{!r} 0 0 {!r} 0 {} cm\n'.format(scale, -scale, n(height * scale)))
+
+    def end_document(self):
+        data = self.compressor.flush()
+        self.length += len(data)
+        self.out(data + b'\nendstream\nendobj\n')
+        self.write_object(self.LENGTH, str(self.length))
+        self.write_object(self.PAGES, '<< /Type /Pages /Kids [{} 0 R] /Count 1 >>'.format(self.PAGE))
+        self.write_object(self.CATALOG, '<< /Type /Catalog /Pages {} 0 R >>'.format(self.PAGES))
+        xref = self.position
+        count = len(self.offsets) + 1
+        self.out(('xref\n0 {}\n0000000000 65535 f \n'.format(count) + ''.join(
+            '{:010d} 00000 n \n'.format(self.offsets[number]) for number in range(1, count)) +
+            'trailer\n<< /Size {} /Root {} 0 R >>\nstartxref\n{}\n%%EOF\n'.format(
+            count, self.CATALOG, xref)).encode('latin-1'))
+
+    def colour(self, name, operator):
+        return '{} {} {} {}\n'.format(*RGB[name] + (operator,))
+
+    def label(self, label):
+        n = self.coords.number
+        colour = label.style['fill']
+        size = float(label.style['font-size'])
+        if self.label_mode == 'strokes' and drawable(label.text):
+            return (self.colour(colour, 'RG') + '1 J 1 j {} w\n'.format(n(size * STROKE_WIDTH)) +
+                self.polylines(label_glyphs(label)) + 'S 0 J 0 j\n')
+        text = label_text(label)
+        x = text_extent(text, size, label.x, label.style['text-anchor'])[0]
+        escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        # the text matrix flips y back, so the text is upright
+        return (self.colour(colour, 'rg') + 'BT /F1 {} Tf 1 0 0 -1 {} {} Tm ({}) Tj ET\n'.format(
+            n(size), n(x), n(label.y), escaped))
+
+    def polylines(self, lines, close=''):
+        n = self.coords.number
+        return ''.join(' '.join('{} {} {}'.format(n(x), n(y), 'l' if i else 'm')
+            for i, (x, y) in enumerate(line)) + close + '\n' for line in lines)
+
+    def ruler_text(self, layout, origin):
+        """One ruler's page content, translated to origin."""
+        n = self.coords.number
+        out = ['q 1 0 0 1 {} {} cm\n'.format(n(origin[0]), n(origin[1]))]
+        for part in ruler_drawing(layout):
+            if part[0] == 'lines':
+                _, layer, colour, width, segments = part
+                out.append('{} w '.format(n(float(width))) + self.colour(colour, 'RG'))
+                out.append(self.polylines(((x1, y1), (x2, y2)) for x1, y1, x2, y2 in segments))
+                out.append('S\n')
+            elif part[0] == 'polygons':
+                _, layer, colour, polygons = part
+                out.append(self.colour(colour, 'rg') + self.polylines(polygons, ' h') + 'f\n')
+            else:
+                out.append(self.label(part[2]))
+        out.append('Q\n')
+        return ''.join(out)
+
+    def write_ruler(self, layout, origin):
+        """Draw one ruler on the page, translated to origin."""
+        self.write(self.ruler_text(layout, origin))
+
+class DxfRulerWriter():
+    """Write rulers to a stream as an AutoCAD R12 DXF drawing of the page,
+    in the document's units with y up from the bottom of the page.
+
+    height is the page height that y is flipped about; start_document()
+    sets it, but a writer that only makes ruler_text() for another
+    writer's page must be given it. R12 has no header variable for the
+    drawing units, so unit is left for the reader to know.
+    """
+
+    def __init__(self, stream, label_mode='text', precision=-1, height=0.0):
+        self.stream = stream
+        self.binary = 'b' in getattr(stream, 'mode', 'b') and not hasattr(stream, 'encoding')
+        self.label_mode = label_mode
+        self.coords = CoordinateFormat(precision if precision >= 0 else DEFAULT_PRECISION)
+        self.height = height
+        self.defs = {}          # nothing is shared between rulers
+
+    def write(self, text):
+        self.stream.write(text.encode('cp1252', 'replace') if self.binary else text)
+
+    def start_document(self, width, height, unit='mm'):
+        n = self.coords.number
+        self.height = height
+        self.write('0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n'
+            '9\n$EXTMIN\n10\n0\n20\n0\n9\n$EXTMAX\n10\n{}\n20\n{}\n'
+            '9\n$LIMMIN\n10\n0\n20\n0\n9\n$LIMMAX\n10\n{}\n20\n{}\n0\nENDSEC\n'
+            '0\nSECTION\n2\nENTITIES\n'.format(n(width), n(height), n(width), n(height)))
+
+    def end_document(self):
+        self.write('0\nENDSEC\n0\nEOF\n')
+
+    def points(self, points, first=10):
+        """Group codes for points numbered from first (10, 11, ...)."""
+        n = self.coords.number
+        return ''.join('{}\n{}\n{}\n{}\n'.format(first + i, n(x), first + i + 10, n(self.height - y))
+            for i, (x, y) in enumerate(points))
+
+    def entity(self, kind, layer, colour):
+        return '0\n{}\n8\n{}\n62\n{}\n'.format(kind, layer.upper(), ACI[colour])
+
+    def label(self, label, ox, oy):
+        colour = label.style['fill']
+        size = float(label.style['font-size'])
+        if self.label_mode == 'strokes' and drawable(label.text):
+            out = []
+            for line in label_glyphs(label):
+                out.append(self.entity('POLYLINE', 'labels', colour) + '66\n1\n10\n0\n20\n0\n')
+                for x, y in line:
+                    out.append(self.entity('VERTEX', 'labels', colour) + self.points([(x + ox, y + oy)]))
+                out.append('0\nSEQEND\n8\nLABELS\n')
+            return ''.join(out)
+        text = label_text(label)
+        anchor = {'start': 0, 'middle': 1, 'end': 2}[label.style['text-anchor']]
+        # R12 text height is the cap height, 0.729 em in DejaVu Sans
+        return (self.entity('TEXT', 'labels', colour) +
+            self.points([(label.x + ox, label.y + oy)] * 2) +
+            '40\n{}\n1\n{}\n72\n{}\n'.format(self.coords.number(size * 0.729), text, anchor))
+
+    def ruler_text(self, layout, origin):
+        """One ruler's entities, translated to origin."""
+        ox, oy = origin
+        out = []
+        for part in ruler_drawing(layout):
+            if part[0] == 'lines':
+                _, layer, colour, width, segments = part
+                if colour not in ACI:
+                    continue
+                out.extend(self.entity('LINE', layer, colour) +
+                    self.points([(x1 + ox, y1 + oy), (x2 + ox, y2 + oy)]) for x1, y1, x2, y2 in segments)
+            elif part[0] == 'polygons':
+                _, layer, colour, polygons = part
+                # SOLID fills corners 1, 2, 4, 3 in turn; starting from a
+                # side corner keeps the notch of a sharp arrowhead empty
+                out.extend(self.entity('SOLID', layer, colour) +
+                    self.points([(x + ox, y + oy) for x, y in (side1, notch, tip, side2)])
+                    for tip, side1, notch, side2 in polygons)
+            else:
+                out.append(self.label(part[2], ox, oy))
+        return ''.join(out)
+
+    def write_ruler(self, layout, origin):
+        """Add one ruler's entities, translated to origin."""
+        self.write(self.ruler_text(layout, origin))
+
+def exporter_for(stream, options, fmt='svg', height=0.0):
+    """A writer of the given format (see FORMATS) for the output modes in
+    options. height is only needed by a DXF writer that is not started,
+    see DxfRulerWriter.
+    """
+    if fmt == 'svg':
+        return writer_for(stream, options)
+    if fmt == 'pdf':
+        return PdfRulerWriter(stream, options['label_mode'], options['precision'])
+    if fmt == 'dxf':
+        return DxfRulerWriter(stream, options['label_mode'], options['precision'], height)
+    raise ValueError('Unknown output format {!r}'.format(fmt))
+
+def write_ruler_document(stream, options, fmt='svg', width=420, height=297, doc_unit='mm'):
+    """Write a standalone document in the given format holding one ruler,
+    centred on the page, as speed_scale_svg.write_ruler_document().
+    """
+    from speed_scale_layout import RulerLayout, resolve_params, unittouu_for
+    layout = RulerLayout(resolve_params(options, unittouu_for(doc_unit)))
+    writer = exporter_for(stream, options, fmt)
+    writer.start_document(width, height, doc_unit)
+    writer.write_ruler(layout, layout.origin(width/2, height/2))
+    writer.end_document()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+A small single-stroke font for drawing ruler labels as paths.
+
+Each glyph is a set of polylines on a grid GRID_HEIGHT units high (the
+cap height), with y up from the baseline. The digits, the capitals, the
+lower case letters and signs used by the minute labels and the dimension
+text, and a few signs common in captions are defined; any other lower
+case letter is drawn as a capital. Text with a character that cannot be
+drawn is written as text instead (see drawable()). Drawn labels need no
+text layout when rendered, and plot as single lines.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import functools
+
+GRID_HEIGHT = 6
+CAP_HEIGHT = 0.7        # cap height as a fraction of the font size
+STROKE_WIDTH = 0.09     # stroke width as a fraction of the font size
+SPACING = 2             # grid units between glyphs
+SPACE_WIDTH = 3         # grid units taken by a space or an unknown character
+
+# character: (width in grid units, polylines)
+GLYPHS = {
+    '0': (4, [[(0, 1), (0, 5), (1, 6), (3, 6), (4, 5), (4, 1), (3, 0), (1, 0), (0, 1)]]),
+    '1': (3, [[(0, 5), (1.5, 6), (1.5, 0)], [(0, 0), (3, 0)]]),
+    '2': (4, [[(0, 5), (1, 6), (3, 6), (4, 5), (4, 4), (0, 0), (4, 0)]]),
+    '3': (4, [[(0, 5), (1, 6), (3, 6), (4, 5), (4, 4), (3, 3), (1, 3)],
+        [(3, 3), (4, 2), (4, 1), (3, 0), (1, 0), (0, 1)]]),
+    '4': (4, [[(3, 0), (3, 6), (0, 2), (4, 2)]]),
+    '5': (4, [[(4, 6), (0, 6), (0, 3), (3, 3), (4, 2), (4, 1), (3, 0), (0, 0)]]),
+    '6': (4, [[(4, 5), (3, 6), (1, 6), (0, 5), (0, 1), (1, 0), (3, 0), (4, 1), (4, 2),
+        (3, 3), (0, 3)]]),
+    '7': (4, [[(0, 6), (4, 6), (1, 0)]]),
+    '8': (4, [[(1, 3), (0, 4), (0, 5), (1, 6), (3, 6), (4, 5), (4, 4), (3, 3), (1, 3),
+        (0, 2), (0, 1), (1, 0), (3, 0), (4, 1), (4, 2), (3, 3)]]),
+    '9': (4, [[(4, 3), (1, 3), (0, 4), (0, 5), (1, 6), (3, 6), (4, 5), (4, 1), (3, 0),
+        (1, 0), (0, 1)]]),
+    '.': (0, [[(0, 0), (0, 0.4)]]),
+    ':': (0, [[(0, 0), (0, 0.4)], [(0, 3.6), (0, 4)]]),
+    '=': (4, [[(0, 2), (4, 2)], [(0, 4), (4, 4)]]),
+    '-': (3, [[(0, 3), (3, 3)]]),
+    '/': (3, [[(0, 0), (3, 6)]]),
+    'A': (4, [[(0, 0), (0, 4), (2, 6), (4, 4), (4, 0)], [(0, 3), (4, 3)]]),
+    'B': (4, [[(0, 0), (0, 6), (3, 6), (4, 5), (4, 4), (3, 3), (0, 3)],
+        [(3, 3), (4, 2), (4, 1), (3, 0), (0, 0)]]),
+    'C': (4, [[(4, 5), (3, 6), (1, 6), (0, 5), (0, 1), (1, 0), (3, 0), (4, 1)]]),
+    'D': (4, [[(0, 0), (0, 6), (2, 6), (4, 4), (4, 2), (2, 0), (0, 0)]]),
+    'E': (4, [[(4, 6), (0, 6), (0, 0), (4, 0)], [(0, 3), (3, 3)]]),
+    'F': (4, [[(4, 6), (0, 6), (0, 0)], [(0, 3), (3, 3)]]),
+    'G': (4, [[(4, 5), (3, 6), (1, 6), (0, 5), (0, 1), (1, 0), (3, 0), (4, 1), (4, 3),
+        (2, 3)]]),
+    'H': (4, [[(0, 0), (0, 6)], [(4, 0), (4, 6)], [(0, 3), (4, 3)]]),
+    'I': (2, [[(0, 6), (2, 6)], [(1, 6), (1, 0)], [(0, 0), (2, 0)]]),
+    'J': (4, [[(4, 6), (4, 1), (3, 0), (1, 0), (0, 1)]]),
+    'K': (4, [[(0, 0), (0, 6)], [(4, 6), (0, 2)], [(1, 3), (4, 0)]]),
+    'L': (4, [[(0, 6), (0, 0), (4, 0)]]),
+    'M': (4, [[(0, 0), (0, 6), (2, 3), (4, 6), (4, 0)]]),
+    'N': (4, [[(0, 0), (0, 6), (4, 0), (4, 6)]]),
+    'O': (4, [[(1, 0), (0, 1), (0, 5), (1, 6), (3, 6), (4, 5), (4, 1), (3, 0), (1, 0)]]),
+    'P': (4, [[(0, 0), (0, 6), (3, 6), (4, 5), (4, 4), (3, 3), (0, 3)]]),
+    'Q': (4, [[(1, 0), (0, 1), (0, 5), (1, 6), (3, 6), (4, 5), (4, 1), (3, 0), (1, 0)],
+        [(2, 2), (4, 0)]]),
+    'R': (4, [[(0, 0), (0, 6), (3, 6), (4, 5), (4, 4), (3, 3), (0, 3)], [(2, 3), (4, 0)]]),
+    'S': (4, [[(4, 5), (3, 6), (1, 6), (0, 5), (0, 4), (1, 3), (3, 3), (4, 2), (4, 1),
+        (3, 0), (1, 0), (0, 1)]]),
+    'T': (4, [[(0, 6), (4, 6)], [(2, 6), (2, 0)]]),
+    'U': (4, [[(0, 6), (0, 1), (1, 0), (3, 0), (4, 1), (4, 6)]]),
+    'V': (4, [[(0, 6), (2, 0), (4, 6)]]),
+    'W': (4, [[(0, 6), (1, 0), (2, 4), (3, 0), (4, 6)]]),
+    'X': (4, [[(0, 6), (4, 0)], [(0, 0), (4, 6)]]),
+    'Y': (4, [[(0, 6), (2, 3), (4, 6)], [(2, 3), (2, 0)]]),
+    'Z': (4, [[(0, 6), (4, 6), (0, 0), (4, 0)]]),
+    'h': (4, [[(0, 0), (0, 6)], [(0, 3), (1, 4), (3, 4), (4, 3), (4, 0)]]),
+    'i': (0, [[(0, 0), (0, 4)], [(0, 5.6), (0, 6)]]),
+    'k': (3, [[(0, 0), (0, 6)], [(3, 4), (0, 1.5)], [(1, 2.5), (3, 0)]]),
+    'm': (4, [[(0, 0), (0, 4)], [(0, 3), (1, 4), (2, 3), (2, 0)],
+        [(2, 3), (3, 4), (4, 3), (4, 0)]]),
+    'n': (4, [[(0, 0), (0, 4)], [(0, 3), (1, 4), (3, 4), (4, 3), (4, 0)]]),
+    'p': (4, [[(0, -2), (0, 4)], [(0, 3), (1, 4), (3, 4), (4, 3), (4, 1), (3, 0), (1, 0),
+        (0, 1)]]),
+    's': (4, [[(4, 4), (1, 4), (0, 3), (1, 2), (3, 2), (4, 1), (3, 0), (0, 0)]]),
+    't': (3, [[(1, 6), (1, 1), (2, 0), (3, 0)], [(0, 4), (3, 4)]]),
+}
+
+def glyph(char):
+    """The (width, polylines) GLYPHS entry char is drawn with, a lower case
+    letter without a glyph of its own taking its capital's; None if char
+    has none.
+    """
+    return GLYPHS.get(char) or GLYPHS.get(char.upper())
+
+def drawable(text):
+    """Whether every character of text, other than spaces, has a glyph.
+    Labels that are not drawable are written as text in strokes mode.
+    """
+    return all(char == ' ' or glyph(char) for char in text)
+
+def grid_unit(size):
+    """The length of one grid unit at the given font size."""
+    return size * CAP_HEIGHT / GRID_HEIGHT
+
+@functools.lru_cache(maxsize=1024)
+def glyph_lines(char, size):
+    """The polylines of char at the given font size, as lists of (x, y)
+    with the origin at the left end of the baseline and y down; None for
+    spaces and characters without a glyph.
+    """
+    entry = glyph(char)
+    if entry is None:
+        return None
+    unit = grid_unit(size)
+    return [[(x * unit, -y * unit) for x, y in line] for line in entry[1]]
+
+@functools.lru_cache(maxsize=1024)
+def glyph_path(char, size):
+    """Path data for glyph_lines(char, size), or None. Cached, as every
+    label reuses the same few glyphs.
+    """
+    lines = glyph_lines(char, size)
+    if lines is None:
+        return None
+    number = lambda value: '{:g}'.format(round(value, 4))
+    return ' '.join('M ' + ' L '.join('{},{}'.format(number(x), number(y)) for x, y in line)
+        for line in lines)
+
+def char_advance(char, size):
+    entry = glyph(char)
+    width = entry[0] if entry else SPACE_WIDTH
+    return (width + SPACING) * grid_unit(size)
+
+def text_advance(text, size):
+    """The drawn width of text at the given font size."""
+    if not text:
+        return 0.0
+    return sum(char_advance(char, size) for char in text) - SPACING * grid_unit(size)
+
+def layout_text(text, size, x, anchor='middle'):
+    """Place each drawable character of text on a baseline through x,
+    anchored like the SVG text-anchor property. Returns (char, x) pairs.
+    """
+    if anchor == 'middle':
+        x -= text_advance(text, size) / 2
+    elif anchor == 'end':
+        x -= text_advance(text, size)
+    placed = []
+    for char in text:
+        if glyph(char):
+            placed.append((char, x))
+        x += char_advance(char, size)
+    return placed
@@ -0,0 +1,741 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+Layout model for the speed scale ruler drawn by render_speed_scale.py.
+
+Everything here is plain Python (plus NumPy for the ticks) and needs
+neither inkex nor lxml, so a ruler can be laid out once and then emitted
+to SVG, cached, or measured without the Inkscape runtime. All lengths are
+in document user units, relative to the ruler origin: the first tick,
+on the perpendicular line.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import math
+from collections import namedtuple
+
+# a dictionary of unit to user unit conversion factors
+CONVERSIONS = {
+    'kts': 1.852,
+    'mph': 1.609,
+    'kph': 1.0,
+}
+
+# CSS pixels per length unit, as used by Inkscape for unit conversion
+LENGTH_UNITS = {
+    'in': 96.0,
+    'pt': 1.3333333333333333,
+    'px': 1.0,
+    'mm': 3.779527559055118,
+    'cm': 37.79527559055118,
+    'pc': 16.0,
+    '': 1.0,
+}
+
+# Option values as the extension receives them, for use outside Inkscape.
+# Keep in step with the defaults in ScaleGen.__init__ and the .inx file.
+RULER_DEFAULTS = {
+    'speed': (60,),
+    'speed_unit': 'kts',
+    'scale': 200000,
+    'max_length': 280,
+    'unit': 'mm',
+    'useref': False,
+    'insidetf': False,
+    'compound': False,
+    'instancing': 'none',
+    'css_classes': False,
+    'label_mode': 'text',
+    'precision': -1,
+    'fontsize': 5.0,
+    'suffix': '',
+    'caption': '',
+    'labeloffseth': 0.0,
+    'labeloffsetv': 0.0,
+    'perplinestrokewidth': 0.2,
+    'perplineoffset': 0.0,
+    'textlinestrokewidth': 2.5,
+    'textlineoffset': 2.0,
+    'labellinelength': 5.0,
+    'labellinestrokewidth': 0.4,
+    'mark2wid': 60,
+    'shortlinestrokewidth': 0.2,
+    'tick_levels': '60,30,10',
+    'min_tick_spacing': 2.0,
+    'dimensionoffset': 10,
+    'arrow_style': 'normal',
+    'arrow_len': 10,
+    'arrow_angle': 30,
+    'stack_gap': 5.0,
+    'route': False,
+    'route_tick_length': 4.0,
+}
+
+# the values allowed for options that are optiongroups in the .inx file
+OPTION_CHOICES = {
+    'speed_unit': tuple(CONVERSIONS),
+    'instancing': ('none', 'arrows', 'all'),
+    'label_mode': ('text', 'strokes'),
+    'arrow_style': ('normal', 'sharp'),
+}
+
+# tick classes, by the coarsest tick level a tick is on
+TICK_SHORT = 0          # the third level down and finer (10 seconds by default)
+TICK_HALF_MINUTE = 1    # the second level (half minutes by default), drawn red
+TICK_LABEL = 2          # the first level (minutes by default), labelled and arrowed
+
+# a straight line, and a piece of text centred on (x, y); style is a dict
+Segment = namedtuple('Segment', 'name role x1 y1 x2 y2 style')
+Label = namedtuple('Label', 'text x y role style')
+
+def convert_speed_to_kph(value, from_unit):
+    """Returns kph value for speed passed."""
+    return value * CONVERSIONS[from_unit]
+
+def max_decimal_digits(value, digits=2):
+    """Return a (specified) maximum number of decimal digits, ignoring any
+    trailing zero or decimal point.
+    """
+    return ('{:0.{}f}'.format(value, digits)).rstrip('0').rstrip('.')
+
+def parse_range(text, cast=int):
+    """Parse '30:200:10' (inclusive), '80,90,100' or a mix of both into a
+    list of values.
+    """
+    values = []
+    for part in str(text).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if ':' in part:
+            bits = [cast(b) for b in part.split(':')]
+            start, stop = bits[0], bits[1]
+            step = bits[2] if len(bits) > 2 else 1
+            value = start
+            while value <= stop:
+                values.append(value)
+                value += step
+        else:
+            values.append(cast(part))
+    return values
+
+def parse_speeds(text):
+    """Parse --speed, one speed or several as accepted by parse_range(),
+    into a tuple. Raises ValueError unless there is at least one speed and
+    every speed is positive.
+    """
+    speeds = tuple(parse_range(text))
+    if not speeds:
+        raise ValueError('give at least one speed')
+    for speed in speeds:
+        if speed <= 0:
+            raise ValueError('speeds must be positive, not {}'.format(speed))
+    return speeds
+
+def options_from_args(args, defaults=RULER_DEFAULTS, strict=False):
+    """Parse extension style '--name=value' arguments into an options dict
+    without inkex, converting each value to the type of its default (a
+    list such as --speed=80,90 to a tuple, with parse_speeds()). A value
+    not in OPTION_CHOICES raises ValueError. Unknown names are ignored,
+    unless strict, when they raise ValueError too, as does a name not
+    spelled as on the command line (speed_unit for speed-unit).
+    """
+    options = dict(defaults)
+    for arg in args:
+        name, _, value = arg.lstrip('-').partition('=')
+        dest = name.replace('-', '_')
+        if strict and (dest not in defaults or name != dest.replace('_', '-')):
+            raise ValueError('unrecognised option {}'.format(arg))
+        if dest not in defaults:
+            continue
+        default = defaults[dest]
+        if isinstance(default, bool):
+            value = str(value).lower() in ('true', '1', 'yes')
+        elif dest == 'speed':
+            value = parse_speeds(value)
+        elif isinstance(default, (int, float)):
+            value = type(default)(float(value)) if isinstance(default, int) else float(value)
+        elif value not in OPTION_CHOICES.get(dest, (value,)):
+            raise ValueError('invalid --{} {!r} (choose from {})'.format(
+                name, value, ', '.join(OPTION_CHOICES[dest])))
+        options[dest] = value
+    return options
+
+def unittouu_for(doc_unit='mm', uu_px=None):
+    """Return a pure equivalent of svg.unittouu() for a document whose user
+    unit is doc_unit (or uu_px pixels, if given): it converts strings such
+    as '2.5mm' to user units.
+    """
+    import re
+    number = re.compile(r'^\s*([-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?)\s*([a-z]*)\s*$')
+    if uu_px is None:
+        uu_px = LENGTH_UNITS[doc_unit]
+    def unittouu(value):
+        match = number.match(str(value))
+        if match is None or (match.group(2) or 'px') not in LENGTH_UNITS:
+            return 0.0
+        value, unit = float(match.group(1)), match.group(2) or 'px'
+        return value * LENGTH_UNITS[unit] / uu_px
+    return unittouu
+
+def document_unittouu(width, viewbox):
+    """unittouu_for() a document with the given width and viewBox
+    attributes (either may be None), as Inkscape scales user units.
+    """
+    uu_px = 1.0
+    width_px = unittouu_for('px')(width) if width else 0.0
+    box = [float(v) for v in (viewbox or '').replace(',', ' ').split()]
+    if width_px and len(box) == 4 and box[2]:
+        uu_px = width_px / box[2]
+    return unittouu_for(uu_px=uu_px)
+
+def resolve_params(options, unittouu):
+    """Values from UI corrected for units etc.
+
+    options maps option dests (see RULER_DEFAULTS) to values; unittouu
+    converts a length string to document user units, e.g. svg.unittouu or
+    unittouu_for('mm').
+    """
+    unit = options['unit']
+    uu = lambda value, unit=unit: unittouu(str(value)+unit)
+    params = {
+        'speed'     : options['speed'],
+        'speed_unit': options['speed_unit'],
+        'scale'     : options['scale'],
+        'max_length': options['max_length'],
+        #
+        'unit'      : unit,
+        'useref'    : options['useref'],  # bool
+        'insidetf'  : options['insidetf'],  # bool
+        'compound'  : options['compound'],  # bool
+        'instancing': options['instancing'],
+        'css_classes': options['css_classes'],  # bool
+        'label_mode': options['label_mode'],
+        'precision' : options['precision'],  # decimals, or < 0 for full
+        #
+        'fontsize'    : uu(options['fontsize'], "pt"),  # all font calcs in pts
+        'suffix'      : options['suffix'],
+        'caption'     : options['caption'],
+        'labeloffseth': uu(options['labeloffseth']),
+        'labeloffsetv': uu(options['labeloffsetv']),
+        #
+        'perplinestrokewidth': uu(options['perplinestrokewidth']),
+        'perplineoffset'     : uu(options['perplineoffset']),
+        #
+        'textlinestrokewidth': uu(options['textlinestrokewidth']),
+        'textlineoffset'     : uu(options['textlineoffset']),
+        #
+        'labellinelength'     : uu(options['labellinelength']),
+        'labellinestrokewidth': uu(options['labellinestrokewidth']),
+        #
+        'mark2wid'            : options['mark2wid'] / 100,
+        'shortlinestrokewidth': uu(options['shortlinestrokewidth']),
+        'tick_levels'         : parse_tick_levels(options['tick_levels']),
+        'min_tick_spacing'    : options['min_tick_spacing'],
+        #
+        'dimensionoffset': uu(options['dimensionoffset']),
+        #
+        'arrow_style': options['arrow_style'],
+        'arrow_len'  : options['arrow_len'],
+        'arrow_angle': options['arrow_angle'],
+        'arrow_L'    : uu(options['arrow_len'], 'px'),
+        #
+        'stack_gap'  : uu(options['stack_gap']),
+        'route'      : options['route'],  # bool
+        'route_tick_length': uu(options['route_tick_length']),
+    }
+    # the font size is already in user units, but is offset as if in mm
+    params['font_height_offset'] = unittouu(str(params['fontsize'])+"mm")
+    return params
+
+def parse_tick_levels(value):
+    """Parse tick intervals in seconds, e.g. '600,60,10' (in any order),
+    into a tuple of floats, coarsest first. There is one level per tick
+    class, so at most three: labelled, red and short. Every interval must
+    be a whole multiple of the finest.
+    """
+    if isinstance(value, str):
+        value = [v for v in value.replace(' ', '').split(',') if v]
+    levels = tuple(sorted({float(v) for v in value}, reverse=True))
+    if not levels or levels[-1] <= 0:
+        raise ValueError('tick levels must be positive')
+    if len(levels) > 3:
+        raise ValueError('at most three tick levels (labelled, red and short), not {}'.format(
+            len(levels)))
+    for level in levels:
+        steps = level / levels[-1]
+        if abs(steps - round(steps)) > 1e-9:
+            raise ValueError('{:g}s is not a multiple of {:g}s'.format(level, levels[-1]))
+    return levels
+
+def cull_tick_levels(levels, mm_per_min, strokewidth, min_spacing, max_length):
+    """The tick levels (coarsest first) worth drawing: a level whose
+    ticks would be less than min_spacing stroke widths apart on paper is
+    dropped, with every finer level. The first level kept is labelled; a
+    level that would not be labelled twice in max_length gives way to the
+    next.
+    """
+    while len(levels) > 1 and mm_per_min * levels[0] / 60 > max_length / 2:
+        levels = levels[1:]
+    kept = list(levels[:1])
+    for level in levels[1:]:
+        if mm_per_min * level / 60 < min_spacing * strokewidth:
+            break
+        kept.append(level)
+    return tuple(kept)
+
+def layout_ticks(scalefrom, scaleto, res, labellinelength, mark2wid, steps=(6, 3)):
+    """Lay out every tick of a straight ruler at once.
+
+    Tick i sits at x = i*res. steps are the labelled and red tick levels
+    in multiples of res, coarsest first; by default a minute and a half
+    minute at 10 second resolution. Ticks on the first level are label
+    lines running from -labellinelength, red on every other one; the rest
+    are short lines from 0, red on the second level if there is one. All
+    lines end at labellinelength * mark2wid.
+
+    Returns a dict of equal length NumPy arrays: index, x, kind (one of the
+    TICK_* classes), red, y1 and y2.
+    """
+    import numpy as np
+    index = np.arange(scalefrom, scaleto)
+    kind = np.full(index.shape, TICK_SHORT, dtype=np.int8)
+    if len(steps) > 1:
+        kind[index % steps[1] == 0] = TICK_HALF_MINUTE
+    kind[index % steps[0] == 0] = TICK_LABEL
+    red = (index % (2 * steps[0]) == 0) | (kind == TICK_HALF_MINUTE)
+    y1 = np.where(kind == TICK_LABEL, -labellinelength, 0.0)
+    y2 = np.full(index.shape, labellinelength * mark2wid)
+    return {
+        'index': index,
+        'x': index * res,
+        'kind': kind,
+        'red': red,
+        'y1': y1,
+        'y2': y2,
+    }
+
+def layout_arrowheads(x, y1, y2, L, A, style_ratio, linewidth):
+    """Vectorised equivalent of Arrow.cal_points() and
+    NewPath.cal_shorten_point() for vertical lines running from (x, y1) to
+    (x, y2) with the arrowhead at the y2 end.
+
+    Returns (y2 shortened so the line stops inside the arrowhead, points)
+    where points is a (n, 4, 2) array: tip, side 1, offset, side 2.
+    """
+    import numpy as np
+    x = np.asarray(x, dtype=float)
+    y2 = np.asarray(y2, dtype=float)
+    # unit direction from the arrow tip back along the line
+    s = np.sign(np.asarray(y1, dtype=float) - y2)
+    side_length = L * math.tan(math.radians(A) / 2)
+    shorten = (linewidth / 2) / math.tan(math.radians(A) / 2) + linewidth
+    on_line = y2 + s * L
+    points = np.empty(x.shape + (4, 2))
+    points[:, 0, 0] = x
+    points[:, 0, 1] = y2
+    points[:, 1, 0] = x - s * side_length
+    points[:, 1, 1] = on_line
+    points[:, 2, 0] = x
+    points[:, 2, 1] = y2 + s * L * (1 - style_ratio)
+    points[:, 3, 0] = x + s * side_length
+    points[:, 3, 1] = on_line
+    return y2 + s * shorten, points
+
+def ruler_speed(params):
+    """The speed of a single ruler from params (options or resolved
+    values), whose speed is one speed or a sequence of them. Raises
+    ValueError for a sequence of more than one, as for a stack of rulers
+    where only one ruler can be drawn.
+    """
+    speed = params['speed']
+    if not isinstance(speed, (tuple, list)):
+        return speed
+    if len(speed) != 1:
+        raise ValueError('--speed={} gives several rulers, this takes a single speed'.format(
+            ','.join(str(v) for v in speed)))
+    return speed[0]
+
+class RulerLayout():
+    """Everything needed to draw one straight speed scale ruler.
+
+    params is the dict returned by resolve_params(). The ticks and
+    arrowheads are computed on first use.
+    """
+    def __init__(self, params):
+        self.params = params
+        self.speed = ruler_speed(params)
+        self.speed_unit = params['speed_unit']
+        self.scale = params['scale']
+
+        # calc external length from scale
+        # mm / min = (km / min)          * ( mm / km )
+        #          =                     * ( scale / km / m )
+        #          = (speed in kmh / 60) * ( scale * 1000 * 1000 )
+        self.mm_per_min = ( convert_speed_to_kph(self.speed, self.speed_unit) / 60 ) * ( 1 / ( self.scale / 1000 / 1000 ))
+
+        # The tick levels that are far enough apart to print, and each in
+        # ticks of the finest; the ticks are laid out at the finest
+        levels = parse_tick_levels(params['tick_levels'])
+        self.levels = cull_tick_levels(levels, self.mm_per_min,
+            params['shortlinestrokewidth'], params['min_tick_spacing'], params['max_length'])
+        self.steps = tuple(int(round(level / self.levels[-1])) for level in self.levels)
+        if len(self.steps) == 2 and levels.index(self.levels[1]) == 2:
+            # the labelled level gave way to the red one: the short ticks
+            # stay short rather than turning red
+            self.steps = self.steps[:1]
+        self.res = self.mm_per_min / (60 / self.levels[-1])
+
+        # Work out how many ticks will fit in the width available
+        self.scalefrom = 0
+        self.scaleto = int(params['max_length'] / self.res)
+        self.scaleto = self.scaleto - (self.scaleto % self.steps[0]) + 1
+        self.external_length = self.res * (self.scaleto - self.scalefrom)
+
+        self._ticks = None
+        self._arrowheads = None
+
+    def origin(self, cx, cy):
+        """Return the origin that centres the ruler on (cx, cy)."""
+        return (cx - self.external_length/2, cy)
+
+    @property
+    def ticks(self):
+        """layout_ticks() for this ruler."""
+        if self._ticks is None:
+            p = self.params
+            self._ticks = layout_ticks(self.scalefrom, self.scaleto, self.res,
+                p['labellinelength'], p['mark2wid'], self.steps)
+        return self._ticks
+
+    def arrow_shape(self):
+        """(L, A, style_ratio, linewidth) for layout_arrowheads()."""
+        p = self.params
+        style_ratio = 0.0 if p['arrow_style'] == 'normal' else .25
+        return (p['arrow_L'], p['arrow_angle'], style_ratio, p['labellinestrokewidth'])
+
+    def arrowheads(self):
+        """layout_arrowheads() for the label ticks."""
+        if self._arrowheads is None:
+            ticks = self.ticks
+            label = ticks['kind'] == TICK_LABEL
+            self._arrowheads = layout_arrowheads(ticks['x'][label],
+                ticks['y1'][label], ticks['y2'][label], *self.arrow_shape())
+        return self._arrowheads
+
+    def extent(self):
+        """(top, bottom) of everything drawn, in the ruler's coordinates;
+        used to stack rulers under each other.
+        """
+        p = self.params
+        ticks = self.ticks
+        ys = [float(ticks['y1'].min()), float(ticks['y2'].max())]
+        for segment in self.perpendicular_lines():
+            half = segment.style['stroke-width'] / 2
+            ys += [segment.y1 - half, segment.y1 + half]
+        labels = [label for label, box in self.dimensions()] + self.numeric_labels()[:1]
+        for label in labels + self.captions():
+            ys += [label.y - p['fontsize'], label.y]
+        return min(ys), max(ys)
+
+    def bounds(self):
+        """(left, top, right, bottom) of everything drawn, in the ruler's
+        coordinates; used to pack rulers onto pages.
+        """
+        top, bottom = self.extent()
+        ticks = self.ticks
+        xs = [float(ticks['x'].min()), float(ticks['x'].max())]
+        for segment in self.perpendicular_lines() + [box for label, box in self.dimensions()]:
+            xs += [segment.x1, segment.x2]
+        for label in self.numeric_labels() + self.captions():
+            half = self.text_width(label.text) / 2
+            xs += [label.x - half, label.x + half]
+        return min(xs), top, max(xs), bottom
+
+    def speed_max_digits(self, unit_to, digits=2):
+        """Return the speed converted to the specified units with a (specified)
+        maximum number of decimal digits, ignoring any trailing zero or decimal
+        point.
+        """
+        return max_decimal_digits(self.speed * CONVERSIONS[self.speed_unit] / CONVERSIONS[unit_to], digits)
+
+    def perpendicular_line(self, type):
+        """ A horizontal line: 0 the basic line, 1 the basic line at the
+        top of the label lines, 2 the white background behind the labels.
+        """
+        p = self.params
+        name = 'perpendicular_line'
+        role = 'perpendicular-line'
+        strokewidth = p['perplinestrokewidth']
+        line_style = {
+            'stroke': 'black',
+            'stroke-width': strokewidth,
+        }
+
+        if type == 0: # basic line
+            y2 = y1 = p['perplineoffset']
+        elif type == 1: # basic line - top
+            y2 = y1 = p['perplineoffset'] - p['labellinelength']
+        else: # white background behind text
+            strokewidth = p['textlinestrokewidth']
+            y2 = y1 = -p['labeloffsetv'] + strokewidth/2
+            role = 'label-background'
+            line_style = {
+                'stroke': 'white',
+                'stroke-width': strokewidth
+            }
+
+        strokeoffset = (strokewidth / 2)
+        x2 = ((self.scaleto-1)*self.res) + strokeoffset*2 # RHS of horiz line
+        x1 = ((self.scalefrom)*self.res) - strokeoffset   # LHS of horiz line
+        return Segment(name, role, x1, y1, x2, y2, line_style)
+
+    def perpendicular_lines(self):
+        return [self.perpendicular_line(type) for type in (0, 1, 2)]
+
+    def label(self, value, x, y, colour):
+        """Arbitrary text, centred on x and offset down by the font height."""
+        p = self.params
+        style = {
+            'text-align' : 'center',
+            'text-anchor': 'middle', 'font-size': str(p['fontsize']),
+            'fill': colour
+        }
+        return Label(value, float(x), float(y) + p['font_height_offset'],
+            'label-text-' + colour, style)
+
+    def text_width(self, text):
+        """The drawn width of label text, from the font metrics table or,
+        for text it can draw, the single-stroke font.
+        """
+        p = self.params
+        if p.get('label_mode') == 'strokes':
+            from speed_scale_glyphs import drawable, text_advance
+            if drawable(text):
+                return text_advance(text, p['fontsize'])
+        from speed_scale_metrics import text_width
+        return text_width(text, p['fontsize'])
+
+    def box(self, x, y, w):
+        """A box background behind text to make it clearer; w is the width
+        of the text, which is padded by half a digit on either side.
+        """
+        w += self.text_width('0')
+        strokewidth = self.params['textlinestrokewidth']
+        y2 = y1 = y + strokewidth/2
+        line_style = {
+            'stroke': 'white',
+            'stroke-width': strokewidth,
+        }
+        return Segment('background_box', 'background-box', x-w/2, y1, x+w/2, y2, line_style)
+
+    def label_text(self, i):
+        """The running time in minutes at tick i."""
+        return max_decimal_digits(i * self.levels[-1] / 60)
+
+    def label_colour(self, i):
+        """Labels are red and black in turn, red from zero."""
+        return 'red' if (i // self.steps[0]) % 2 == 0 else 'black'
+
+    def numeric_label_count(self):
+        return int((self.ticks['kind'] == TICK_LABEL).sum())
+
+    def numeric_labels(self):
+        """The minute labels above every label line, red on every other
+        one. A label that would run into the one before it is left out.
+        """
+        ticks = self.ticks
+        label = ticks['kind'] == TICK_LABEL
+        gap = self.text_width('0') / 2
+        labels = []
+        right = -math.inf
+        for i, x in zip(ticks['index'][label].tolist(), ticks['x'][label].tolist()):
+            text = self.label_text(i)
+            half = self.text_width(text) / 2
+            if x - half < right:
+                continue
+            right = x + half + gap
+            labels.append(self.label(text, x, -self.params['labeloffsetv'], self.label_colour(i)))
+        return labels
+
+    def captions(self):
+        """The caption (e.g. the flight plan leg) centred above the
+        ruler, as a list of no or one label.
+        """
+        p = self.params
+        if not p['caption']:
+            return []
+        top = float(self.ticks['y1'].min())
+        return [self.label(p['caption'], self.external_length / 2,
+            top - p['fontsize'] - p['font_height_offset'], 'black')]
+
+    def dimensions(self):
+        """ Text specifying dimensions of the ruler, as a list of
+        (label, background box) pairs.
+        """
+        p = self.params
+        kph = self.speed_max_digits('kph')
+        mph = self.speed_max_digits('mph')
+        kts = self.speed_max_digits('kts')
+
+        one_km_mm = 1 / self.scale * 1000 * 1000
+        # TODO: use a better conversion function
+        one_mi_mm = max_decimal_digits(one_km_mm / CONVERSIONS['kph'] * CONVERSIONS['mph'])
+        one_kt_mm = max_decimal_digits(one_km_mm / CONVERSIONS['kph'] * CONVERSIONS['kts'])
+
+        xa = self.scalefrom * self.res + 50
+        xb = self.scaleto * self.res - 70
+
+        y = p['labeloffsetv'] - p['dimensionoffset']
+
+        text_a = '{}kph   {}mph   {}kts   1:{}K'.format(kph, mph, kts, int(self.scale/1000))
+        text_b = '1 min={}mm   1km={}mm  1mi={}mm  1nm={}mm'.format(max_decimal_digits(self.mm_per_min), one_km_mm, one_mi_mm, one_kt_mm)
+        return [
+            (self.label(text_a, xa, y, 'black'), self.box(xa, y, self.text_width(text_a))),
+            (self.label(text_b, xb, y, 'black'), self.box(xb, y, self.text_width(text_b))),
+        ]
+
+def flatten_cubics(cubics, steps=16):
+    """Points along a chain of (n, 8) cubic segments (x0, y0, x1, y1, x2,
+    y2, x3, y3), each segment sampled at steps equal steps of t. Straight
+    segments come out exact; curves to well under a percent of length.
+    """
+    import numpy as np
+    cubics = np.asarray(cubics, dtype=float).reshape(-1, 8)
+    if not len(cubics):
+        return np.zeros((0, 2))
+    t = np.linspace(0, 1, steps + 1)[1:, None, None]
+    p0, p1, p2, p3 = (cubics[None, :, k:k+2] for k in (0, 2, 4, 6))
+    mt = 1 - t
+    points = mt**3 * p0 + 3*mt*mt*t * p1 + 3*mt*t*t * p2 + t**3 * p3
+    # (steps, n, 2) -> segment by segment
+    points = points.transpose(1, 0, 2).reshape(-1, 2)
+    return np.concatenate([cubics[:1, 0:2], points])
+
+class RouteIndex():
+    """Cumulative arc length along a route made of one or more legs, for
+    finding the point at a given distance by binary search.
+
+    legs is a list of cubic chains as taken by flatten_cubics(). Distance
+    runs on from one leg to the next; the gap between legs is not counted.
+    """
+    def __init__(self, legs, steps=16):
+        import numpy as np
+        points = []
+        for leg in legs:
+            leg = flatten_cubics(leg, steps)
+            # repeated points would give steps without a direction
+            leg = leg[np.concatenate([[True], np.any(np.diff(leg, axis=0) != 0, axis=1)])]
+            if len(leg) > 1:
+                points.append(leg)
+        if not points:
+            raise ValueError('route has no length')
+        self.points = np.concatenate(points)
+        vectors = np.diff(self.points, axis=0)
+        lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+        # the step from the end of one leg to the start of the next
+        ends = np.cumsum([len(leg) for leg in points])[:-1] - 1
+        lengths[ends] = 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.tangents = vectors / lengths[:, None]
+        self.lengths = lengths
+        self.cumulative = np.concatenate([[0.0], np.cumsum(lengths)])
+        self.length = float(self.cumulative[-1])
+
+    def locate(self, distances):
+        """Points and unit tangents at each of distances along the route,
+        as two (n, 2) arrays. O(n log m) for a route of m steps.
+        """
+        import numpy as np
+        distances = np.clip(np.asarray(distances, dtype=float), 0, self.length)
+        segment = np.searchsorted(self.cumulative, distances, side='right') - 1
+        # zero length steps only sit between legs; a distance falling on
+        # one belongs to the start of the next leg, or the end of the route
+        segment = np.clip(segment, 0, len(self.lengths) - 1)
+        while True:
+            empty = self.lengths[segment] == 0
+            if not empty.any():
+                break
+            segment[empty] -= 1
+        t = (distances - self.cumulative[segment]) / self.lengths[segment]
+        points = self.points[segment] + t[:, None] * (self.points[segment + 1] - self.points[segment])
+        return points, self.tangents[segment]
+
+class RouteLayout(RulerLayout):
+    """Time ticks and minute labels along a route rather than a straight
+    line: tick i sits i*res along the route, running time carrying on
+    from one leg to the next. The ticks cross the route, route_tick_length
+    either side for a minute and less for the others; labels go to the left
+    of the direction of travel, or the right with insidetf.
+    """
+    TICK_SCALE = {TICK_LABEL: 1.0, TICK_HALF_MINUTE: 0.75, TICK_SHORT: 0.5}
+
+    def __init__(self, params, index):
+        RulerLayout.__init__(self, params)
+        self.index = index
+        self.scaleto = int(index.length / self.res) + 1
+        self.external_length = index.length
+        self._placed = None
+
+    def placed(self):
+        """(points, normals) of every tick, normals pointing to the labels."""
+        if self._placed is None:
+            import numpy as np
+            points, tangents = self.index.locate(self.ticks['x'])
+            side = -1.0 if self.params['insidetf'] else 1.0
+            normals = side * np.stack([tangents[:, 1], -tangents[:, 0]], axis=1)
+            self._placed = points, normals
+        return self._placed
+
+    def tick_segments(self):
+        """A Segment per tick, named and styled as on the straight ruler."""
+        import numpy as np
+        p = self.params
+        ticks = self.ticks
+        points, normals = self.placed()
+        scale = np.vectorize(self.TICK_SCALE.get)(ticks['kind'])
+        half = (p['route_tick_length'] * scale)[:, None] * normals
+        starts, ends = (points - half).tolist(), (points + half).tolist()
+        segments = []
+        for i, kind, red, (x1, y1), (x2, y2) in zip(ticks['index'].tolist(),
+                ticks['kind'].tolist(), ticks['red'].tolist(), starts, ends):
+            colour = 'red' if red else 'black'
+            if kind == TICK_LABEL:
+                name, strokewidth = 'label_line', p['labellinestrokewidth']
+            else:
+                name, strokewidth = 'short_line', p['shortlinestrokewidth']
+            segments.append(Segment('{}_{}'.format(name, i),
+                '{}-{}'.format(name.replace('_', '-'), colour), x1, y1, x2, y2,
+                {'stroke': colour, 'stroke-width': strokewidth}))
+        return segments
+
+    def numeric_labels(self):
+        """The minute labels beside every label tick, red on every other
+        one. A label that would run into the one before it is left out.
+        """
+        p = self.params
+        ticks = self.ticks
+        label = ticks['kind'] == TICK_LABEL
+        points, normals = self.placed()
+        height = p['font_height_offset']
+        labels = []
+        last = None
+        for i, (x, y), (nx, ny) in zip(ticks['index'][label].tolist(),
+                points[label].tolist(), normals[label].tolist()):
+            text = self.label_text(i)
+            width = self.text_width(text)
+            # centre the label a clear gap beyond the end of the tick
+            reach = p['route_tick_length'] + height/2 + abs(nx) * width/2 + abs(ny) * height/2
+            cx, cy = x + nx * reach, y + ny * reach
+            if last is not None and math.hypot(cx - last[0], cy - last[1]) < (width + last[2]) / 2 + height/2:
+                continue
+            last = (cx, cy, width)
+            labels.append(self.label(text, cx, cy - height/2, self.label_colour(i)))
+        return labels
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+Text metrics for ruler labels, so text extents can be worked out without
+rendering the text.
+
+The labels are set in the default sans-serif font, which Inkscape
+resolves to DejaVu Sans on most installs. ADVANCE_WIDTHS holds its
+advance widths for printable ASCII, in font units, as read from the
+hmtx table of DejaVuSans.ttf. Kerning is ignored; for the label text
+(digits, unit names) it changes widths by well under a character.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import functools
+
+UNITS_PER_EM = 2048
+
+ADVANCE_WIDTHS = {
+    ' ': 651, '!': 821, '"': 942, '#': 1716, '$': 1303, '%': 1946, '&': 1597, "'": 563,
+    '(': 799, ')': 799, '*': 1024, '+': 1716, ',': 651, '-': 739, '.': 651, '/': 690,
+    '0': 1303, '1': 1303, '2': 1303, '3': 1303, '4': 1303, '5': 1303, '6': 1303, '7': 1303,
+    '8': 1303, '9': 1303, ':': 690, ';': 690, '<': 1716, '=': 1716, '>': 1716, '?': 1087,
+    '@': 2048, 'A': 1401, 'B': 1405, 'C': 1430, 'D': 1577, 'E': 1294, 'F': 1178, 'G': 1587,
+    'H': 1540, 'I': 604, 'J': 604, 'K': 1343, 'L': 1141, 'M': 1767, 'N': 1532, 'O': 1612,
+    'P': 1235, 'Q': 1612, 'R': 1423, 'S': 1300, 'T': 1251, 'U': 1499, 'V': 1401, 'W': 2025,
+    'X': 1403, 'Y': 1251, 'Z': 1403, '[': 799, '\\': 690, ']': 799, '^': 1716, '_': 1024,
+    '`': 1024, 'a': 1255, 'b': 1300, 'c': 1126, 'd': 1300, 'e': 1260, 'f': 721, 'g': 1300,
+    'h': 1298, 'i': 569, 'j': 569, 'k': 1186, 'l': 569, 'm': 1995, 'n': 1298, 'o': 1253,
+    'p': 1300, 'q': 1300, 'r': 842, 's': 1067, 't': 803, 'u': 1298, 'v': 1212, 'w': 1675,
+    'x': 1212, 'y': 1212, 'z': 1075, '{': 1303, '|': 690, '}': 1303, '~': 1716,
+}
+
+# characters outside the table are taken to be as wide as a digit
+DEFAULT_ADVANCE = ADVANCE_WIDTHS['0']
+
+@functools.lru_cache(maxsize=4096)
+def text_width(text, size, preserve_space=False):
+    """The advance width of text set at font size size (in user units).
+
+    Unless preserve_space is set, runs of white space count once and
+    leading and trailing space not at all, as SVG lays out text without
+    xml:space="preserve".
+    """
+    if not preserve_space:
+        text = ' '.join(text.split())
+    return sum(ADVANCE_WIDTHS.get(char, DEFAULT_ADVANCE) for char in text) * size / UNITS_PER_EM
+
+def text_extent(text, size, x, anchor='middle'):
+    """(left, right) of text placed at x with the given SVG text-anchor."""
+    width = text_width(text, size)
+    if anchor == 'middle':
+        x -= width / 2
+    elif anchor == 'end':
+        x -= width
+    return x, x + width
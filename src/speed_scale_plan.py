@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+Rulers for every leg of a flight plan, packed onto printable pages, run as
+
+    python render_speed_scale.py plan PLAN.csv [-o DIR] [options]
+
+The plan is a CSV file with a header row and one leg per row. Columns
+named like the extension's options (speed, speed-unit, scale,
+max-length, ...) set that option for the leg; groundspeed and gs are
+taken as speed, and leg or name as the caption printed above the ruler.
+Other columns are ignored, as are rows starting with '#'. Options given
+on the command line apply to every leg that does not set them; the output
+modes (--compound, --instancing, --css-classes, --label-mode, --precision)
+can only be set there, as they apply to whole pages.
+
+Each ruler is laid out with RulerLayout (the same maths as the
+extension), then the rulers are packed onto pages in shelves, tallest
+first, and every page is written with the streaming writer for --format
+(svg, pdf or dxf).
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import sys
+
+# plan column names taken as option names
+COLUMN_ALIASES = {
+    'groundspeed': 'speed',
+    'gs': 'speed',
+    'leg': 'caption',
+    'name': 'caption',
+}
+
+# options for the writer rather than the ruler, set for a whole run
+WRITER_OPTIONS = {'compound', 'instancing', 'css_classes', 'label_mode', 'precision'}
+
+def read_plan(stream):
+    """Read a flight plan CSV from a text stream. Returns a list of
+    (line number, {option dest: value text}) for each leg.
+    """
+    import csv
+    from speed_scale_layout import RULER_DEFAULTS
+    reader = csv.reader(stream)
+    header = None
+    legs = []
+    for row in reader:
+        if not row or not ''.join(row).strip() or row[0].lstrip().startswith('#'):
+            continue
+        if header is None:
+            header = [name.strip().lower().replace('-', '_').replace(' ', '_') for name in row]
+            header = [COLUMN_ALIASES.get(name, name) for name in header]
+            continue
+        values = {name: value.strip() for name, value in zip(header, row)
+            if name in RULER_DEFAULTS and name not in WRITER_OPTIONS and value.strip()}
+        legs.append((reader.line_num, values))
+    return legs
+
+def leg_options(values, extra):
+    """The options dict for one leg: extra (command line arguments) with
+    the leg's own values on top.
+    """
+    from speed_scale_layout import options_from_args
+    return options_from_args(list(extra) + ['--{}={}'.format(name, value)
+        for name, value in values.items()])
+
+def pack_shelves(sizes, width, height, gap=0.0):
+    """Place boxes of the given (width, height) sizes on pages of the given
+    width and height, first fit decreasing height: boxes are taken tallest
+    first and put on the first shelf with room, else on a new shelf on the
+    first page with room, else on a new page. Boxes of equal height keep
+    their order. Returns (page, x, y) for each box, in the order given.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    shelves = []        # [page, y, height, x of the next box]
+    page_tops = []      # y of the next shelf on each page
+    placements = [None] * len(sizes)
+    for i in order:
+        w, h = sizes[i]
+        if w > width or h > height:
+            raise ValueError('A {:g} x {:g} ruler does not fit on a {:g} x {:g} page'.format(
+                w, h, width, height))
+        for shelf in shelves:
+            if shelf[3] + w <= width and h <= shelf[2]:
+                break
+        else:
+            for page, top in enumerate(page_tops):
+                if top + h <= height:
+                    break
+            else:
+                page = len(page_tops)
+                page_tops.append(0.0)
+            shelf = [page, page_tops[page], h, 0.0]
+            page_tops[page] += h + gap
+            shelves.append(shelf)
+        placements[i] = (shelf[0], shelf[3], shelf[1])
+        shelf[3] += w + gap
+    return placements
+
+def parse_page(text):
+    """'420x297' -> (420.0, 297.0)."""
+    try:
+        width, height = (float(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise ValueError('page size {!r} is not WIDTHxHEIGHT'.format(text))
+    return width, height
+
+def plan_main(argv=None):
+    """Lay out a ruler for every leg of a flight plan CSV on printable pages.
+
+    Any unrecognised arguments are ruler options used by every leg that
+    does not set them, e.g. --max-length=200 --label-mode=strokes.
+    """
+    import argparse, os
+    from speed_scale_layout import RulerLayout, options_from_args, resolve_params, unittouu_for
+    from speed_scale_export import FORMATS, exporter_for
+
+    parser = argparse.ArgumentParser(prog='render_speed_scale.py plan',
+        description=plan_main.__doc__.splitlines()[0])
+    parser.add_argument('plan', help='Flight plan CSV, one leg per row')
+    parser.add_argument('-o', '--output-dir', default='.',
+        help='Directory for the page SVGs')
+    parser.add_argument('--page', default='420x297',
+        help='Page size in mm, WIDTHxHEIGHT (default: A3 landscape)')
+    parser.add_argument('--margin', type=float, default=10,
+        help='Page margin (mm)')
+    parser.add_argument('--gap', type=float, default=5,
+        help='Space between rulers (mm)')
+    parser.add_argument('--format', choices=FORMATS, default='svg',
+        help='Format of the page files')
+    opts, extra = parser.parse_known_args(argv)
+    try:
+        page_width, page_height = parse_page(opts.page)
+        options = options_from_args(extra)
+    except ValueError as err:
+        parser.error(str(err))
+
+    with open(opts.plan, newline='') as stream:
+        legs = read_plan(stream)
+    unittouu = unittouu_for('mm')
+    layouts = []
+    for line, values in legs:
+        try:
+            layouts.append(RulerLayout(resolve_params(leg_options(values, extra), unittouu)))
+        except (ValueError, KeyError, ZeroDivisionError) as err:
+            sys.stderr.write('{}:{}: {}\n'.format(opts.plan, line, err))
+            return 1
+    bounds = [layout.bounds() for layout in layouts]
+    sizes = [(right - left, bottom - top) for left, top, right, bottom in bounds]
+    area = (page_width - 2 * opts.margin, page_height - 2 * opts.margin)
+    for (line, values), (width, height) in zip(legs, sizes):
+        if width > area[0] or height > area[1]:
+            sys.stderr.write('{}:{}: a {:g} x {:g} mm ruler does not fit on the page\n'.format(
+                opts.plan, line, width, height))
+            return 1
+    placements = pack_shelves(sizes, area[0], area[1], opts.gap)
+
+    pages = {}
+    for layout, (left, top, right, bottom), (page, x, y) in zip(layouts, bounds, placements):
+        pages.setdefault(page, []).append((y, x, layout, (opts.margin + x - left, opts.margin + y - top)))
+    os.makedirs(opts.output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(opts.plan))[0]
+    for page in sorted(pages):
+        path = os.path.join(opts.output_dir, '{}_page{:03d}.{}'.format(stem, page + 1, opts.format))
+        with open(path, 'wb') as stream:
+            writer = exporter_for(stream, options, opts.format)
+            writer.start_document(page_width, page_height)
+            for y, x, layout, origin in sorted(pages[page], key=lambda item: item[:2]):
+                writer.write_ruler(layout, origin)
+            writer.end_document()
+        print(path)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(plan_main(sys.argv[1:]))
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+Add a ruler to a large chart document without loading it, run as
+
+    python render_speed_scale.py splice CHART.svg [-o OUT.svg] [options]
+
+The chart is scanned once with expat to find the target layer and the
+document scale; the output is then the chart's own bytes up to the end of
+that layer, the ruler's Speed_scale group, and the rest of the chart. No
+DOM is built and nothing outside the new group is re-serialised, so the
+rest of the file comes through byte for byte. Neither inkex nor lxml is
+imported.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import re, shutil, sys
+
+SVG = 'http://www.w3.org/2000/svg '
+INKSCAPE = 'http://www.inkscape.org/namespaces/inkscape '
+SODIPODI = 'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd '
+GROUP = SVG + 'g'
+NAMEDVIEW = SODIPODI + 'namedview'
+
+CHUNK_SIZE = 1 << 20
+
+TRANSLATE = re.compile(r'^\s*translate\(\s*([^\s,)]+)(?:[\s,]+([^\s,)]+))?\s*\)\s*$')
+
+class Layer():
+    """Where a layer ends in the chart, and the translation from document
+    to layer coordinates.
+    """
+    def __init__(self, elem_id, label, offset_xy):
+        self.id = elem_id
+        self.label = label
+        self.offset_xy = offset_xy  # None if not a translation
+        self.end = None             # byte offset of </g>, or just past />
+        self.empty = False          # no child elements, so maybe <g .../>
+
+def parse_translate(text):
+    """The (x, y) of a translate() transform, (0, 0) for none, or None for
+    any other transform.
+    """
+    if not text:
+        return (0.0, 0.0)
+    match = TRANSLATE.match(text)
+    if match is None:
+        return None
+    return (float(match.group(1)), float(match.group(2) or 0))
+
+class ChartScanner():
+    """Collect the root's size attributes and the layers of a chart with
+    one pass of expat over the file.
+
+    Scanning stops at the end of the target (a layer id or label) or,
+    without one, of the document's current layer; only a chart with
+    neither is read to the end, to find its last top-level layer.
+    """
+    def __init__(self, target=None):
+        import xml.parsers.expat
+        self.target = target
+        self.root = None
+        self.current_layer = None
+        self.layers = {}
+        self.top_layers = []
+        self.found = None
+        self.stack = []             # (layer or None, offset_xy) per open element
+        self.parser = xml.parsers.expat.ParserCreate(namespace_separator=' ')
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.last_event = None
+
+    def start(self, tag, attrs):
+        stack = self.stack
+        if stack and tag != GROUP and 'transform' not in attrs:
+            # the bulk of a chart: nothing to record but the nesting
+            if tag == NAMEDVIEW:
+                self.current_layer = attrs.get(INKSCAPE + 'current-layer')
+            stack.append((None, stack[-1][1]))
+            self.last_event = None
+            return
+        offset_xy = stack[-1][1] if stack else (0.0, 0.0)
+        layer = None
+        if not stack:
+            self.root = attrs
+        if offset_xy is not None and stack:
+            translate = parse_translate(attrs.get('transform'))
+            offset_xy = translate and (offset_xy[0] + translate[0], offset_xy[1] + translate[1])
+        if tag == GROUP and attrs.get(INKSCAPE + 'groupmode') == 'layer':
+            layer = Layer(attrs.get('id'), attrs.get(INKSCAPE + 'label'), offset_xy)
+            if layer.id:
+                self.layers[layer.id] = layer
+            if len(stack) == 1:
+                self.top_layers.append(layer)
+        stack.append((layer, offset_xy))
+        self.last_event = layer
+
+    def end(self, tag):
+        layer = self.stack.pop()[0]
+        if layer is not None:
+            layer.end = self.parser.CurrentByteIndex
+            layer.empty = self.last_event is layer
+            if self.target in (layer.id, layer.label) or (self.target is None
+                    and layer.id == self.current_layer):
+                self.found = layer
+        self.last_event = None
+
+    def scan(self, stream):
+        """Feed the chart to expat until the target layer has ended."""
+        while self.found is None:
+            data = stream.read(CHUNK_SIZE)
+            self.parser.Parse(data, not data)
+            if not data:
+                break
+        return self
+
+    def target_layer(self):
+        """The layer to add the ruler to: the named target, else the
+        document's current layer, else its last top-level layer. None
+        means the root.
+        """
+        if self.found is not None or self.target is not None:
+            return self.found
+        return self.top_layers[-1] if self.top_layers else None
+
+def root_end(stream):
+    """The byte offset of the root's closing tag."""
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(max(0, size - 4096))
+    tail = stream.read()
+    return size - len(tail) + tail.rindex(b'</')
+
+def view_centre(root):
+    """The centre of the root's viewBox, or of its width and height."""
+    box = [float(v) for v in (root.get('viewBox') or '').replace(',', ' ').split()]
+    if len(box) == 4:
+        return (box[0] + box[2] / 2, box[1] + box[3] / 2)
+    from speed_scale_layout import unittouu_for
+    unittouu = unittouu_for('px')
+    return (unittouu(root.get('width', '0')) / 2, unittouu(root.get('height', '0')) / 2)
+
+def splice(input_file, output, options, target=None, centre=None, cache=None):
+    """Write the chart in input_file to the binary stream output with a
+    ruler for options added to its target layer. centre is the ruler's
+    centre in layer user units, by default the centre of the page. A
+    FragmentCache, if given, supplies the ruler when it has been made
+    before. Returns the layer used, or None for the root.
+    """
+    from speed_scale_layout import document_unittouu
+    from speed_scale_svg import place_fragment
+
+    with open(input_file, 'rb') as stream:
+        scanner = ChartScanner(target).scan(stream)
+        layer = scanner.target_layer()
+        if target is not None and layer is None:
+            raise ValueError('No layer with id or label {!r}'.format(target))
+        root = scanner.root
+        if layer is not None and layer.offset_xy is None:
+            raise ValueError('Layer {!r} has a transform other than translate()'.format(
+                layer.label or layer.id))
+
+        unittouu = document_unittouu(root.get('width'), root.get('viewBox'))
+        (ox, oy), ruler = ruler_fragment(options, unittouu, cache)
+        x, y = centre or view_centre(root)
+        if centre is None and layer is not None:
+            x, y = x - layer.offset_xy[0], y - layer.offset_xy[1]
+        ruler = place_fragment(ruler.decode('ascii'), (x + ox, y + oy),
+            options['precision']).encode('ascii')
+
+        skip = 0
+        if layer is None:
+            offset = root_end(stream)
+        else:
+            offset = layer.end
+            if layer.empty:
+                # expat reports the end of <g .../> just past the />
+                stream.seek(offset - 2)
+                if stream.read(2) == b'/>':
+                    offset, skip, ruler = offset - 2, 2, b'>' + ruler + b'</g>'
+        stream.seek(0)
+        copy_bytes(stream, output, offset)
+        output.write(ruler)
+        stream.seek(skip, 1)
+        shutil.copyfileobj(stream, output, CHUNK_SIZE)
+    return layer
+
+def ruler_fragment(options, unittouu, cache=None):
+    """The ruler for options as a fragment_text() without an origin, and
+    the origin that centres it on (0, 0), from cache if it is there.
+    """
+    from speed_scale_layout import RulerLayout, resolve_params
+    from speed_scale_svg import writer_for
+    if cache is not None:
+        from speed_scale_cache import fragment_key
+        key = fragment_key('stream', options, unittouu('1in'))
+        stored = cache.get(key)
+        if stored is not None:
+            meta, fragment = stored
+            return tuple(meta['origin']), fragment
+    layout = RulerLayout(resolve_params(options, unittouu))
+    # only ASCII is inserted, whatever the chart's encoding
+    fragment = writer_for(None, options).fragment_text(layout).encode('ascii', 'xmlcharrefreplace')
+    origin = layout.origin(0, 0)
+    if cache is not None:
+        cache.put(key, {'origin': origin}, fragment)
+    return origin, fragment
+
+def copy_bytes(source, dest, size):
+    while size:
+        data = source.read(min(size, CHUNK_SIZE))
+        if not data:
+            raise ValueError('Unexpected end of file')
+        dest.write(data)
+        size -= len(data)
+
+def splice_main(argv=None):
+    """Add a speed scale ruler to an existing SVG without loading it.
+
+    Any unrecognised arguments are ruler options, as for the extension,
+    e.g. --speed=120 --scale=500000.
+    """
+    import argparse, os
+    from xml.parsers.expat import ExpatError
+    from speed_scale_cache import default_cache
+    from speed_scale_layout import options_from_args
+
+    parser = argparse.ArgumentParser(prog='render_speed_scale.py splice',
+        description=splice_main.__doc__.splitlines()[0])
+    parser.add_argument('input', help='The chart SVG')
+    parser.add_argument('-o', '--output',
+        help='Write the result here (default: stdout)')
+    parser.add_argument('--layer',
+        help='Id or label of the layer to add to (default: the current layer)')
+    parser.add_argument('--centre',
+        help='Centre of the ruler as x,y in layer user units (default: the page centre)')
+    parser.add_argument('--cache', action='store_true',
+        help='Reuse rulers stored on disk by earlier runs, see speed_scale_cache')
+    opts, extra = parser.parse_known_args(argv)
+    centre = None
+    if opts.centre:
+        try:
+            centre = tuple(float(v) for v in opts.centre.split(','))
+        except ValueError:
+            centre = ()
+        if len(centre) != 2:
+            parser.error('--centre takes x,y')
+    if opts.output and os.path.exists(opts.output) and os.path.samefile(opts.input, opts.output):
+        parser.error('the output must not overwrite the input')
+
+    try:
+        options = options_from_args(extra)
+        cache = default_cache() if opts.cache else None
+        if opts.output:
+            with open(opts.output, 'wb') as output:
+                splice(opts.input, output, options, opts.layer, centre, cache)
+        else:
+            splice(opts.input, sys.stdout.buffer, options, opts.layer, centre, cache)
+            sys.stdout.flush()
+    except (OSError, ValueError, ExpatError) as err:
+        sys.stderr.write('{}\n'.format(err))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(splice_main(sys.argv[1:]))
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+Streaming SVG writer for speed scale rulers.
+
+Writes rulers laid out by speed_scale_layout.RulerLayout straight to a
+file or stream as SVG text, without building an lxml tree, so neither
+inkex nor lxml are needed. The groups, elements and styles written are
+the same as ScaleGen produces for the same options. Each ruler is
+written as soon as it is laid out, so memory use does not grow with the
+number of rulers.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import hashlib
+from xml.sax.saxutils import escape, quoteattr
+
+from speed_scale_layout import TICK_LABEL, layout_arrowheads
+from speed_scale_glyphs import STROKE_WIDTH, drawable, glyph_path, layout_text
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+INKSCAPE_NS = 'http://www.inkscape.org/namespaces/inkscape'
+SODIPODI_NS = 'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+
+def format_style(style):
+    """Serialise a style dict the way inkex.Style does."""
+    return ';'.join('{}:{}'.format(key, style[key]) for key in sorted(style))
+
+def format_path_number(value):
+    """Format a coordinate the way inkex.paths does."""
+    return '{:g}'.format(value)
+
+class CoordinateFormat():
+    """How coordinates are written into the SVG text.
+
+    With precision < 0 numbers are written with str() and paths as
+    absolute M and L commands, as ScaleGen always has. Otherwise numbers
+    are rounded to precision decimals without trailing zeros, and paths
+    use relative commands: h and v for horizontal and vertical lines, l
+    for any other, and m from one subpath to the next. The relative steps
+    are taken between the rounded points, so rounding does not build up
+    along a path.
+    """
+    def __init__(self, precision=-1):
+        self.precision = precision
+        self.compact = precision >= 0
+        self.scale = 10 ** max(precision, 0)
+
+    def fixed(self, n):
+        """The text of n / 10**precision, for an integer n."""
+        if not self.precision:
+            return str(n)
+        text = '{:0{}d}'.format(abs(n), self.precision + 1)
+        whole, frac = text[:-self.precision], text[-self.precision:].rstrip('0')
+        return ('-' if n < 0 else '') + whole + ('.' + frac if frac else '')
+
+    def number(self, value):
+        if not self.compact:
+            return str(value)
+        return self.fixed(int(round(value * self.scale)))
+
+    def translate(self, x, y):
+        if not self.compact:
+            return 'translate' + str((x, y))
+        return 'translate({},{})'.format(self.number(x), self.number(y))
+
+    def path(self, subpaths, closed=False):
+        """The d of straight line subpaths, each a sequence of (x, y)
+        points; closed closes every subpath.
+        """
+        if not self.compact:
+            end = ' z' if closed else ''
+            return ' '.join('M ' + ' L '.join('{},{}'.format(x, y) for x, y in points) + end
+                for points in subpaths)
+        fixed, scale = self.fixed, self.scale
+        out = []
+        pen = None              # the current point, in units of 10**-precision
+        for points in subpaths:
+            points = [(int(round(x * scale)), int(round(y * scale))) for x, y in points]
+            x, y = points[0]
+            if pen is None:
+                out.append('M{},{}'.format(fixed(x), fixed(y)))
+            else:
+                out.append('m{},{}'.format(fixed(x - pen[0]), fixed(y - pen[1])))
+            pen = points[0]
+            for x, y in points[1:]:
+                dx, dy = x - pen[0], y - pen[1]
+                if not dx:
+                    out.append('v' + fixed(dy))
+                elif not dy:
+                    out.append('h' + fixed(dx))
+                else:
+                    out.append('l{},{}'.format(fixed(dx), fixed(dy)))
+                pen = (x, y)
+            if closed:
+                out.append('z')
+                pen = points[0]
+        return ''.join(out)
+
+    def lines(self, segments):
+        """The d of separate lines, each given as (x1, y1, x2, y2)."""
+        return self.path(((x1, y1), (x2, y2)) for x1, y1, x2, y2 in segments)
+
+def def_id_for(prefix, attribs):
+    """The content derived id ScaleGen.add_def() gives a definition."""
+    key = hashlib.sha1(repr(sorted(attribs.items())).encode()).hexdigest()[:8]
+    return '{}-{}'.format(prefix, key)
+
+class SvgRulerWriter():
+    """Write one or more rulers to a stream as a standalone SVG document.
+
+    compound, instancing, css_classes, label_mode and precision select the
+    same output modes as the --compound, --instancing, --css-classes,
+    --label-mode and --precision options of ScaleGen.
+    The stream may be text or binary.
+    """
+    def __init__(self, stream, compound=False, instancing='none', css_classes=False,
+            label_mode='text', precision=-1):
+        self.stream = stream
+        self.binary = 'b' in getattr(stream, 'mode', 'b') and not hasattr(stream, 'encoding')
+        self.compound = compound
+        self.instancing = instancing
+        self.css_classes = css_classes
+        self.label_mode = label_mode
+        self.coords = CoordinateFormat(precision)
+        # definitions and stylesheets shared by all rulers, written at the end
+        self.defs = {}
+
+    def write(self, text):
+        self.stream.write(text.encode('utf-8') if self.binary else text)
+
+    def start_document(self, width, height, unit='mm'):
+        self.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.write('<svg xmlns="{}" xmlns:inkscape="{}" xmlns:sodipodi="{}" xmlns:xlink="{}" '
+            'width="{}{}" height="{}{}" viewBox="0 0 {} {}">\n'.format(SVG_NS, INKSCAPE_NS,
+            SODIPODI_NS, XLINK_NS, width, unit, height, unit, width, height))
+        self.write('<sodipodi:namedview id="namedview1"/>\n')
+        self.write('<g inkscape:groupmode="layer" inkscape:label="Layer 1" id="layer1">\n')
+
+    def end_document(self):
+        self.write('</g>\n<defs>')
+        for text in self.defs.values():
+            self.write(text)
+        self.write('</defs>\n</svg>\n')
+
+    def element(self, tag, attribs, text=None):
+        attrs = ''.join(' {}={}'.format(key, quoteattr(str(value)))
+            for key, value in attribs.items())
+        if text is None:
+            return '<{}{}/>'.format(tag, attrs)
+        return '<{}{}>{}</{}>'.format(tag, attrs, escape(text), tag)
+
+    def add_def(self, prefix, tag, attribs):
+        def_id = def_id_for(prefix, attribs)
+        if def_id not in self.defs:
+            self.defs[def_id] = self.element(tag, dict(attribs, id=def_id))
+        return def_id
+
+    def style_attribs(self, role, style, stylesheet):
+        if not self.css_classes:
+            return {'style': format_style(style)}
+        stylesheet.setdefault(role, format_style(style))
+        return {'class': role}
+
+    def ruler_body(self, layout, stylesheet):
+        """Return the chunks of text inside the Speed_scale group."""
+        out = []
+        out.append('<g inkscape:label="Label_line">')
+        label_line = len(out)
+        out.append('</g><g inkscape:label="Short line">')
+        short_line = len(out)
+        out.append('</g>')
+        groups = {TICK_LABEL: [], 'short': []}
+        self.ticks(layout, groups, stylesheet)
+        out[short_line:short_line] = groups['short']
+        out[label_line:label_line] = groups[TICK_LABEL]
+
+        out.append('<g inkscape:label="Perpendicular line">')
+        for segment in layout.perpendicular_lines():
+            out.append(self.segment(segment, stylesheet))
+        out.append('</g>')
+
+        numeric = [self.label(label, stylesheet) for label in layout.numeric_labels()]
+        blank, labels = [], []
+        for label, box in layout.dimensions():
+            labels.append(self.label(label, stylesheet))
+            blank.append(self.segment(box, stylesheet))
+        out.append('<g inkscape:label="Blank behind labels">')
+        out.extend(blank)
+        out.append('</g><g inkscape:label="Labels">')
+        out.extend(numeric)
+        out.extend(labels)
+        out.extend(self.label(label, stylesheet) for label in layout.captions())
+        out.append('</g>')
+        return out
+
+    def segment(self, segment, stylesheet):
+        return self.element('path', dict(self.style_attribs(segment.role, segment.style, stylesheet), **{
+            'inkscape:label': segment.name,
+            'd': self.coords.lines([(segment.x1, segment.y1, segment.x2, segment.y2)]),
+        }))
+
+    def label(self, label, stylesheet):
+        if self.label_mode == 'strokes' and drawable(label.text):
+            return self.glyph_label(label, stylesheet)
+        return self.element('text', dict(self.style_attribs(label.role, label.style, stylesheet),
+            x=self.coords.number(label.x), y=self.coords.number(label.y)), label.text)
+
+    def glyph_label(self, label, stylesheet):
+        """A label drawn with the single-stroke font, as ScaleGen.add_glyph_label()."""
+        size = float(label.style['font-size'])
+        colour = label.style['fill']
+        style = {
+            'fill': 'none', 'stroke': colour, 'stroke-width': size * STROKE_WIDTH,
+            'stroke-linecap': 'round', 'stroke-linejoin': 'round',
+        }
+        head = self.element('g', dict(self.style_attribs('label-glyphs-' + colour, style, stylesheet),
+            **{'inkscape:label': label.text}))[:-2] + '>'
+        uses = ''.join(self.element('use', {
+            'xlink:href': '#' + self.add_def('glyph', 'path', {'d': glyph_path(char, size)}),
+            'x': self.coords.number(round(x, 4)), 'y': self.coords.number(label.y)})
+            for char, x in layout_text(label.text, size, label.x, label.style['text-anchor']))
+        return head + uses + '</g>'
+
+    def ticks(self, layout, groups, stylesheet):
+        """Append the tick lines and arrowheads to groups[TICK_LABEL] and
+        groups['short'], in the same mode dependent form as ScaleGen.
+        """
+        p = layout.params
+        ticks = layout.ticks
+        label = ticks['kind'] == TICK_LABEL
+        y2 = ticks['y2'].copy()
+        y2[label], arrows = layout.arrowheads()
+        coords = self.coords
+
+        if not (self.compound or self.instancing != 'none' or self.css_classes):
+            # one element per tick, as ScaleGen.add_ticks() with Arrow and NewPath
+            arrow_points = iter(arrows.tolist())
+            for i, x, kind, red, y1, y2_short, y2_full in zip(ticks['index'].tolist(),
+                    ticks['x'].tolist(), ticks['kind'].tolist(), ticks['red'].tolist(),
+                    ticks['y1'].tolist(), y2.tolist(), ticks['y2'].tolist()):
+                colour = 'red' if red else 'black'
+                if kind == TICK_LABEL:
+                    style = format_style({'stroke': colour, 'stroke-width': p['labellinestrokewidth']})
+                    if coords.compact:
+                        d = coords.lines([(x, y1, x, y2_short)])
+                    else:
+                        d = 'M {} {} L {} {}'.format(*map(format_path_number, (x, y1, x, y2_short)))
+                    groups[TICK_LABEL].append(self.element('path', {
+                        'd': d,
+                        'style': style,
+                        'inkscape:label': 'label_line_{}'.format(i),
+                    }))
+                    groups[TICK_LABEL].append(self.element('path', {
+                        'style': format_style({'stroke': 'none', 'stroke-width': '0', 'fill': colour}),
+                        'inkscape:label': 'arrowhead',
+                        'd': coords.path([next(arrow_points)], closed=True),
+                    }))
+                else:
+                    groups['short'].append(self.element('path', {
+                        'style': format_style({'stroke': colour, 'stroke-width': p['shortlinestrokewidth']}),
+                        'inkscape:label': 'short_line_{}'.format(i),
+                        'd': coords.lines([(x, y1, x, y2_full)]),
+                    }))
+            return
+
+        arrow_red = ticks['red'][label]
+        for colour, red in (('red', True), ('black', False)):
+            for name, key, mask, strokewidth in (
+                    ('label_line', TICK_LABEL, label, p['labellinestrokewidth']),
+                    ('short_line', 'short', ~label, p['shortlinestrokewidth'])):
+                mask = mask & (ticks['red'] == red)
+                if not mask.any():
+                    continue
+                style = {'stroke': colour, 'stroke-width': strokewidth}
+                role = '{}-{}'.format(name.replace('_', '-'), colour)
+                xs, y1s, y2s = (ticks['x'][mask].tolist(), ticks['y1'][mask].tolist(),
+                    y2[mask].tolist())
+                if self.instancing == 'all':
+                    def_id = self.add_def(name, 'path', {
+                        'style': format_style(style),
+                        'd': coords.lines([(0, y1s[0], 0, y2s[0])]),
+                    })
+                    groups[key].extend(self.uses(def_id, xs))
+                elif self.compound:
+                    groups[key].append(self.element('path', dict(self.style_attribs(role, style, stylesheet), **{
+                        'inkscape:label': '{}s_{}'.format(name, colour),
+                        'd': coords.lines((x, a, x, b) for x, a, b in zip(xs, y1s, y2s)),
+                    })))
+                else:
+                    for i, x, a, b in zip(ticks['index'][mask].tolist(), xs, y1s, y2s):
+                        groups[key].append(self.element('path', dict(self.style_attribs(role, style, stylesheet), **{
+                            'inkscape:label': '{}_{}'.format(name, i),
+                            'd': coords.lines([(x, a, x, b)]),
+                        })))
+
+            points = arrows[arrow_red == red]
+            if not len(points):
+                continue
+            style = {'stroke': 'none', 'stroke-width': '0', 'fill': colour}
+            if self.instancing != 'none':
+                first = label.nonzero()[0][0]
+                _, tip = layout_arrowheads([0.0], ticks['y1'][first:first+1],
+                    ticks['y2'][first:first+1], *layout.arrow_shape())
+                def_id = self.add_def('arrowhead', 'path', {
+                    'style': format_style(style),
+                    'd': coords.path(tip.tolist(), closed=True),
+                })
+                groups[TICK_LABEL].extend(self.uses(def_id, points[:, 0, 0].tolist()))
+            else:
+                groups[TICK_LABEL].append(self.element('path', dict(self.style_attribs('arrowhead-' + colour, style, stylesheet), **{
+                    'inkscape:label': 'arrowheads_{}'.format(colour),
+                    'd': coords.path(points.tolist(), closed=True),
+                })))
+
+    def uses(self, def_id, xs):
+        return [self.element('use', {'xlink:href': '#' + def_id, 'x': self.coords.number(x)})
+            for x in xs]
+
+    def ruler_text(self, layout, origin):
+        """Return one ruler's Speed_scale group, translated to origin (if
+        not None), as SVG text.
+        """
+        stylesheet = {}
+        body = self.ruler_body(layout, stylesheet)
+        attribs = {'inkscape:label': 'Speed_scale'}
+        if origin is not None:
+            attribs['transform'] = self.coords.translate(*origin)
+        if self.css_classes:
+            rules = ''.join('{{scope}} .{} {{{{{}}}}}\n'.format(role, style)
+                for role, style in sorted(stylesheet.items()))
+            scope = 'speed-scale-' + hashlib.sha1(rules.encode()).hexdigest()[:8]
+            attribs['class'] = scope
+            style_id = scope + '-style'
+            if style_id not in self.defs:
+                self.defs[style_id] = self.element('style', {'id': style_id, 'type': 'text/css'},
+                    rules.format(scope='.' + scope))
+        head = self.element('g', attribs)[:-2] + '>'
+        return head + ''.join(body) + '</g>\n'
+
+    def fragment_text(self, layout, origin=None):
+        """One ruler's Speed_scale group as a fragment to splice into an
+        existing document: it declares the namespaces it uses and carries
+        the definitions it refers to in its own <defs>.
+        """
+        self.defs = {}
+        head, body = self.ruler_text(layout, origin).split('>', 1)
+        head += ' xmlns="{}" xmlns:inkscape="{}" xmlns:xlink="{}">'.format(SVG_NS, INKSCAPE_NS, XLINK_NS)
+        if self.defs:
+            head += '<defs>{}</defs>'.format(''.join(self.defs.values()))
+        return head + body
+
+    def write_ruler(self, layout, origin):
+        """Write one ruler's Speed_scale group, translated to origin."""
+        self.write(self.ruler_text(layout, origin))
+
+def place_fragment(fragment, origin, precision=-1):
+    """Translate a fragment_text() made without an origin to origin."""
+    return fragment.replace('<g ', '<g transform="{}" '.format(
+        CoordinateFormat(precision).translate(*origin)), 1)
+
+def writer_for(stream, options):
+    """An SvgRulerWriter using the output modes selected in options."""
+    return SvgRulerWriter(stream, compound=options['compound'],
+        instancing=options['instancing'], css_classes=options['css_classes'],
+        label_mode=options['label_mode'], precision=options['precision'])
+
+def write_ruler_document(stream, options, width=420, height=297, doc_unit='mm'):
+    """Write a standalone document holding one ruler, centred on the page.
+    options is a dict as returned by speed_scale_layout.options_from_args().
+    """
+    from speed_scale_layout import RulerLayout, resolve_params, unittouu_for
+    layout = RulerLayout(resolve_params(options, unittouu_for(doc_unit)))
+    writer = writer_for(stream, options)
+    writer.start_document(width, height, doc_unit)
+    writer.write_ruler(layout, layout.origin(width/2, height/2))
+    writer.end_document()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# coding=utf-8
+'''
+Copyright (C)
+2023 matburnham github
+
+A resident worker that runs ScaleGen for the extension, so a preview
+does not pay for interpreter start up and imports every time. Start it
+with
+
+    python render_speed_scale.py serve [--socket PATH] [--idle-timeout SECONDS]
+
+While it is running, render_speed_scale.py only forwards its options and
+the document to the worker over a Unix socket and writes back the
+modified document. With no worker serving (or on platforms without Unix
+sockets) the effect runs in-process as before.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import json, os, socket, stat, struct, sys, tempfile
+
+SOCKET_ENV = 'SPEED_SCALE_WORKER'
+
+# modules the worker keeps loaded, next to this file; it refuses requests
+# once any of them changes on disk, so an updated extension is never served
+# stale code
+MODULES = ('speed_scale_*.py', 'render_speed_scale.py')
+
+def socket_path():
+    """The worker's socket: $SPEED_SCALE_WORKER, else one in
+    $XDG_RUNTIME_DIR or in a private per user directory under the temporary
+    directory. None where Unix sockets are unavailable.
+    """
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'getuid'):
+        return None
+    if SOCKET_ENV in os.environ:
+        return os.environ[SOCKET_ENV] or None
+    directory = (os.environ.get('XDG_RUNTIME_DIR')
+        or os.path.join(tempfile.gettempdir(), 'speed-scale-{}'.format(os.getuid())))
+    return os.path.join(directory, 'speed-scale.sock')
+
+def private_directory(path):
+    """Whether path is a directory, not a symlink to one, owned by this
+    user and with mode 0700, so that no other user can put a socket in it.
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid()
+        and stat.S_IMODE(info.st_mode) == 0o700)
+
+def trusted_socket(path):
+    """Whether path is a socket owned by this user in a private_directory().
+    Only such a socket is used, so another user cannot stand in for the
+    worker.
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+        and private_directory(os.path.dirname(os.path.abspath(path))))
+
+def code_version():
+    """Modification times of the modules the worker runs, by path, so that
+    a module added or removed also counts as a change.
+    """
+    import glob
+    here = os.path.dirname(os.path.abspath(__file__))
+    paths = sorted(path for pattern in MODULES for path in glob.glob(os.path.join(here, pattern)))
+    return {path: os.stat(path).st_mtime_ns for path in paths}
+
+def send_frame(sock, data):
+    sock.sendall(struct.pack('>I', len(data)) + data)
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError('worker closed the connection')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def recv_frame(sock):
+    size, = struct.unpack('>I', recv_exact(sock, 4))
+    return recv_exact(sock, size)
+
+def split_args(argv):
+    """Split extension arguments into (options, input file, output file).
+    The input file is the last argument that is not an option and names a
+    file; without one the document comes from stdin, as with inkex.
+    """
+    args, input_file, output_file = [], None, None
+    argv = iter(argv)
+    for arg in argv:
+        if arg.startswith('--output='):
+            output_file = arg.split('=', 1)[1]
+        elif arg == '--output':
+            output_file = next(argv, None)
+        elif not arg.startswith('-') and os.path.isfile(arg):
+            if input_file:
+                args.append(input_file)
+            input_file = arg
+        else:
+            args.append(arg)
+    return args, input_file, output_file
+
+def forward(argv, path=None):
+    """Run the effect in the worker, writing the modified document to the
+    output file or stdout and any messages to stderr. Returns the exit
+    status, or None if no worker served the request, in which case nothing
+    has been written and the caller should run the effect itself.
+    """
+    path = path or socket_path()
+    if not path or not trusted_socket(path):
+        return None
+    args, input_file, output_file = split_args(argv)
+    if input_file:
+        with open(input_file, 'rb') as stream:
+            document = stream.read()
+    else:
+        document = sys.stdin.buffer.read()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            send_frame(sock, json.dumps({'args': args}).encode())
+            send_frame(sock, document)
+            reply = json.loads(recv_frame(sock).decode())
+            output = recv_frame(sock)
+    except (OSError, ValueError):
+        reply = None
+    if not reply or reply.get('stale'):
+        if not input_file:
+            # stdin is used up; let the in-process run read the copy
+            import io
+            sys.stdin = io.BytesIO(document)
+        return None
+    sys.stderr.write(reply['stderr'])
+    if output:
+        if output_file:
+            with open(output_file, 'wb') as stream:
+                stream.write(output)
+        else:
+            sys.stdout.buffer.write(output)
+            sys.stdout.flush()
+    return reply['status']
+
+def serve(path, idle_timeout=None):
+    """Serve effect requests on path until idle for idle_timeout seconds,
+    or until the extension's code changes.
+    """
+    import contextlib, io, socketserver, traceback
+    import render_speed_scale
+
+    version = code_version()
+
+    class RequestHandler(socketserver.BaseRequestHandler):
+        def handle(self):
+            request = json.loads(recv_frame(self.request).decode())
+            document = recv_frame(self.request)
+            if code_version() != version:
+                self.server.stopping = True
+                send_frame(self.request, json.dumps({'stale': True}).encode())
+                send_frame(self.request, b'')
+                return
+            output, messages, status = io.BytesIO(), io.StringIO(), 0
+            with contextlib.redirect_stderr(messages):
+                try:
+                    render_speed_scale.run_effect(request['args'], document, output,
+                        command='worker')
+                except render_speed_scale.inkex.AbortExtension as err:
+                    render_speed_scale.inkex.errormsg(str(err))
+                    status = render_speed_scale.inkex.base.ABORT_STATUS
+                except SystemExit as err:
+                    status = err.code if isinstance(err.code, int) else 1
+                except Exception:
+                    traceback.print_exc()
+                    status = 1
+            reply = {'status': status, 'stderr': messages.getvalue()}
+            send_frame(self.request, json.dumps(reply).encode())
+            send_frame(self.request, output.getvalue())
+
+    class WorkerServer(socketserver.UnixStreamServer):
+        stopping = False
+        def handle_timeout(self):
+            self.stopping = True
+
+    directory = os.path.dirname(os.path.abspath(path))
+    umask = os.umask(0o077)
+    try:
+        try:
+            os.makedirs(directory, 0o700, exist_ok=True)
+        except OSError:
+            pass
+        if not private_directory(directory):
+            sys.stderr.write('{} must be a directory of this user with mode 0700, '
+                'not a symlink\n'.format(directory))
+            return 1
+        if os.path.lexists(path):
+            if not trusted_socket(path):
+                sys.stderr.write('{} is in the way and is not a socket of this user\n'.format(path))
+                return 1
+            # a socket left by a worker that did not shut down cleanly
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                if sock.connect_ex(path) == 0:
+                    sys.stderr.write('A worker is already serving on {}\n'.format(path))
+                    return 1
+            os.unlink(path)
+        server = WorkerServer(path, RequestHandler)
+    finally:
+        os.umask(umask)
+    server.timeout = idle_timeout or None
+    try:
+        while not server.stopping:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
+    return 0
+
+def serve_main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='render_speed_scale.py serve',
+        description='Serve speed scale effect requests from a resident process.')
+    parser.add_argument('--socket', default=None,
+        help='Socket path (default: ${} or a per user socket)'.format(SOCKET_ENV))
+    parser.add_argument('--idle-timeout', type=float, default=0,
+        help='Exit after this many seconds without a request (default: never)')
+    opts = parser.parse_args(argv)
+    path = opts.socket or socket_path()
+    if not path:
+        parser.error('Unix sockets are not available on this platform')
+    return serve(path, opts.idle_timeout)
+
+if __name__ == '__main__':
+    sys.exit(serve_main(sys.argv[1:]))
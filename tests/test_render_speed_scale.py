@@ -0,0 +1,164 @@
+import json
+
+import pytest
+from lxml import etree
+
+from render_speed_scale import BLANK_DOCUMENT, ScaleGen, run_effect
+from speed_scale_glyphs import glyph_path
+
+
+def test_blank_document_ruler_inside_page():
+    effect = run_effect([])
+    layer = effect.svg.getElementById('layer1')
+    group = layer[-1]
+    assert group.get('inkscape:label') == 'Speed_scale'
+    page = effect.svg.get_page_bbox()
+    bbox = group.bounding_box(layer.transform)
+    assert page.left <= bbox.left and bbox.right <= page.right
+    assert page.top <= bbox.top and bbox.bottom <= page.bottom
+
+
+@pytest.mark.parametrize('args', [['--instancing=all'], ['--label-mode=strokes']])
+def test_xlink_declared_once(args):
+    text = etree.tostring(run_effect(args).document).decode()
+    assert text.count('xmlns:') == 3
+    document = BLANK_DOCUMENT.replace(b'xmlns:xlink="http://www.w3.org/1999/xlink"', b'')
+    text = etree.tostring(run_effect(args, document).document).decode()
+    assert text.count('xmlns:xlink') == 1
+
+
+@pytest.mark.parametrize('speed, message', [
+    ('', 'give at least one speed'),
+    (',', 'give at least one speed'),
+    ('0', 'must be positive'),
+    ('-5', 'must be positive'),
+    ('60,0', 'must be positive'),
+])
+def test_bad_speed_is_a_usage_error(speed, message, capsys):
+    with pytest.raises(SystemExit):
+        run_effect(['--speed=' + speed])
+    assert message in capsys.readouterr().err
+
+
+def test_disk_cache_is_off_by_default(tmp_path, monkeypatch):
+    monkeypatch.setenv('SPEED_SCALE_CACHE', str(tmp_path))
+    run_effect([])
+    assert not list(tmp_path.iterdir())
+
+
+def test_disk_cache_hit_records_this_runs_options(tmp_path, monkeypatch):
+    monkeypatch.setenv('SPEED_SCALE_CACHE', str(tmp_path))
+    run_effect(['--cache=true'])
+    assert list(tmp_path.iterdir())
+    hits = []
+    insert_fragment = ScaleGen.insert_fragment
+    monkeypatch.setattr(ScaleGen, 'insert_fragment',
+        lambda self, *args: hits.append(args) or insert_fragment(self, *args))
+    effect = run_effect(['--cache=true', '--useref=true'])
+    assert len(hits) == 1
+    group = effect.svg.getElementById('layer1')[-1]
+    assert json.loads(group.get('data-speed-scale-options'))['useref'] == 'True'
+
+
+def test_too_many_tick_levels_is_a_usage_error(capsys):
+    with pytest.raises(SystemExit):
+        run_effect(['--tick-levels=600,60,30,10,1'])
+    assert 'at most three tick levels' in capsys.readouterr().err
+
+
+def test_regenerate_rebuilds_only_the_edited_ruler():
+    document = etree.tostring(run_effect(['--speed=60']).document)
+    effect = run_effect(['--speed=90'], document)
+    first, second = effect.svg.getElementById('layer1')[-2:]
+    second.set('id', 'leg2')
+    second.set('transform', 'translate(12, 34)')
+    options = json.loads(second.get('data-speed-scale-options'))
+    options['speed'] = '120'
+    second.set('data-speed-scale-options', json.dumps(options))
+    before = etree.tostring(first)
+
+    effect = run_effect(['--regenerate=true'], etree.tostring(effect.document))
+    first, second = effect.svg.getElementById('layer1')[-2:]
+    assert etree.tostring(first) == before
+    assert second.get('id') == 'leg2'
+    assert second.get('transform') == 'translate(12, 34)'
+    assert json.loads(second.get('data-speed-scale-options'))['speed'] == '120'
+    # the same ruler as one made for 120 knots from the start
+    fresh = run_effect(['--speed=120']).svg.getElementById('layer1')[-1]
+    assert second.get('data-speed-scale-key') == fresh.get('data-speed-scale-key')
+    assert [etree.tostring(child) for child in second] == [etree.tostring(child) for child in fresh]
+
+    # nothing is stale now
+    document = etree.tostring(effect.document)
+    assert etree.tostring(run_effect(['--regenerate=true'], document).document) == document
+
+
+INKSCAPE_LABEL = '{http://www.inkscape.org/namespaces/inkscape}label'
+
+
+def ruler(args):
+    effect = run_effect(['--speed=90'] + args)
+    return effect, effect.svg.getElementById('layer1')[-1]
+
+
+def test_compound_paths():
+    effect, single = ruler([])
+    effect, compound = ruler(['--compound=True'])
+    labels = [[elem.get(INKSCAPE_LABEL) for elem in group] for group in compound[:2]]
+    assert labels == [['label_lines_red', 'arrowheads_red', 'label_lines_black', 'arrowheads_black'],
+        ['short_lines_red', 'short_lines_black']]
+    # one subpath per tick and arrowhead of the single path output
+    def subpaths(group, prefix):
+        return sum(elem.get('d').count('M') for elem in group
+            if elem.get(INKSCAPE_LABEL).startswith(prefix))
+    assert subpaths(compound[0], 'label_lines') == subpaths(single[0], 'label_line_') == 21
+    assert subpaths(compound[0], 'arrowheads') == subpaths(single[0], 'arrowhead') == 21
+    assert subpaths(compound[1], 'short_lines') == len(single[1]) == 100
+    for a, b in zip(single[2:], compound[2:]):
+        assert etree.tostring(a) == etree.tostring(b)
+
+
+def test_css_classes_share_one_stylesheet():
+    effect, styled = ruler([])
+    document = etree.tostring(run_effect(['--speed=90', '--css-classes=True']).document)
+    # a second ruler with the same options reuses the stylesheet
+    effect = run_effect(['--speed=90', '--css-classes=True'], document)
+    first, second = effect.svg.getElementById('layer1')[-2:]
+    scope = first.get('class')
+    assert scope.startswith('speed-scale-') and second.get('class') == scope
+    sheets = effect.svg.defs.findall('{http://www.w3.org/2000/svg}style')
+    assert [sheet.get('id') for sheet in sheets] == [scope + '-style']
+    rules = dict(line[len(scope) + 3:-1].split(' {') for line in sheets[0].text.splitlines())
+    classes = {elem.get('class') for elem in first.iterdescendants()} - {None}
+    assert classes == set(rules)
+    assert all(elem.get('style') is None for elem in first.iter())
+    # the rules are the styles the elements have without --css-classes
+    styles = {elem.get('style') for elem in styled.iterdescendants()} - {None}
+    assert styles == set(rules.values())
+
+
+@pytest.mark.parametrize('args', [['--label-mode=strokes'], ['--label-mode=strokes', '--instancing=all']])
+def test_use_hrefs_resolve_to_defs(args):
+    effect, group = ruler(args + ['--caption=Leg 1'])
+    defs = {elem.get('id'): elem for elem in effect.svg.defs}
+    uses = list(group.iter('{http://www.w3.org/2000/svg}use'))
+    hrefs = [use.get('{http://www.w3.org/1999/xlink}href') for use in uses]
+    assert all(href.startswith('#') and href[1:] in defs for href in hrefs)
+    # every definition is used
+    assert {href[1:] for href in hrefs} == set(defs)
+
+
+def test_glyph_labels():
+    effect, text = ruler(['--caption=Leg 1'])
+    effect, stroked = ruler(['--caption=Leg 1', '--label-mode=strokes'])
+    defs = {elem.get('id'): elem.get('d') for elem in effect.svg.defs}
+    texts = [elem.text for elem in text[4]]
+    assert [elem.get(INKSCAPE_LABEL) for elem in stroked[4]] == texts
+    size = float(text[4][0].style['font-size'])
+    for label in stroked[4]:
+        chars = label.get(INKSCAPE_LABEL).replace(' ', '')
+        assert len(label) == len(chars)
+        for char, use in zip(chars, label):
+            assert defs[use.get('{http://www.w3.org/1999/xlink}href')[1:]] == glyph_path(char, size)
+    # one definition per character drawn
+    assert len(defs) == len(set(''.join(texts).replace(' ', '')))
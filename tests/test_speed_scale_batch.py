@@ -0,0 +1,77 @@
+import json
+
+import inkex
+import pytest
+
+from speed_scale_batch import _run_job, batch_main
+
+
+@pytest.mark.parametrize('mode', [[], ['--stream']])
+def test_sheet_rows_do_not_overlap(tmp_path, mode):
+    sheet = tmp_path / 'sheet.svg'
+    assert batch_main(['--speeds', '30,120', '--scales', '250000,500000',
+        '--sheet', str(sheet), '-j', '1', '--pitch', '2'] + mode) == 0
+    svg = inkex.load_svg(str(sheet)).getroot()
+    groups = svg.xpath('//svg:g[@inkscape:label="Speed_scale"]')
+    assert len(groups) == 4
+    boxes = [group.bounding_box(group.getparent().transform) for group in groups]
+    for above, below in zip(boxes, boxes[1:]):
+        assert above.bottom < below.top
+    page = svg.get_page_bbox()
+    assert boxes[-1].bottom <= page.bottom
+
+
+def test_spec_without_stream_runs_the_effect(tmp_path):
+    spec = tmp_path / 'spec.json'
+    spec.write_text(json.dumps([{'speed': 90, 'scale': 500000}]))
+    output = tmp_path / 'rulers'
+    assert batch_main(['--spec', str(spec), '-o', str(output), '-j', '1']) == 0
+    ruler = (output / 'speed_scale_90kts_1-500K.svg').read_text()
+    # written from the inkex document, which records the options; the
+    # streaming writer does not
+    assert 'data-speed-scale-options' in ruler
+
+
+@pytest.mark.parametrize('mode', [[], ['--stream'], ['--sheet', 'sheet.svg']])
+def test_unknown_option_is_a_usage_error(tmp_path, mode, capsys):
+    with pytest.raises(SystemExit) as exit:
+        batch_main(['--bogus=1', '-o', str(tmp_path), '-j', '1'] + mode)
+    assert exit.value.code == 2
+    assert '--bogus=1' in capsys.readouterr().err
+
+
+def test_spec_key_must_be_spelled_as_an_option(tmp_path, capsys):
+    spec = tmp_path / 'spec.json'
+    spec.write_text(json.dumps({'speed_unit': ['kph']}))
+    with pytest.raises(SystemExit):
+        batch_main(['--spec', str(spec), '-o', str(tmp_path), '-j', '1'])
+    assert '--speed_unit=kph' in capsys.readouterr().err
+
+
+def exit_worker(args):
+    raise SystemExit(2)
+
+
+def test_worker_failure_is_returned():
+    name, error, result = _run_job((exit_worker, None, 'ruler.svg'))
+    assert (name, result) == ('ruler.svg', None)
+    assert error.startswith('SystemExit')
+
+
+def test_varied_options_are_in_the_filename(tmp_path):
+    spec = tmp_path / 'spec.json'
+    spec.write_text(json.dumps({'speed': [90], 'max-length': [100, 200]}))
+    output = tmp_path / 'rulers'
+    assert batch_main(['--spec', str(spec), '-o', str(output), '-j', '1', '--stream']) == 0
+    assert sorted(path.name for path in output.iterdir()) == [
+        'speed_scale_90kts_1-200K_max-length100.svg', 'speed_scale_90kts_1-200K_max-length200.svg']
+
+
+def test_duplicate_filenames_are_rejected(tmp_path, capsys):
+    spec = tmp_path / 'spec.json'
+    spec.write_text(json.dumps([{'speed': 90}, {'speed': 90}]))
+    output = tmp_path / 'rulers'
+    with pytest.raises(SystemExit):
+        batch_main(['--spec', str(spec), '-o', str(output), '-j', '1', '--stream'])
+    assert 'more than one job' in capsys.readouterr().err
+    assert not output.exists()
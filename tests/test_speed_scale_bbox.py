@@ -0,0 +1,102 @@
+import inkex
+import pytest
+
+from render_speed_scale import LRUCache
+from speed_scale_bbox import IDENTITY, BoundingBoxes, selection_centre
+
+DOCUMENT = b'''<svg xmlns="http://www.w3.org/2000/svg"
+    xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+    width="420mm" height="297mm" viewBox="0 0 420 297">
+  <defs><clipPath id="clip"><rect x="0" y="0" width="15" height="15"/></clipPath></defs>
+  <g id="layer" inkscape:groupmode="layer" transform="translate(12,-7) scale(1.5)">
+    <path id="curves" d="M 10,10 C 20,0 40,40 50,10 S 80,-20 90,10 Q 100,40 110,10 T 130,10"/>
+    <path id="relative" d="m 10,60 c 10,-10 30,30 40,0 s 30,-30 40,0 q 10,30 20,0 t 20,0 h 15 v -20 l 5,5 z"/>
+    <path id="lines" d="M 5 5 H 30 V 25 L 12.5 40 Z M 50 50 l -10 -3 h -4 v 8"/>
+    <path id="arc" d="M 10,100 A 20,10 30 0 1 50,110"/>
+    <rect id="rect" x="140" y="20" width="30" height="12" transform="rotate(90, 150, 20) skewX(45)"/>
+    <circle id="circle" cx="200" cy="50" r="8"/>
+    <ellipse id="ellipse" cx="220" cy="80" rx="12" ry="5"/>
+    <line id="line" x1="1" y1="2" x2="-30" y2="14"/>
+    <polygon id="polygon" points="0,0 10,3 4,-8"/>
+    <g id="outer" transform="translate(30,40) rotate(-90) scale(1.25)">
+      <g id="inner" transform="matrix(0.8,0.2,-0.1,1.2,5,-3)">
+        <path id="nested" d="M 0,0 C 10,-20 30,20 40,0 Q 50,-10 60,0"/>
+        <rect id="nested-rect" x="-5" y="2" width="8" height="4"/>
+      </g>
+      <circle id="group-circle" cx="-10" cy="-10" r="3"/>
+    </g>
+    <path id="clipped" clip-path="url(#clip)" d="M 0,0 L 30,30 L 0,30 Z"/>
+  </g>
+</svg>'''
+
+SHAPES = ['curves', 'relative', 'lines', 'arc', 'rect', 'circle', 'line', 'polygon',
+    'outer', 'inner', 'nested', 'nested-rect', 'clipped']
+
+
+# inkex rounds transforms it reads to six figures, so the ones above are
+# chosen to survive that exactly
+
+
+@pytest.fixture
+def svg():
+    return inkex.load_svg(DOCUMENT).getroot()
+
+
+def matrix(transform):
+    (a, c, e), (b, d, f) = transform.matrix
+    return (a, b, c, d, e, f)
+
+
+def inkex_box(elem, transform):
+    box = elem.bounding_box(transform)
+    return (box.left, box.top, box.right, box.bottom)
+
+
+@pytest.mark.parametrize('cache', [None, LRUCache(100)])
+def test_boxes_match_inkex(svg, cache):
+    for repeat in range(2):
+        boxes = BoundingBoxes(cache)
+        elems = [svg.getElementById(name) for name in SHAPES]
+        for elem in elems:
+            boxes.add(elem, matrix(elem.getparent().composed_transform()))
+        for elem, box in zip(elems, boxes.boxes()):
+            expected = inkex_box(elem, elem.getparent().composed_transform())
+            # inkex measures circles by their Bezier approximation
+            tolerance = 1e-3 if elem.get('id') in ('circle', 'outer') else 1e-9
+            assert box == pytest.approx(expected, abs=tolerance), elem.get('id')
+
+
+def test_ellipses_are_exact(svg):
+    ellipse = svg.getElementById('ellipse')
+    boxes = BoundingBoxes()
+    boxes.add(ellipse, IDENTITY)
+    boxes.add(svg.getElementById('circle'), IDENTITY)
+    assert boxes.boxes() == [(208, 75, 232, 85), (192, 42, 208, 58)]
+    rotated = (0.8, 0.6, -0.6, 0.8, 0, 0)
+    boxes = BoundingBoxes()
+    boxes.add(ellipse, rotated)
+    box = boxes.boxes()[0]
+    expected = inkex_box(ellipse, inkex.Transform(((0.8, -0.6, 0), (0.6, 0.8, 0))))
+    assert box == pytest.approx(expected, abs=0.05)
+
+
+def test_empty_and_unparsable(svg):
+    layer = svg.getElementById('layer')
+    empty = layer.add(inkex.PathElement())
+    units = layer.add(inkex.Rectangle.new(0, 0, 10, 10))
+    units.set('width', '10mm')
+    boxes = BoundingBoxes()
+    boxes.add(empty, IDENTITY)
+    boxes.add(units, IDENTITY)
+    assert boxes.boxes() == [None, inkex_box(units, inkex.Transform())]
+
+
+def test_selection_centre_in_layer_coordinates(svg):
+    layer = svg.getElementById('layer')
+    nodes = [svg.getElementById(name) for name in ('curves', 'nested', 'group-circle', 'arc')]
+    to_layer = -layer.composed_transform()
+    centres = [inkex_box(node, to_layer @ node.getparent().composed_transform()) for node in nodes]
+    expected = (sum((x1 + x2) / 2 for x1, y1, x2, y2 in centres) / len(centres),
+        sum((y1 + y2) / 2 for x1, y1, x2, y2 in centres) / len(centres))
+    assert selection_centre(nodes, layer) == pytest.approx(expected, abs=1e-3)
+    assert selection_centre([], layer) is None
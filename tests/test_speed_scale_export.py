@@ -0,0 +1,134 @@
+import io
+import re
+import zlib
+
+from speed_scale_export import ACI, ruler_drawing, label_glyphs, write_ruler_document
+from speed_scale_layout import RulerLayout, options_from_args, resolve_params, unittouu_for
+
+ARGS = ['--speed=60', '--caption=Leg 1 (Café)']
+
+
+def layout_for(args):
+    return RulerLayout(resolve_params(options_from_args(args), unittouu_for('mm')))
+
+
+def pdf(args):
+    stream = io.BytesIO()
+    write_ruler_document(stream, options_from_args(args), 'pdf')
+    return stream.getvalue()
+
+
+def dxf_pairs(args):
+    stream = io.StringIO()
+    write_ruler_document(stream, options_from_args(args), 'dxf')
+    lines = stream.getvalue().split('\n')
+    assert lines[-1] == ''
+    return list(zip(lines[0:-1:2], lines[1:-1:2]))
+
+
+def dxf_entities(pairs):
+    start = pairs.index(('2', 'ENTITIES')) + 1
+    end = pairs.index(('0', 'ENDSEC'), start)
+    entities = []
+    for code, value in pairs[start:end]:
+        if code == '0':
+            entities.append((value, []))
+        else:
+            entities[-1][1].append((code, value))
+    return entities
+
+
+def test_pdf_cross_reference():
+    data = pdf(ARGS)
+    assert data.startswith(b'%PDF-1.4\n') and data.endswith(b'%%EOF\n')
+    objects = {int(m.group(1)): m.start() for m in re.finditer(rb'(?m)^(\d+) 0 obj\n', data)}
+    assert sorted(objects) == list(range(1, 8))
+    xref = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    table = data[xref:].split(b'trailer')[0].split(b'\n')
+    assert table[:3] == [b'xref', b'0 8', b'0000000000 65535 f ']
+    # every entry is 20 bytes and points at its object
+    for number, entry in enumerate(table[3:10], 1):
+        assert len(entry) + 1 == 20
+        assert entry == b'%010d 00000 n ' % objects[number]
+    assert b'trailer\n<< /Size 8 /Root 1 0 R >>' in data
+
+
+def test_pdf_objects():
+    data = pdf(ARGS)
+    def obj(number):
+        return re.search(rb'(?ms)^%d 0 obj\n(.*?)endobj\n' % number, data).group(1)
+    assert obj(1) == b'<< /Type /Catalog /Pages 2 0 R >>\n'
+    assert obj(2) == b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>\n'
+    page = obj(3)
+    assert b'/Parent 2 0 R' in page and b'/Contents 4 0 R' in page and b'/F1 6 0 R' in page
+    # A3 in points
+    assert b'/MediaBox [0 0 1190.551 841.89]' in page
+    assert b'/FontDescriptor 7 0 R' in obj(6) and b'/Type /FontDescriptor' in obj(7)
+    content = obj(4)
+    assert content.startswith(b'<< /Length 5 0 R /Filter /FlateDecode >>\nstream\n')
+    stream = content.split(b'stream\n', 1)[1].rsplit(b'\nendstream\n', 1)[0]
+    assert int(obj(5)) == len(stream)
+    text = zlib.decompress(stream).decode('cp1252')
+    assert text.startswith('2.834645669291339 0 0 -2.834645669291339 0 841.89 cm\n')
+    assert text.count('q ') == text.count('Q\n') == 1
+    labels = [part for part in ruler_drawing(layout_for(ARGS)) if part[0] == 'label']
+    assert text.count(' Tj ET') == len(labels)
+    assert '(Leg 1 \\(Caf\xe9\\)) Tj' in text
+
+
+def test_pdf_strokes():
+    text = zlib.decompress(re.search(rb'stream\n(.*)\nendstream', pdf(ARGS + ['--label-mode=strokes']),
+        re.S).group(1)).decode('cp1252')
+    # numbers are stroked; the caption has no glyph for é, so stays text
+    assert text.count(' Tj ET') == 1
+    assert 'RG\n1 J 1 j ' in text
+
+
+def test_dxf_header():
+    pairs = dxf_pairs(ARGS)
+    header = pairs[:pairs.index(('0', 'ENDSEC'))]
+    assert header[:3] == [('0', 'SECTION'), ('2', 'HEADER'), ('9', '$ACADVER')]
+    assert ('1', 'AC1009') in header
+    # R12 header variables only
+    assert [value for code, value in header if code == '9'] == ['$ACADVER', '$EXTMIN', '$EXTMAX',
+        '$LIMMIN', '$LIMMAX']
+    assert header[-3:] == [('9', '$LIMMAX'), ('10', '420'), ('20', '297')]
+    assert pairs[-2:] == [('0', 'ENDSEC'), ('0', 'EOF')]
+
+
+def test_dxf_entities():
+    layout = layout_for(ARGS)
+    parts = ruler_drawing(layout)
+    origin = layout.origin(210, 148.5)
+    entities = dxf_entities(dxf_pairs(ARGS))
+    kinds = [kind for kind, fields in entities]
+    assert kinds.count('LINE') == sum(len(part[4]) for part in parts
+        if part[0] == 'lines' and part[2] in ACI)
+    assert kinds.count('SOLID') == sum(len(part[3]) for part in parts if part[0] == 'polygons')
+    assert kinds.count('TEXT') == sum(part[0] == 'label' for part in parts)
+    assert len(kinds) == kinds.count('LINE') + kinds.count('SOLID') + kinds.count('TEXT')
+    # the first tick, with y flipped about the page
+    x1, y1, x2, y2 = parts[0][4][0]
+    fields = dict(entities[0][1])
+    assert fields == {'8': 'LABEL_LINE', '62': '1', '10': '%g' % round(x1 + origin[0], 3),
+        '20': '%g' % round(297 - y1 - origin[1], 3), '11': '%g' % round(x2 + origin[0], 3),
+        '21': '%g' % round(297 - y2 - origin[1], 3)}
+    layers = {dict(fields)['8'] for kind, fields in entities}
+    assert layers == {'LABEL_LINE', 'SHORT_LINE', 'ARROWHEAD', 'PERPENDICULAR_LINE', 'LABELS'}
+    caption = [dict(fields) for kind, fields in entities if kind == 'TEXT'][-1]
+    assert caption['1'] == 'Leg 1 (Café)' and caption['72'] == '1'
+
+
+def test_dxf_stroked_labels():
+    args = ARGS + ['--label-mode=strokes']
+    labels = [part[2] for part in ruler_drawing(layout_for(args)) if part[0] == 'label']
+    entities = dxf_entities(dxf_pairs(args))
+    kinds = [kind for kind, fields in entities]
+    polylines = sum(len(label_glyphs(label)) for label in labels if label.text != 'Leg 1 (Café)')
+    assert kinds.count('POLYLINE') == kinds.count('SEQEND') == polylines
+    assert kinds.count('TEXT') == 1
+    # each polyline is its vertices then SEQEND
+    for i, kind in enumerate(kinds):
+        if kind == 'POLYLINE':
+            rest = kinds[i + 1:]
+            assert rest.index('SEQEND') >= 2 and set(rest[:rest.index('SEQEND')]) == {'VERTEX'}
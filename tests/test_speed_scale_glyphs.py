@@ -0,0 +1,21 @@
+import string
+
+from speed_scale_glyphs import drawable, glyph_lines, layout_text
+
+
+def test_letters_and_digits_are_drawable():
+    assert drawable(string.ascii_uppercase + string.ascii_lowercase + string.digits + ' -/.:=')
+    assert not drawable('Café')
+
+
+def test_lower_case_falls_back_to_capitals():
+    assert glyph_lines('e', 5.0) == glyph_lines('E', 5.0)
+    # the ones the dimension text uses keep their own glyph
+    assert glyph_lines('k', 5.0) != glyph_lines('K', 5.0)
+
+
+def test_caption_is_drawn_in_full():
+    placed = layout_text('EGBJ-DTY', 5.0, 0.0)
+    assert ''.join(char for char, x in placed) == 'EGBJ-DTY'
+    xs = [x for char, x in placed]
+    assert xs == sorted(xs)
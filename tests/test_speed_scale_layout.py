@@ -0,0 +1,110 @@
+import os
+
+import pytest
+from lxml import etree
+
+from render_speed_scale import ScaleGen
+from speed_scale_layout import (OPTION_CHOICES, RULER_DEFAULTS, TICK_HALF_MINUTE, TICK_LABEL,
+    TICK_SHORT, RulerLayout, layout_ticks, options_from_args, parse_tick_levels, resolve_params, ruler_speed,
+    unittouu_for)
+
+INX = os.path.join(os.path.dirname(__file__), '..', 'src', 'render_speed_scale.inx')
+
+
+def inx_defaults():
+    """'--name=value' for every parameter in the .inx file, an optiongroup
+    defaulting to its first option.
+    """
+    tree = etree.parse(INX)
+    args = []
+    for param in tree.iter('{*}param'):
+        if param.get('type') in ('notebook', 'description'):
+            continue
+        value = param.text or ''
+        if param.get('type') == 'optiongroup':
+            value = param.find('{*}option').get('value')
+        args.append('--{}={}'.format(param.get('name'), value))
+    return args
+
+
+def test_ruler_defaults_match_inx():
+    assert options_from_args(inx_defaults()) == RULER_DEFAULTS
+
+
+def test_ruler_defaults_match_scalegen():
+    actions = ScaleGen().arg_parser._actions
+    args = ['--{}={}'.format(action.dest, action.default) for action in actions
+        if action.dest in RULER_DEFAULTS]
+    assert len(args) == len(RULER_DEFAULTS)
+    assert options_from_args(args) == RULER_DEFAULTS
+
+
+def test_option_choices_match_inx():
+    tree = etree.parse(INX)
+    for dest, choices in OPTION_CHOICES.items():
+        param = tree.find('.//{{*}}param[@name="{}"]'.format(dest.replace('_', '-')))
+        assert tuple(option.get('value') for option in param.iter('{*}option')) == choices
+
+
+def test_options_from_args_rejects_unknown_choice():
+    assert options_from_args(['--instancing=all'])['instancing'] == 'all'
+    with pytest.raises(ValueError, match='instancing'):
+        options_from_args(['--instancing=some'])
+    with pytest.raises(ValueError, match='label-mode'):
+        options_from_args(['--label-mode=outline'])
+
+
+def test_options_from_args_parses_speed_lists():
+    assert options_from_args(['--speed=80:100:10'])['speed'] == (80, 90, 100)
+    with pytest.raises(ValueError):
+        options_from_args(['--speed='])
+    with pytest.raises(ValueError, match='positive'):
+        options_from_args(['--speed=0'])
+
+
+def test_ruler_speed_takes_one_speed():
+    assert ruler_speed({'speed': 120}) == 120
+    assert ruler_speed(options_from_args(['--speed=120'])) == 120
+    with pytest.raises(ValueError, match='single speed'):
+        ruler_speed(options_from_args(['--speed=80,90']))
+
+
+def test_at_most_three_tick_levels():
+    assert parse_tick_levels('10,600,60') == (600.0, 60.0, 10.0)
+    with pytest.raises(ValueError, match='at most three'):
+        parse_tick_levels('600,60,30,10,1')
+
+
+def ruler(*args):
+    return RulerLayout(resolve_params(options_from_args(args), unittouu_for('mm')))
+
+
+def test_two_tick_levels():
+    # culled to minutes and red half minutes at 30 kts on 1:500K
+    layout = ruler('--speed=30', '--scale=500000')
+    assert layout.levels == (60.0, 30.0)
+    assert set(layout.ticks['kind']) == {TICK_LABEL, TICK_HALF_MINUTE}
+    # 10 minute labels giving way to minutes: the 10 second ticks stay short
+    layout = ruler('--speed=200', '--scale=200000', '--tick-levels=600,60,10')
+    assert layout.levels == (60.0, 10.0)
+    assert set(layout.ticks['kind']) == {TICK_LABEL, TICK_SHORT}
+
+
+def test_layout_ticks_default_levels():
+    layout = RulerLayout(resolve_params(RULER_DEFAULTS, unittouu_for('mm')))
+    # 60,30,10 seconds: labels every minute, red half minutes, 10 s ticks
+    assert layout.steps == (6, 3, 1)
+    ticks = layout_ticks(0, 13, 1.5, 5.0, 0.6, layout.steps)
+    assert ticks['index'].tolist() == list(range(13))
+    assert ticks['x'].tolist() == [i * 1.5 for i in range(13)]
+    L, H, S = TICK_LABEL, TICK_HALF_MINUTE, TICK_SHORT
+    assert ticks['kind'].tolist() == [L, S, S, H, S, S, L, S, S, H, S, S, L]
+    # every other label line is red, and every half minute
+    assert [i for i in range(13) if ticks['red'][i]] == [0, 3, 9, 12]
+    assert ticks['y1'].tolist() == [-5.0 if i % 6 == 0 else 0.0 for i in range(13)]
+    assert ticks['y2'].tolist() == [3.0] * 13
+    for key, values in layout_ticks(0, 13, 1.5, 5.0, 0.6).items():
+        assert values.tolist() == ticks[key].tolist()
+    for key, values in layout.ticks.items():
+        assert values.tolist() == layout_ticks(layout.scalefrom, layout.scaleto, layout.res,
+            5.0, 0.6, (6, 3, 1))[key].tolist()
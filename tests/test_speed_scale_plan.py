@@ -0,0 +1,35 @@
+from lxml import etree
+
+from speed_scale_plan import plan_main
+
+ROUTE = '''leg,groundspeed
+EGBJ-DTY,95
+DTY-CPT,110
+CPT-SAM,120
+SAM-LYD,105
+LYD-EGKA,90
+EGKA-EGBJ,100
+'''
+
+
+def test_readme_example_packs_legs_onto_one_page(tmp_path):
+    route = tmp_path / 'route.csv'
+    route.write_text(ROUTE)
+    sheets = tmp_path / 'sheets'
+    assert plan_main([str(route), '-o', str(sheets), '--page', '420x297']) == 0
+    pages = sorted(sheets.iterdir())
+    assert [page.name for page in pages] == ['route_page001.svg']
+    assert pages[0].read_text().count('inkscape:label="Speed_scale"') == 6
+
+
+def test_stroked_captions(tmp_path):
+    route = tmp_path / 'route.csv'
+    route.write_text('leg,groundspeed\nEGBJ-DTY,95\nCafé,100\n')
+    sheets = tmp_path / 'sheets'
+    assert plan_main([str(route), '-o', str(sheets), '--label-mode=strokes']) == 0
+    path = sheets / 'route_page001.svg'
+    # drawn glyph by glyph, or as text when a character has no glyph
+    caption = etree.parse(str(path)).xpath('//*[@inkscape:label="EGBJ-DTY"]',
+        namespaces={'inkscape': 'http://www.inkscape.org/namespaces/inkscape'})
+    assert len(caption) == 1 and len(caption[0]) == len('EGBJ-DTY')
+    assert '>Café</text>' in path.read_text()
@@ -0,0 +1,109 @@
+import pytest
+from lxml import etree
+
+from render_speed_scale import BLANK_DOCUMENT
+from speed_scale_splice import splice_main
+
+
+def test_speed_list_is_an_error(tmp_path, capsys):
+    chart = tmp_path / 'chart.svg'
+    chart.write_bytes(BLANK_DOCUMENT)
+    output = tmp_path / 'out.svg'
+    assert splice_main([str(chart), '-o', str(output), '--speed=80,90']) == 1
+    assert 'single speed' in capsys.readouterr().err
+    assert splice_main([str(chart), '-o', str(output), '--speed=90']) == 0
+
+
+CHART = b'''<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<!-- a chart, with text that must come through untouched -->
+<svg
+   xmlns="http://www.w3.org/2000/svg"
+   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+   xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"
+   width="420mm" height="297mm" viewBox="0 0 420 297">
+  <sodipodi:namedview id="namedview1" inkscape:current-layer="%s"/>
+  <g inkscape:groupmode="layer" id="base" inkscape:label="Base">
+    <path d="M 0,0 L 10,10" style="stroke:#000000" />  <text x='1'  y="2">A &amp; B</text>
+  </g>
+  <g inkscape:groupmode="layer" id="route" inkscape:label="Route" transform="translate(10, -20.5)">
+    <g inkscape:groupmode="layer" id="sub" inkscape:label="Sub" />
+    <![CDATA[ not markup </g> ]]>
+  </g>
+  <g
+     inkscape:groupmode="layer"   id="blank"
+     inkscape:label="Blank"/>
+</svg>
+'''
+
+
+def spliced(tmp_path, chart, argv=()):
+    path = tmp_path / 'chart.svg'
+    path.write_bytes(chart)
+    output = tmp_path / 'out.svg'
+    assert splice_main([str(path), '-o', str(output), '--speed=90'] + list(argv)) == 0
+    return output.read_bytes()
+
+
+def inserted(chart, out, offset):
+    """The ruler inserted at offset, checking every other byte is the chart's."""
+    size = len(out) - len(chart)
+    assert out[:offset] == chart[:offset] and out[offset + size:] == chart[offset:]
+    ruler = out[offset:offset + size]
+    group = etree.fromstring(ruler)
+    assert group.get('{http://www.inkscape.org/namespaces/inkscape}label') == 'Speed_scale'
+    return group
+
+
+def translation(group):
+    x, y = group.get('transform')[len('translate('):-1].split(',')
+    return float(x), float(y)
+
+
+def layer_end(chart, layer_id):
+    start = chart.index(b'id="%s"' % layer_id)
+    return chart.index(b'\n  </g>', start) + 3
+
+
+@pytest.mark.parametrize('argv', [['--layer=base'], ['--layer=Base']])
+def test_layer_by_id_or_label(tmp_path, argv):
+    chart = CHART % b'route'
+    out = spliced(tmp_path, chart, argv)
+    inserted(chart, out, layer_end(chart, b'base'))
+    etree.fromstring(out)
+
+
+def test_current_layer_translated(tmp_path):
+    chart = CHART % b'route'
+    route = inserted(chart, spliced(tmp_path, chart), layer_end(chart, b'route'))
+    base = inserted(chart, spliced(tmp_path, chart, ['--layer=base']), layer_end(chart, b'base'))
+    # centred on the page, so shifted back by the layer's translation
+    assert translation(route) == pytest.approx((translation(base)[0] - 10, translation(base)[1] + 20.5))
+    centred = inserted(chart, spliced(tmp_path, chart, ['--centre=5,6']), layer_end(chart, b'route'))
+    assert translation(centred)[0] - translation(base)[0] == pytest.approx(5 - 210)
+    assert translation(centred)[1] - translation(base)[1] == pytest.approx(6 - 148.5)
+
+
+@pytest.mark.parametrize('argv, current, layer_id, empty', [
+    ([], b'blank', 'blank', b'inkscape:label="Blank"/>'),
+    (['--layer=Sub'], b'route', 'sub', b'inkscape:label="Sub" />'),
+])
+def test_empty_layer_rewritten(tmp_path, argv, current, layer_id, empty):
+    chart = CHART % current
+    out = spliced(tmp_path, chart, argv)
+    offset = chart.index(empty) + len(empty) - 2
+    # the /> is replaced by >, the ruler and </g>
+    end = offset + len(out) - len(chart) + 2
+    assert out[:offset] == chart[:offset] and out[end:] == chart[offset + 2:]
+    assert out[offset:offset + 1] == b'>' and out[end - 4:end] == b'</g>'
+    group = etree.fromstring(out[offset + 1:end - 4])
+    assert group.get('{http://www.inkscape.org/namespaces/inkscape}label') == 'Speed_scale'
+    layer = etree.fromstring(out).xpath('//*[@id=$id]', id=layer_id)[0]
+    assert len(layer) == 1
+
+
+def test_root_without_layers(tmp_path):
+    chart = (b'<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="50mm" '
+        b'viewBox="0 0 100 50">\n<rect width="1" height="1"/>\n</svg>\n\n')
+    out = spliced(tmp_path, chart)
+    group = inserted(chart, out, chart.rindex(b'</svg>'))
+    assert etree.fromstring(out)[-1].get('transform') == group.get('transform')
@@ -0,0 +1,73 @@
+import re
+
+import inkex
+import pytest
+from lxml import etree
+
+from render_speed_scale import run_effect
+from speed_scale_layout import RulerLayout, options_from_args, resolve_params, unittouu_for
+from speed_scale_svg import CoordinateFormat, writer_for
+
+MODES = [
+    [],
+    ['--compound=True'],
+    ['--instancing=arrows'],
+    ['--instancing=all'],
+    ['--css-classes=True'],
+    ['--label-mode=strokes'],
+    ['--precision=2'],
+]
+
+# set by where ScaleGen places the ruler and what it records on it
+IGNORED = {'id', 'transform', 'data-speed-scale-options', 'data-speed-scale-key'}
+
+
+def canonical(elem):
+    """elem as nested tuples, without its <defs> or the IGNORED attributes."""
+    children = tuple(canonical(child) for child in elem
+        if isinstance(child.tag, str) and etree.QName(child).localname != 'defs')
+    attribs = tuple(sorted((key, value) for key, value in elem.attrib.items() if key not in IGNORED))
+    return (etree.QName(elem).localname, attribs, (elem.text or '').strip(), children)
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_fragment_matches_effect(mode):
+    args = ['--speed=90', '--caption=Leg 1'] + mode
+    effect = run_effect(args)
+    group = effect.svg.getElementById('layer1')[-1]
+    options = options_from_args(args)
+    layout = RulerLayout(resolve_params(options, unittouu_for('mm')))
+    fragment = etree.fromstring(writer_for(None, options).fragment_text(layout).encode())
+    assert canonical(fragment) == canonical(group)
+    # the fragment carries the same definitions ScaleGen adds to the document
+    defs = fragment.find('{http://www.w3.org/2000/svg}defs')
+    carried = {elem.get('id'): canonical(elem) for elem in (defs if defs is not None else [])}
+    added = {elem.get('id'): canonical(elem) for elem in effect.svg.defs}
+    assert carried == added
+
+
+def test_compact_paths_are_relative_and_rounded():
+    coords = CoordinateFormat(2)
+    assert coords.path([[(0, 0), (1.234, 0), (1.234, 5.678), (0.001, 0.004)], [(10.1, -3.333)]],
+        closed=True) == 'M0,0h1.23v5.68l-1.23,-5.68zm10.1,-3.33z'
+    # the steps are between rounded points, so the error does not build up
+    assert coords.lines([(0.333, 0, 0.333, 1), (0.666, 0, 0.666, 1), (0.999, 0, 0.999, 1)]) == (
+        'M0.33,0v1m0.34,-1v1m0.33,-1v1')
+    assert coords.number(-0.004) == '0' and coords.translate(69.9425, 148.5) == 'translate(69.94,148.5)'
+    assert CoordinateFormat(0).path([[(1.5, 2.5), (3.49, 2.5)]]) == 'M2,2h1'
+    assert CoordinateFormat().path([[(1.5, 2.5), (3.49, 2.5)]], closed=True) == 'M 1.5,2.5 L 3.49,2.5 z'
+
+
+@pytest.mark.parametrize('mode', [[], ['--compound=True'], ['--label-mode=strokes']])
+def test_precision_keeps_the_geometry(mode):
+    exact = run_effect(['--speed=90'] + mode).svg.getElementById('layer1')[-1]
+    rounded = run_effect(['--speed=90', '--precision=2'] + mode).svg.getElementById('layer1')[-1]
+    paths = [(a, b) for a, b in zip(exact.iter('{*}path'), rounded.iter('{*}path'))]
+    assert len(paths) == len(list(exact.iter('{*}path'))) == len(list(rounded.iter('{*}path')))
+    for a, b in paths:
+        assert re.fullmatch(r'M(-?\d+(\.\d{1,2})?|[mlhvz,])+', b.get('d')), b.get('d')
+        ends_a = [(p.x, p.y) for p in inkex.Path(a.get('d')).end_points]
+        ends_b = [(p.x, p.y) for p in inkex.Path(b.get('d')).end_points]
+        assert len(ends_a) == len(ends_b)
+        for (xa, ya), (xb, yb) in zip(ends_a, ends_b):
+            assert abs(xa - xb) <= 0.005 + 1e-9 and abs(ya - yb) <= 0.005 + 1e-9
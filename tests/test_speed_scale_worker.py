@@ -0,0 +1,66 @@
+import os
+import socket
+
+import pytest
+
+from speed_scale_worker import forward, private_directory, serve, socket_path, trusted_socket
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='needs Unix sockets')
+
+
+def test_default_socket_is_in_a_private_directory(monkeypatch):
+    monkeypatch.delenv('SPEED_SCALE_WORKER', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    assert socket_path().endswith('speed-scale-{}/speed-scale.sock'.format(os.getuid()))
+
+
+def test_only_own_sockets_are_trusted(tmp_path):
+    tmp_path.chmod(0o700)
+    path = tmp_path / 'worker.sock'
+    assert not trusted_socket(str(path))
+    path.write_bytes(b'')
+    assert not trusted_socket(str(path))
+    assert forward([], str(path)) is None
+    path.unlink()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(str(path))
+        assert trusted_socket(str(path))
+
+
+
+def test_socket_directory_must_be_private(tmp_path, capsys):
+    private = tmp_path / 'private'
+    private.mkdir(0o700)
+    link = tmp_path / 'link'
+    link.symlink_to(private)
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    shared.chmod(0o755)
+    assert private_directory(str(private))
+    assert not private_directory(str(link)) and not private_directory(str(shared))
+    assert not private_directory(str(tmp_path / 'missing'))
+    for directory in (link, shared):
+        path = directory / 'worker.sock'
+        assert serve(str(path)) == 1
+        assert 'mode 0700' in capsys.readouterr().err
+        assert not os.path.lexists(str(path))
+    # a socket of ours is still not used from a directory others can write to
+    path = shared / 'worker.sock'
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(str(path))
+        assert not trusted_socket(str(path))
+        assert forward([], str(path)) is None
+    # nor through a symlink to a private directory
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(str(private / 'worker.sock'))
+        assert trusted_socket(str(private / 'worker.sock'))
+        assert not trusted_socket(str(link / 'worker.sock'))
+
+
+def test_serve_makes_a_private_directory(tmp_path):
+    tmp_path.chmod(0o700)
+    directory = tmp_path / 'speed-scale'
+    # times out at once, having made the directory and bound the socket
+    assert serve(str(directory / 'worker.sock'), idle_timeout=0.01) == 0
+    assert private_directory(str(directory))
+    assert not os.path.lexists(str(directory / 'worker.sock'))